@@ -0,0 +1,14 @@
+#!/bin/sh
+# Run the benchmarks against SQLite, then against a temporary PostgreSQL cluster (needs initdb and pg_ctl on the PATH).
+# Any arguments are passed on to manage.py benchmark, e.g. ./benchmark_backends.sh --scale 1 10
+set -e
+
+python manage.py benchmark "$@"
+
+PGDATA=$(mktemp -d)
+trap 'pg_ctl -D "$PGDATA" -m fast stop > /dev/null 2>&1; rm -rf "$PGDATA"' EXIT
+initdb -D "$PGDATA" -A trust -U postgres > /dev/null
+pg_ctl -D "$PGDATA" -o "-k $PGDATA -c listen_addresses=''" -l "$PGDATA/log" -w start > /dev/null
+
+DATABASE_ENGINE=postgresql DATABASE_HOST="$PGDATA" DATABASE_USER=postgres DATABASE_NAME=postgres \
+    python manage.py benchmark "$@"
@@ -46,7 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'scores.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'scores.middleware.DataVersionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -78,12 +80,40 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# db.sqlite3 by default, or PostgreSQL if DATABASE_ENGINE=postgresql, configured by the other DATABASE_* variables
+# (copy db.sqlite3 into a new PostgreSQL database with manage.py migrate, then manage.py copy_sqlite_to_postgres)
+
+if os.environ.get('DATABASE_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'scores'),
+            'USER': os.environ.get('DATABASE_USER', ''),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', ''),
+            'PORT': os.environ.get('DATABASE_PORT', ''),
+            'CONN_MAX_AGE': 60,
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DATABASE_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            # keep connections open between requests, rather than reconnecting (and setting the pragmas) every time
+            'CONN_MAX_AGE': 60,
+        }
+    }
+
+# Applied to every new SQLite connection, see scores.signals.set_sqlite_pragmas()
+# https://www.sqlite.org/pragma.html
+
+SCORES_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',          # readers don't block the writer, and the writer doesn't block readers
+    'synchronous': 'NORMAL',        # safe with WAL, and doesn't sync on every commit
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,       # negative means KiB, i.e. 64 MiB
+    'busy_timeout': 20000,          # ms to wait for a lock before raising "database is locked"
 }
 
 
@@ -124,3 +154,62 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/1.11/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# How the text of pdf scoresheets is extracted, see scores.scrape_pdf.PDF_BACKENDS: 'python' reads them in this
+# process, 'pdftotext' runs xpdf's or poppler's pdftotext at SCORES_PDFTOTEXT,
+# e.g. C:\Program Files\Xpdf\bin64\pdftotext.exe on Windows. `manage.py compare_pdf_backends --expected` checks both
+# against the fixture scoresheets' pdftotext -raw text, and without --expected against each other on real scoresheets
+
+SCORES_PDF_BACKEND = os.environ.get('SCORES_PDF_BACKEND', 'pdftotext')
+SCORES_PDFTOTEXT = os.environ.get('SCORES_PDFTOTEXT', 'pdftotext')
+
+
+# Cache of compressed responses, see scores.middleware.DataVersionMiddleware
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# each process has its own in memory; use e.g. memcached to share one between processes
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+SCORES_RESPONSE_CACHE = 'responses'
+SCORES_RESPONSE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+# Log a warning when a request runs more queries than this
+
+SCORES_QUERY_BUDGET = 50
+
+
+# Logging
+# https://docs.djangoproject.com/en/1.11/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'scores': {
+            'handlers': ['console'],
+            'level': os.environ.get('SCORES_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
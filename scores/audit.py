@@ -0,0 +1,174 @@
+"""
+Consistency checks of the stored scores, for finding rows broken by edits in the admin or by alias merges.
+
+Each check is one set-based query that returns the rows breaking an invariant, so an audit reads each table a
+constant number of times however many contests there are: sums are GROUP BYs, judge counts are joined to
+appearances once per contest, rank order is checked with LAG() over each contest (SQLite 3.25+ or PostgreSQL),
+and alias chains are followed with a recursive query.
+"""
+
+from collections import namedtuple
+from django.db import connection
+from .models import *
+
+# percentages are stored to one decimal place
+PC_TOLERANCE = 0.051
+
+# alias chains longer than this are assumed to loop
+MAX_ALIAS_DEPTH = 50
+
+# the models with alias_of, and the foreign keys that should point to canonical objects rather than aliases
+ALIAS_REFERENCES = (
+    (Person, ((Member, 'person_id'), (Judge, 'person_id'))),
+    (Contestant, ((ContestantApp, 'contestant_id'),)),
+    (Song, ((SongApp, 'song_id'),)),
+)
+
+Check = namedtuple('Check', ('name', 'description', 'columns', 'sql', 'params'))
+
+
+def tables():
+    return {model._meta.model_name: connection.ops.quote_name(model._meta.db_table)
+            for model in (Contest, ContestantApp, SongApp, Judge, Member, Person, Contestant, Song)}
+
+
+def pc_matches(pc, points, judges, songs):
+    """
+    SQL for whether a stored percentage matches points / judges / songs, allowing for a rolling panel, where only
+    half the judges score each contestant (see import_from_dict.calculate_scores)
+    """
+    exact = '%s * {factor} / NULLIF(%s * %s, 0)' % (points, judges, songs)
+    return '(ABS(%s - %s) <= %s OR ABS(%s - %s) <= %s)' % (
+        pc, exact.format(factor='1.0'), PC_TOLERANCE, pc, exact.format(factor='2.0'), PC_TOLERANCE)
+
+
+def percentage_sql(appearances, contest_id):
+    """
+    :param appearances: table alias of ContestantApp or SongApp, joined to a table with its contest_id
+    :param contest_id: SQL for the appearance's contest id
+    """
+    return (
+        'JOIN (SELECT contest_id, '
+        "SUM(CASE WHEN cat = 'm' THEN 1 ELSE 0 END) AS n_m, "
+        "SUM(CASE WHEN cat = 'p' THEN 1 ELSE 0 END) AS n_p, "
+        "SUM(CASE WHEN cat = 's' THEN 1 ELSE 0 END) AS n_s "
+        'FROM {judge} GROUP BY contest_id) j ON j.contest_id = %s '
+        'WHERE NOT (%s AND %s AND %s AND %s)'
+    ) % (
+        contest_id,
+        pc_matches('a.m_pc', 'a.m', 'j.n_m', 'a.n'),
+        pc_matches('a.p_pc', 'a.p', 'j.n_p', 'a.n'),
+        pc_matches('a.s_pc', 'a.s', 'j.n_s', 'a.n'),
+        pc_matches('a.pc_score', 'a.tot_score', '(j.n_m + j.n_p + j.n_s)', 'a.n'),
+    )
+
+
+def checks():
+    """
+    :return: list of Check
+    """
+    t = tables()
+    checks = [
+        Check(
+            'contestant_totals',
+            "Contestant scores that aren't the sum of their song scores, or totals that aren't M + P + S",
+            ('contestantapp', 'contest', 'm', 'p', 's', 'tot', 'n', 'song m', 'song p', 'song s', 'song tot',
+             'song n'),
+            'SELECT a.id, a.contest_id, a.m, a.p, a.s, a.tot_score, a.n, '
+            'COALESCE(s.m, 0), COALESCE(s.p, 0), COALESCE(s.s, 0), COALESCE(s.tot_score, 0), COALESCE(s.n, 0) '
+            'FROM {contestantapp} a LEFT JOIN ('
+            'SELECT contestantapp_id, SUM(m) AS m, SUM(p) AS p, SUM(s) AS s, SUM(tot_score) AS tot_score, SUM(n) AS n '
+            'FROM {songapp} GROUP BY contestantapp_id'
+            ') s ON s.contestantapp_id = a.id '
+            'WHERE a.m <> COALESCE(s.m, 0) OR a.p <> COALESCE(s.p, 0) OR a.s <> COALESCE(s.s, 0) '
+            'OR a.tot_score <> COALESCE(s.tot_score, 0) OR a.n <> COALESCE(s.n, 0) '
+            'OR a.tot_score <> a.m + a.p + a.s',
+            [],
+        ),
+        Check(
+            'song_totals',
+            "Song totals that aren't M + P + S",
+            ('songapp', 'contestantapp', 'm', 'p', 's', 'tot'),
+            'SELECT id, contestantapp_id, m, p, s, tot_score FROM {songapp} WHERE tot_score <> m + p + s',
+            [],
+        ),
+        Check(
+            'contestant_percentages',
+            "Contestant percentages that don't match their points divided by the number of judges and songs",
+            ('contestantapp', 'contest', 'm%', 'p%', 's%', 'tot%', 'm', 'p', 's', 'tot', 'n', 'm judges',
+             'p judges', 's judges'),
+            'SELECT a.id, a.contest_id, a.m_pc, a.p_pc, a.s_pc, a.pc_score, a.m, a.p, a.s, a.tot_score, a.n, '
+            'j.n_m, j.n_p, j.n_s FROM {contestantapp} a ' + percentage_sql('a', 'a.contest_id'),
+            [],
+        ),
+        Check(
+            'song_percentages',
+            "Song percentages that don't match their points divided by the number of judges",
+            ('songapp', 'contest', 'm%', 'p%', 's%', 'tot%', 'm', 'p', 's', 'tot', 'n', 'm judges', 'p judges',
+             's judges'),
+            'SELECT a.id, c.contest_id, a.m_pc, a.p_pc, a.s_pc, a.pc_score, a.m, a.p, a.s, a.tot_score, a.n, '
+            'j.n_m, j.n_p, j.n_s FROM {songapp} a JOIN {contestantapp} c ON c.id = a.contestantapp_id '
+            + percentage_sql('a', 'c.contest_id'),
+            [],
+        ),
+        Check(
+            'rank_order',
+            'Contestants ranked above a contestant with a higher total score in the same contest',
+            ('contestantapp', 'contest', 'rank', 'tot', 'rank of the next higher score'),
+            # in order of score, then rank for tied scores, the ranks should never go down
+            'SELECT id, contest_id, rank, tot_score, previous_rank FROM ('
+            'SELECT id, contest_id, rank, tot_score, '
+            'LAG(rank) OVER (PARTITION BY contest_id ORDER BY tot_score DESC, rank) AS previous_rank '
+            'FROM {contestantapp}'
+            ') ranked WHERE previous_rank > rank',
+            [],
+        ),
+    ]
+
+    for model, references in ALIAS_REFERENCES:
+        name = model._meta.model_name
+        checks.append(Check(
+            '%s_orphan_aliases' % name,
+            '%s that are aliases of a %s that no longer exists' % (model._meta.verbose_name_plural.title(), name),
+            (name, 'alias_of'),
+            'SELECT a.id, a.alias_of_id FROM {%s} a LEFT JOIN {%s} b ON b.id = a.alias_of_id '
+            'WHERE a.alias_of_id IS NOT NULL AND b.id IS NULL' % (name, name),
+            [],
+        ))
+        checks.append(Check(
+            '%s_alias_cycles' % name,
+            '%s whose chain of aliases leads back to itself' % model._meta.verbose_name_plural.title(),
+            (name, 'cycle length'),
+            'WITH RECURSIVE chain (start_id, id, depth) AS ('
+            'SELECT id, alias_of_id, 1 FROM {%s} WHERE alias_of_id IS NOT NULL '
+            'UNION ALL '
+            'SELECT chain.start_id, a.alias_of_id, chain.depth + 1 FROM chain JOIN {%s} a ON a.id = chain.id '
+            'WHERE a.alias_of_id IS NOT NULL AND chain.id <> chain.start_id AND chain.depth < %%s'
+            ') SELECT start_id, depth FROM chain WHERE id = start_id' % (name, name),
+            [MAX_ALIAS_DEPTH],
+        ))
+        for referrer, column in references:
+            checks.append(Check(
+                '%s_%s_aliases' % (referrer._meta.model_name, name),
+                '%s that point to an alias instead of the %s it is an alias of' % (
+                    referrer._meta.verbose_name_plural.title(), name),
+                (referrer._meta.model_name, name, 'alias_of'),
+                'SELECT r.id, a.id, a.alias_of_id FROM {%s} r JOIN {%s} a ON a.id = r.%s '
+                'WHERE a.alias_of_id IS NOT NULL' % (referrer._meta.model_name, name, column),
+                [],
+            ))
+
+    return [check._replace(sql=check.sql.format(**t)) for check in checks]
+
+
+def run_audit():
+    """
+    Run every check
+    :return: list of (Check, list of rows breaking it)
+    """
+    results = []
+    with connection.cursor() as cursor:
+        for check in checks():
+            cursor.execute(check.sql, check.params)
+            results.append((check, cursor.fetchall()))
+    return results
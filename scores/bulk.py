@@ -0,0 +1,84 @@
+from django.db import connection, transaction
+from .changes import UPDATE, log_changes
+
+###############################################################
+# Helpers for writing many rows at once
+###############################################################
+
+
+def bulk_update(model, rows, fields):
+    """
+    Update many rows of a model with a single executemany() call, instead of calling save() on each object
+    :param model: the model class, e.g. ContestantApp
+    :param rows: iterable of tuples (pk, value1, value2, ...), with values in the same order as fields
+    :param fields: names of the fields to update
+    :return: the number of rows written
+    """
+    qn = connection.ops.quote_name
+    opts = model._meta
+    columns = [opts.get_field(f).column for f in fields]
+    sql = 'UPDATE %s SET %s WHERE %s = %%s' % (
+        qn(opts.db_table),
+        ', '.join('%s = %%s' % qn(c) for c in columns),
+        qn(opts.pk.column),
+    )
+    # the pk goes last to match the WHERE clause
+    params = [tuple(row[1:]) + (row[0],) for row in rows]
+    if params:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+            log_changes(model, [row[-1] for row in params], UPDATE)
+    return len(params)
+
+
+def insert_ignore(model, fields, rows, batch_size=100):
+    """
+    Insert many rows of a model, skipping any that would break a unique constraint, e.g. because another import has
+    just inserted the same name, with INSERT ... ON CONFLICT DO NOTHING (PostgreSQL 9.5+ or SQLite 3.24+)
+    :param model: the model class, e.g. Person
+    :param fields: names of the fields to insert
+    :param rows: iterable of tuples of values, in the same order as fields
+    :param batch_size: rows per INSERT statement
+    :return: the number of rows inserted
+    """
+    qn = connection.ops.quote_name
+    opts = model._meta
+    fields = [opts.get_field(f) for f in fields]
+    rows = [[f.get_db_prep_save(value, connection) for f, value in zip(fields, row)] for row in rows]
+    placeholders = '(%s)' % ', '.join(['%s'] * len(fields))
+    inserted = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            cursor.execute('INSERT INTO %s (%s) VALUES %s ON CONFLICT DO NOTHING' % (
+                qn(opts.db_table),
+                ', '.join(qn(f.column) for f in fields),
+                ', '.join([placeholders] * len(batch)),
+            ), [value for row in batch for value in row])
+            inserted += cursor.rowcount
+    return inserted
+
+
+def bulk_increment(model, key_fields, fields, rows):
+    """
+    Add to counters in many rows of a model with a single executemany() call
+    :param model: the model class, e.g. JudgeStats
+    :param key_fields: names of the fields that identify a row, e.g. a unique_together
+    :param fields: names of the fields to add to
+    :param rows: iterable of tuples (key1, key2, ..., amount1, amount2, ...), in the same order as the fields
+    :return: the number of rows written
+    """
+    qn = connection.ops.quote_name
+    opts = model._meta
+    sql = 'UPDATE %s SET %s WHERE %s' % (
+        qn(opts.db_table),
+        ', '.join('{0} = {0} + %s'.format(qn(opts.get_field(f).column)) for f in fields),
+        ' AND '.join('%s = %%s' % qn(opts.get_field(f).column) for f in key_fields),
+    )
+    # the keys go last to match the WHERE clause
+    n_keys = len(key_fields)
+    params = [tuple(row[n_keys:]) + tuple(row[:n_keys]) for row in rows]
+    if params:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+    return len(params)
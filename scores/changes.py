@@ -0,0 +1,128 @@
+"""
+Change data capture: every insert, update and delete of the tracked models is appended to ChangeLogEntry, so that a
+consumer can sync by asking for the changes after the last seq it saw, instead of re-reading everything.
+
+Single saves and deletes are logged by the signals in signals.py as they happen. Bulk writes (the importer,
+bulk_update(), QuerySet.update()) log the rows they change with log_changes(), and an import collects all of its
+changes with batch_changes() and writes them with one bulk_create() at the end of its transaction.
+
+Recalculating derived data from scratch (ratings, judge stats, leaderboards, score distributions) changes what the
+pages show without changing any logged row, so it logs a single REBUILD entry instead: a consumer that shows derived
+data should read all of it again.
+
+A consumer must never see seq N + 1 before N is committed, or it would skip N. SQLite only has one writer at a time;
+on PostgreSQL, writers take an advisory lock before adding to the log, which they hold until they commit.
+"""
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from django.db import connection
+from .models import *
+
+# the models whose changes are logged
+CHANGE_MODELS = (Contest, ContestantApp, SongApp, Member, Judge, Person, Contestant, Song)
+
+CHANGE_MODEL_NAMES = {model._meta.model_name for model in CHANGE_MODELS}
+
+# the pg_advisory_xact_lock() key that orders writes to the change log
+CHANGE_LOG_LOCK = 0x5c0e5
+
+INSERT, UPDATE, DELETE = 'i', 'u', 'd'
+
+# the model name of the entry logged when derived data is rebuilt, with object id 0
+REBUILD = 'rebuild'
+
+_local = threading.local()
+
+
+def record_changes(entries):
+    """
+    Write entries to the change log
+    :param entries: iterable of (model name, object id, action)
+    """
+    entries = list(entries)
+    if not entries:
+        return
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CHANGE_LOG_LOCK])
+    ChangeLogEntry.objects.bulk_create([
+        ChangeLogEntry(model=model, object_id=object_id, action=action) for model, object_id, action in entries
+    ], batch_size=500)
+
+
+def log_changes(model, ids, action):
+    """
+    Log changes to rows of a model, straight away, or at the end of the enclosing batch_changes()
+    :param model: model class; changes to models not in CHANGE_MODELS are ignored
+    :param ids: iterable of primary keys
+    :param action: INSERT, UPDATE or DELETE
+    """
+    name = model._meta.model_name
+    if name not in CHANGE_MODEL_NAMES:
+        return
+    batch = getattr(_local, 'batch', None)
+    if batch is None:
+        record_changes((name, id, action) for id in ids)
+        return
+    for id in ids:
+        # an insert followed by updates is still an insert, as far as a consumer is concerned
+        if batch.get((name, id)) != INSERT or action == DELETE:
+            batch[(name, id)] = action
+
+
+def log_rebuild():
+    """
+    Log that derived data has been recalculated from scratch, so that the data version goes up
+    """
+    batch = getattr(_local, 'batch', None)
+    if batch is None:
+        record_changes([(REBUILD, 0, UPDATE)])
+    else:
+        batch[(REBUILD, 0)] = UPDATE
+
+
+@contextmanager
+def batch_changes():
+    """
+    Collect the changes logged inside the block, and write them all at the end of it, once per row.
+    Use it inside the transaction that makes the changes, so that they're logged in the same transaction.
+    """
+    if getattr(_local, 'batch', None) is not None:
+        # already in a batch
+        yield
+        return
+    _local.batch = OrderedDict()
+    try:
+        yield
+        batch = _local.batch
+    finally:
+        _local.batch = None
+    record_changes((name, id, action) for (name, id), action in batch.items())
+
+
+def changes_since(seq, limit, models=None, until=None):
+    """
+    :param seq: the last seq the consumer has seen
+    :param limit: the most entries to return
+    :param models: list of model names to return changes of, or None for all of them
+    :param until: the last seq to return, or None to read to the end of the log
+    :return: list of ChangeLogEntry, in seq order
+    """
+    entries = ChangeLogEntry.objects.filter(seq__gt=seq)
+    if until is not None:
+        entries = entries.filter(seq__lte=until)
+    if models:
+        entries = entries.filter(model__in=models)
+    return list(entries.order_by('seq')[:limit])
+
+
+def data_version():
+    """
+    The version of the data, which goes up with every logged change: any import, any write through the admin or
+    the forms, as those save the logged models, and any rebuild of derived data
+    :return: tuple (the last seq, or 0 if nothing has been logged; the time of the last change, or None)
+    """
+    last = ChangeLogEntry.objects.order_by('-seq').values_list('seq', 'time').first()
+    return last or (0, None)
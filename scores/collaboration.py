@@ -0,0 +1,235 @@
+"""
+Who sang with whom: a graph of the people who have sung in a quartet appearance together, held in memory so that
+neighbour, shared quartet and shortest path queries don't touch the database.
+
+The graph is loaded the first time it's needed, and kept up to date by reading only the Member rows added since,
+either straight after an import in this process, or when a periodic check finds another process has imported contests.
+Aliases (of people and of quartets) are folded into the names they're aliases of, so the graph is loaded again when
+they change, or when the change log shows that existing Member rows have been changed or deleted.
+"""
+
+import threading, time
+from array import array
+from collections import defaultdict, deque
+from itertools import combinations
+from django.db.models import Count, Max, Sum
+from .models import *
+from .changes import INSERT
+from .ratings import canonical_ids
+
+# seconds between checks that the graph is up to date with the database
+CHECK_INTERVAL = 10
+
+
+class Adjacency:
+    """
+    A snapshot of the graph in compressed sparse row (CSR) form: the person in row i sang with the people in rows
+    neighbours[offsets[i]:offsets[i + 1]], in weights[offsets[i]:offsets[i + 1]] different quartets.
+    """
+    def __init__(self, canonical, memberships, together):
+        """
+        :param canonical: dict of person id: canonical person id
+        :param memberships: dict of canonical person id: set of canonical quartet (Contestant) ids
+        :param together: dict of (person id, person id), lowest first: set of quartet ids they sang in together
+        """
+        self.canonical = dict(canonical)
+        self.people = array('l', sorted(memberships))
+        self.rows = {person: row for row, person in enumerate(self.people)}
+        self.quartet_counts = array('l', (len(memberships[person]) for person in self.people))
+        self.together = {pair: tuple(sorted(quartets)) for pair, quartets in together.items()}
+
+        adjacent = defaultdict(list)
+        for (a, b), quartets in self.together.items():
+            adjacent[self.rows[a]].append((self.rows[b], len(quartets)))
+            adjacent[self.rows[b]].append((self.rows[a], len(quartets)))
+        self.offsets = array('l', [0])
+        self.neighbours = array('l')
+        self.weights = array('l')
+        for row in range(len(self.people)):
+            for neighbour, weight in sorted(adjacent[row]):
+                self.neighbours.append(neighbour)
+                self.weights.append(weight)
+            self.offsets.append(len(self.neighbours))
+
+    def __len__(self):
+        return len(self.people)
+
+    def n_edges(self):
+        return len(self.neighbours) // 2
+
+    def row(self, person_id):
+        return self.rows.get(self.canonical.get(person_id, person_id))
+
+    def quartet_count(self, person_id):
+        """
+        :return: the number of different quartets a person has sung in
+        """
+        row = self.row(person_id)
+        return 0 if row is None else self.quartet_counts[row]
+
+    def collaborators(self, person_id):
+        """
+        :return: list of (person id, number of quartets sung in together), most quartets first
+        """
+        row = self.row(person_id)
+        if row is None:
+            return []
+        start, end = self.offsets[row], self.offsets[row + 1]
+        pairs = [(self.people[n], w) for n, w in zip(self.neighbours[start:end], self.weights[start:end])]
+        return sorted(pairs, key=lambda pair: -pair[1])
+
+    def shared_quartets(self, person_id, other_id):
+        """
+        :return: tuple of the ids of the quartets two people sang in together
+        """
+        a, b = sorted((self.canonical.get(person_id, person_id), self.canonical.get(other_id, other_id)))
+        return self.together.get((a, b), ())
+
+    def shortest_path(self, person_id, other_id):
+        """
+        Breadth first search for the fewest hops between two people
+        :return: list of person ids from one to the other, or None if they aren't connected
+        """
+        start, goal = self.row(person_id), self.row(other_id)
+        if start is None or goal is None:
+            return None
+        parents = {start: None}
+        queue = deque([start])
+        while queue and goal not in parents:
+            row = queue.popleft()
+            for neighbour in self.neighbours[self.offsets[row]:self.offsets[row + 1]]:
+                if neighbour not in parents:
+                    parents[neighbour] = row
+                    queue.append(neighbour)
+        if goal not in parents:
+            return None
+        path = [goal]
+        while parents[path[-1]] is not None:
+            path.append(parents[path[-1]])
+        return [self.people[row] for row in reversed(path)]
+
+
+class CollaborationGraph:
+    """
+    Keeps an Adjacency up to date with the Member table
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.adjacency = None
+        self.stamp = None
+        # the change log seq when the stamp was taken
+        self.seq = 0
+        self.checked = 0
+        # what the adjacency is built from
+        self.canonical = {}
+        self.quartets = {}
+        self.memberships = defaultdict(set)
+        self.together = defaultdict(set)
+
+    @staticmethod
+    def current_stamp():
+        """
+        :return: a cheap summary of the tables the graph is built from, which changes when they do
+        """
+        members = Member.objects.aggregate(max_id=Max('id'), n=Count('id'))
+        people = Person.objects.aggregate(n=Count('alias_of'), total=Sum('alias_of'))
+        quartets = Contestant.objects.aggregate(n=Count('alias_of'), total=Sum('alias_of'))
+        return members['max_id'] or 0, members['n'], people['n'], people['total'], quartets['n'], quartets['total']
+
+    def members_changed(self):
+        """
+        :return: whether Member rows have been changed or deleted since the stamp was taken, which adding the new rows
+            doesn't account for
+        """
+        return ChangeLogEntry.objects.filter(seq__gt=self.seq, model='member').exclude(action=INSERT).exists()
+
+    def get(self):
+        """
+        :return: an up to date Adjacency, checking the database at most every CHECK_INTERVAL seconds
+        """
+        if self.adjacency is None or time.time() - self.checked > CHECK_INTERVAL:
+            self.refresh()
+        return self.adjacency
+
+    def refresh(self):
+        with self.lock:
+            # read the seq first, so that changes made while refreshing are looked at next time
+            seq = ChangeLogEntry.objects.aggregate(seq=Max('seq'))['seq'] or 0
+            stamp = self.current_stamp()
+            self.checked = time.time()
+            changed = self.stamp is not None and self.members_changed()
+            if stamp == self.stamp and not changed:
+                self.seq = seq
+                return
+            if self.stamp is None or changed or stamp[2:] != self.stamp[2:] or not self.add_new_members(stamp):
+                self.load()
+            self.stamp = stamp
+            self.seq = seq
+            self.adjacency = Adjacency(self.canonical, self.memberships, self.together)
+
+    def load(self):
+        self.canonical = canonical_ids(model=Person)
+        self.quartets = canonical_ids()
+        self.memberships = defaultdict(set)
+        self.together = defaultdict(set)
+        self.add_members(Member.objects.filter(contestantapp__contest_type='q'))
+
+    def add_new_members(self, stamp):
+        """
+        Add the Member rows created since the graph was last refreshed
+        :return: False if rows have been deleted or changed as well, so the graph needs to be loaded again
+        """
+        max_id, n = self.stamp[:2]
+        new = list(Member.objects.filter(id__gt=max_id).values_list('contestantapp_id', 'contestantapp__contest_type'))
+        if stamp[1] - n != len(new):
+            return False
+        # add whole appearances, so the new members are paired with any older members of the same appearance
+        apps = {app for app, type in new if type == 'q'}
+        members = Member.objects.filter(contestantapp_id__in=apps)
+        people = set(members.values_list('person_id', flat=True)) - set(self.canonical)
+        quartets = set(members.values_list('contestantapp__contestant_id', flat=True)) - set(self.quartets)
+        self.canonical.update(canonical_ids(people, model=Person))
+        self.quartets.update(canonical_ids(quartets))
+        self.add_members(members)
+        return True
+
+    def add_members(self, members):
+        """
+        :param members: Member queryset, of quartet appearances
+        """
+        appearances = defaultdict(set)
+        rows = members.values_list('contestantapp_id', 'contestantapp__contestant_id', 'person_id')
+        for app, contestant, person in rows:
+            appearances[(app, self.quartets.get(contestant, contestant))].add(self.canonical.get(person, person))
+        for (app, quartet), people in appearances.items():
+            for person in people:
+                self.memberships[person].add(quartet)
+            for pair in combinations(sorted(people), 2):
+                self.together[pair].add(quartet)
+
+
+GRAPH = CollaborationGraph()
+
+
+def get_graph():
+    """
+    :return: the collaboration graph, as an Adjacency
+    """
+    return GRAPH.get()
+
+
+def sync_graph(seq):
+    """
+    Bring the graph up to date with a change log seq, if this process has loaded it and it's older, e.g. before
+    rendering a page that will be cached under that seq
+    """
+    if GRAPH.adjacency is not None and GRAPH.seq < seq:
+        GRAPH.refresh()
+
+
+def refresh_graph():
+    """
+    Bring the graph up to date after an import, if this process has loaded it
+    """
+    if GRAPH.adjacency is not None:
+        GRAPH.refresh()
@@ -0,0 +1,170 @@
+"""
+Precomputed score distributions, for answering "how good was 72.4% at a BABS quartet contest in 2016?".
+
+The scores of every contestant and song appearance are grouped by (assoc, type, stream, year) and stored sorted in
+ScoreDistribution, so the percentile rank of a score is a binary search instead of an aggregate over the appearances.
+"""
+
+from heapq import merge
+from django.db import transaction
+from django.db.models import Q
+from .models import *
+from .bulk import insert_ignore
+from .changes import log_rebuild
+from .ranking import partition
+
+# the percentage fields with a distribution
+DISTRIBUTION_FIELDS = ('pc_score', 'm_pc', 'p_pc', 's_pc')
+
+# ScoreDistribution.level for each kind of appearance
+LEVELS = (
+    ('c', ContestantApp),
+    ('s', SongApp),
+)
+
+
+def group_key(assoc, type, stream, date):
+    """
+    :return: the (assoc, type, stream, year) that an appearance's scores are compared within
+    """
+    return assoc, type, stream or '', date.year
+
+
+def appearance_scores(model, filter=None):
+    """
+    The scores of some appearances, grouped
+    :param model: ContestantApp or SongApp
+    :param filter: Q object selecting the appearances, or None for all of them
+    :return: dict of group key: {field: list of scores in tenths of a percent}
+    """
+    appearances = model.objects.exclude(contest_date=None)
+    if filter is not None:
+        appearances = appearances.filter(filter)
+    rows = appearances.values_list('contest_assoc', 'contest_type', 'contest_stream', 'contest_date',
+                                   *DISTRIBUTION_FIELDS)
+    groups = {}
+    for key, group in partition(rows, lambda row: group_key(*row[:4])).items():
+        groups[key] = {
+            field: [int(round(row[4 + i] * 10)) for row in group if row[4 + i] is not None]
+            for i, field in enumerate(DISTRIBUTION_FIELDS)
+        }
+    return groups
+
+
+def group_filter(keys):
+    """
+    :return: Q object selecting the appearances in any of the groups
+    """
+    query = Q(pk__in=[])
+    for assoc, type, stream, year in keys:
+        streams = Q(contest_stream=stream) if stream else Q(contest_stream=None) | Q(contest_stream='')
+        query |= Q(streams, contest_assoc=assoc, contest_type=type, contest_date__year=year)
+    return query
+
+
+def key_filter(key):
+    assoc, type, stream, year = key
+    return Q(assoc=assoc, type=type, stream=stream, year=year)
+
+
+###############################################################
+# Building the distributions
+###############################################################
+
+
+def rebuild_distributions(contests=None):
+    """
+    Recalculate the distributions from scratch, either all of them, or the ones for the groups of some contests
+    :param contests: iterable of Contest objects, or None for all contests
+    :return: number of distributions written
+    """
+    if contests is None:
+        keys = None
+    else:
+        keys = {group_key(c.assoc, c.type, c.stream, c.date) for c in contests}
+        if not keys:
+            return 0
+    distributions = []
+    for level, model in LEVELS:
+        for key, scores in appearance_scores(model, None if keys is None else group_filter(keys)).items():
+            for field, values in scores.items():
+                distribution = ScoreDistribution(assoc=key[0], type=key[1], stream=key[2], year=key[3],
+                                                 level=level, field=field)
+                distribution.values = sorted(values)
+                distributions.append(distribution)
+    with transaction.atomic():
+        existing = ScoreDistribution.objects.all()
+        if keys is not None:
+            query = Q(pk__in=[])
+            for key in keys:
+                query |= key_filter(key)
+            existing = existing.filter(query)
+        existing.delete()
+        ScoreDistribution.objects.bulk_create(distributions, batch_size=100)
+        log_rebuild()
+    return len(distributions)
+
+
+def add_to_distributions(contest):
+    """
+    Merge the scores of a newly imported contest into the distributions for its group,
+    without reading the group's other appearances
+    :param contest: Contest object
+    """
+    key = group_key(contest.assoc, contest.type, contest.stream, contest.date)
+    new = {}
+    for level, model in LEVELS:
+        scores = appearance_scores(model, Q(contest_id=contest.id) if model is ContestantApp
+                                   else Q(contestantapp__contest_id=contest.id))
+        if key in scores:
+            new[level] = scores[key]
+    if not new:
+        return
+
+    with transaction.atomic():
+        # make sure the rows exist, then lock them, so that imports of other contests in the group wait their turn
+        # (select_for_update() does nothing on SQLite, which only allows one writer at a time anyway)
+        insert_ignore(ScoreDistribution, ['assoc', 'type', 'stream', 'year', 'level', 'field', 'n', 'packed'], [
+            key + (level, field, 0, b'') for level in new for field in DISTRIBUTION_FIELDS
+        ])
+        distributions = ScoreDistribution.objects.select_for_update().filter(key_filter(key))
+        for distribution in distributions:
+            values = new.get(distribution.level, {}).get(distribution.field)
+            if values:
+                distribution.values = list(merge(distribution.values, sorted(values)))
+                distribution.save(update_fields=['n', 'packed'])
+
+
+###############################################################
+# Looking up percentile ranks
+###############################################################
+
+
+class PercentileLookup:
+    """
+    Finds the percentile ranks of appearances' scores, loading each group's distributions the first time they're needed
+    """
+    def __init__(self):
+        self.distributions = {}
+
+    def get(self, key, level, field):
+        if key not in self.distributions:
+            self.distributions[key] = {
+                (d.level, d.field): d for d in ScoreDistribution.objects.filter(key_filter(key))
+            }
+        return self.distributions[key].get((level, field))
+
+    def percentile_rank(self, appearance, field='pc_score'):
+        """
+        :param appearance: ContestantApp or SongApp
+        :param field: one of DISTRIBUTION_FIELDS
+        :return: 0 to 100, or None if there's no distribution for the appearance's group
+        """
+        level = 's' if isinstance(appearance, SongApp) else 'c'
+        score = getattr(appearance, field)
+        if score is None or appearance.contest_date is None:
+            return None
+        key = group_key(appearance.contest_assoc, appearance.contest_type, appearance.contest_stream,
+                        appearance.contest_date)
+        distribution = self.get(key, level, field)
+        return distribution.percentile_rank(score) if distribution else None
@@ -0,0 +1,65 @@
+"""
+A contestant's history as a time series, for charting: one point per appearance, read with one query over the
+contestantapp_contestant_date index, and optionally downsampled so that long careers stay small to send and draw.
+"""
+
+from .models import *
+
+# the scores in each point, as well as the date, contest, rank and rating
+HISTORY_FIELDS = ('m_pc', 'p_pc', 's_pc', 'pc_score')
+
+
+def downsample(xs, ys, n_points):
+    """
+    Choose the points that best keep the shape of a line, with the Largest Triangle Three Buckets algorithm:
+    the first and last points are kept, and each bucket in between keeps the point making the largest triangle with
+    the point kept from the bucket before and the average of the bucket after.
+    :param xs: list of x values, in order
+    :param ys: list of y values
+    :param n_points: the number of points to keep, at least 3
+    :return: list of the indexes of the points to keep
+    """
+    n = len(xs)
+    if n <= n_points:
+        return list(range(n))
+    kept = [0]
+    size = (n - 2) / (n_points - 2)
+    for bucket in range(n_points - 2):
+        start, end = int(bucket * size) + 1, int((bucket + 1) * size) + 1
+        next_start, next_end = end, min(int((bucket + 2) * size) + 1, n)
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+        ax, ay = xs[kept[-1]], ys[kept[-1]]
+        kept.append(max(range(start, end), key=lambda i: abs(
+            (ax - avg_x) * (ys[i] - ay) - (ax - xs[i]) * (avg_y - ay))))
+    kept.append(n - 1)
+    return kept
+
+
+def contestant_history(contestant, n_points=None):
+    """
+    :param contestant: Contestant object
+    :param n_points: the most points to return, or None for every appearance
+    :return: dict of field: list of values, with one value per point in each list
+    """
+    rows = ContestantApp.objects.filter(contestant=contestant).exclude(contest_date=None).order_by(
+        'contest_date', 'contest_id',
+    ).values_list('contest_date', 'contest_id', 'contest__contest', 'contest_assoc', 'rank', *HISTORY_FIELDS,
+                  'ratinghistory__after')
+    rows = list(rows)
+    if n_points and len(rows) > n_points:
+        pc_score = 5 + HISTORY_FIELDS.index('pc_score')
+        rows = [rows[i] for i in downsample([row[0].toordinal() for row in rows],
+                                            [float(row[pc_score]) for row in rows], max(n_points, 3))]
+    columns = list(zip(*rows)) or [()] * (6 + len(HISTORY_FIELDS))
+    series = {
+        'date': [d.isoformat() for d in columns[0]],
+        'contest_id': list(columns[1]),
+        'contest': list(columns[2]),
+        'assoc': list(columns[3]),
+        'rank': list(columns[4]),
+    }
+    for i, field in enumerate(HISTORY_FIELDS):
+        series[field] = [float(value) for value in columns[5 + i]]
+    series['rating'] = [None if value is None else round(value, 1) for value in columns[-1]]
+    return series
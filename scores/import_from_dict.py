@@ -1,11 +1,34 @@
+import logging, zlib
+from collections import OrderedDict
 from datetime import datetime
+from django.db import connection, transaction
+from django.db.models.functions import Upper
 from .models import *
+from .bulk import insert_ignore
+from .changes import INSERT, batch_changes, log_changes
+from .distributions import add_to_distributions
+from .ratings import update_ratings
+from .leaderboards import update_leaderboards
+from .judging import add_judge_stats
+from .collaboration import refresh_graph
+from .slugs import allocate_slugs
+from .ranking import calculate_ranks
+from .instrumentation import stage, timed, count, count_queries
+
+logger = logging.getLogger(__name__)
+
+# fields that identify a contest, as in the contest_natural_key unique index
+CONTEST_KEY = ('assoc', 'contest', 'date', 'stream')
+
+# times to try inserting new names, if another import takes one of the slugs first
+INSERT_ATTEMPTS = 3
 
 ###############################################################
 # Functions to manipulate a contest dict
 ###############################################################
 
 
+@timed('calculate_scores')
 def calculate_scores(contest):
     """
     Fill in the missing scores for a contest object, e.g. category total scores and song percentages
@@ -16,7 +39,7 @@ def calculate_scores(contest):
 
     # Very quick and dirty hack to deal with rolling panels - assuming only half the judges are on the panel at a time
     # Note str.find returns -1 if substring is not found
-    rolling_panel_factor = 1 if contest['raw_text'].find('Rolling Panel:') == -1 else 2
+    rolling_panel_factor = 1 if (contest.get('raw_text') or '').find('Rolling Panel:') == -1 else 2
 
     # Calculate number of judges excluding administrators
     n_judges_by_cat = {cat: sum(1 / rolling_panel_factor for j in contest['judges'] if j['cat'] == cat) for cat in CATS}
@@ -68,11 +91,15 @@ def prepare_for_import(contest):
     except ValueError:
         contest['date'] = datetime.strptime(contest['date'], '%d %b %Y')
 
-    # shorten assoc field
+    # shorten assoc field (contests parsed from RTF files already have the short name)
     contest['assoc'] = {
         'THE BRITISH ASSOCIATION OF BARBERSHOP SINGERS': 'BABS',
         'LADIES ASSOCIATION OF BRITISH BARBERSHOP SINGERS': 'LABBS',
-    }[contest['assoc']]
+    }.get(contest['assoc'], contest['assoc'])
+
+    # contests parsed from RTF files record the file they came from instead of a url
+    if 'url' not in contest:
+        contest['url'] = contest.pop('filename')
 
     # calculate missing fields
     calculate_scores(contest)
@@ -85,116 +112,192 @@ def prepare_for_import(contest):
 ###############################################################
 
 
+def get_canonical(model, name, **kwargs):
+    """
+    Get (or create if they don't exist) a Person, Contestant or Song by name, ignoring case,
+    and follow any aliases to the canonical object
+    :param model: Person, Contestant or Song
+    :param name: name as recorded on the scoresheet
+    :param kwargs: extra fields to match on
+    :return: canonical object
+    """
+    with stage('resolve_names'):
+        obj, created = model.objects.get_or_create(
+            name__iexact=name,
+            defaults={'name': name},
+            **kwargs
+        )
+        logger.debug("%s %s %s", "created" if created else "got", model._meta.model_name, obj)
+        count('%s_created' % model._meta.model_name, created)
+        # get the canonical name if this name is an alias
+        while obj.alias_of:
+            logger.debug("following %s alias", model._meta.model_name)
+            obj = obj.alias_of
+    return obj
+
+
+def name_keys(name):
+    """
+    The upper case forms of a name that the database might compare with, as SQLite's UPPER() only changes ASCII letters
+    """
+    return {name.upper(), ''.join(c.upper() if c < '\x80' else c for c in name)}
+
+
+def resolve_names(model, names, **kwargs):
+    """
+    Get (or create if they don't exist) the canonical Person, Contestant or Song for each of a batch of names,
+    like get_canonical(), but with a couple of queries for the whole batch.
+    New names are inserted with INSERT ... ON CONFLICT DO NOTHING, so if another import inserts the same name at the
+    same time, the unique index on the upper case name keeps just one of them, and both imports use that one
+    :param model: Person, Contestant or Song
+    :param names: iterable of names as recorded on the scoresheet
+    :param kwargs: extra fields to match on
+    :return: dict of name: canonical object
+    """
+    names = list(OrderedDict.fromkeys(names))
+    keys = set().union(*(name_keys(name) for name in names))
+
+    def existing():
+        # by upper case name; if a name matches more than one object, the oldest wins
+        objects = model.objects.annotate(upper_name=Upper('name')).filter(upper_name__in=keys, **kwargs)
+        return {obj.upper_name: obj for obj in objects.select_related('alias_of').order_by('-pk')}
+
+    with stage('resolve_names'):
+        found = existing()
+        found_before = {obj.pk for obj in found.values()}
+        created = 0
+        for attempt in range(INSERT_ATTEMPTS):
+            new = OrderedDict()
+            for name in names:
+                if not name_keys(name) & found.keys():
+                    new.setdefault(name.upper(), name)
+            if not new:
+                break
+            # a name is skipped if another import has just inserted it, or has just taken its slug,
+            # in which case the next attempt allocates another slug
+            new_names = list(new.values())
+            with stage('db_write'):
+                created += insert_ignore(model, ['name', 'slug'] + list(kwargs), [
+                    (name, slug) + tuple(kwargs.values())
+                    for name, slug in zip(new_names, allocate_slugs(model, new_names))
+                ])
+            found = existing()
+        logger.debug("got %s %ss, created %s", len(names) - created, model._meta.model_name, created)
+        if created:
+            # the names this import (or another one at the same time) inserted
+            log_changes(model, {obj.pk for obj in found.values()} - found_before, INSERT)
+        count('%s_created' % model._meta.model_name, created)
+
+        canonical = {}
+        for name in names:
+            obj = next((found[key] for key in name_keys(name) if key in found), None)
+            if obj is None:
+                # e.g. names differing only in the case of non-ASCII letters, which SQLite treats as different
+                canonical[name] = get_canonical(model, name, **kwargs)
+                continue
+            # get the canonical name if this name is an alias
+            while obj.alias_of:
+                obj = obj.alias_of
+            canonical[name] = obj
+    return canonical
+
+
+def lock_contest(d):
+    """
+    Make imports of the same contest wait for each other until the end of the transaction, so that only one of them
+    imports it. Imports of different contests don't wait. This is only needed on PostgreSQL, as SQLite only lets one
+    connection write at a time anyway.
+    :param d: contest dict
+    """
+    if connection.vendor == 'postgresql':
+        key = '|'.join(str(d.get(k)) for k in CONTEST_KEY)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [zlib.crc32(key.encode('utf-8'))])
+
+
 def import_contest_from_dict(d):
+    with stage('import_contest'), count_queries(), transaction.atomic(), batch_changes():
+        return _import_contest_from_dict(d)
 
-    # construct top-level object (Contest) using the top-level dict (excluding nested dicts)
-    contest, contest_created = Contest.objects.get_or_create(
-        **{k: v for k, v in d.items() if k not in ('judges', 'contestants', 'url')},
-        contesturl__url=d['url'],
-    )
-    print("%s contest %s" % ("created" if contest_created else "got", contest))
+
+def _import_contest_from_dict(d):
+
+    # construct top-level object (Contest) using the top-level dict (excluding nested dicts),
+    # unless a contest with the same natural key already exists
+    fields = [k for k in d if k not in ('judges', 'contestants', 'url', 'raw_text')]
+    with stage('resolve_names'):
+        lock_contest(d)
+        contest_created = insert_ignore(Contest, fields, [[d[k] for k in fields]]) == 1
+        contest = Contest.objects.get(**{k: d.get(k) for k in CONTEST_KEY})
+    logger.info("%s contest %s", "created" if contest_created else "got", contest)
 
     # if the contest already existed, don't import it
     if not contest_created:
-        print("CONTEST NOT IMPORTED")
+        logger.info("contest not imported, it already exists")
+        count('contests_skipped')
         return
-
-    # add url
-    url, created = contest.contesturl_set.get_or_create(url=d['url'])
+    log_changes(Contest, [contest.pk], INSERT)
+
+    # add url and raw text
+    with stage('db_write'):
+        url, created = contest.contesturl_set.get_or_create(url=d['url'])
+        if d.get('raw_text'):
+            raw_text = ContestRawText(contest=contest)
+            raw_text.text = d['raw_text']
+            raw_text.save()
+
+    # get (or create if they don't exist) every person, contestant and song in the contest, a batch of each at a time
+    judges = d.get('judges', [])
+    contestants = d.get('contestants', [])
+    people = resolve_names(Person, [j['name'] for j in judges] +
+                           [m['name'] for c in contestants for m in c.get('members', [])])
+    groups = resolve_names(Contestant, [c['name'] for c in contestants], assoc=d['assoc'], type=d['type'])
+    songs = resolve_names(Song, [s['name'] for c in contestants for s in c.get('songs', [])])
 
     # add judges
-    print("adding %s judges" % len(d['judges']))
-    for j in d.get('judges', []):
-        # create person if they don't exist
-        person, created = Person.objects.get_or_create(
-            name__iexact=j['name'],
-            defaults={'name': j['name']},
-        )
-        print("%s person %s" % ("created" if created else "got", person))
-        # get the canonical name if this name is an alias
-        while person.alias_of:
-            print("following judge alias")
-            person = Person.objects.get(id=person.alias_of)
+    logger.debug("adding %s judges", len(judges))
+    for j in judges:
         # create the (record of) the person's appearance as a judge
-        contest.judge_set.create(
-            person=person,
-            **j,
-        )
+        with stage('db_write'):
+            contest.judge_set.create(
+                person=people[j['name']],
+                **j,
+            )
 
     # add contestants
-    print("adding %s contestants" % len(d['contestants']))
-    for c in d.get('contestants', []):
-        # create contestant if they don't exist
-        contestant, created = Contestant.objects.get_or_create(
-            name__iexact=c['name'],
-            assoc=d['assoc'],
-            type=d['type'],
-            defaults={'name': c['name']},
-        )
-        print("%s contestant %s" % ("created" if created else "got", contestant))
-        # get the canonical name if this name is an alias
-        while contestant.alias_of:
-            print("following contestant alias")
-            contestant = Contestant.objects.get(id=contestant.alias_of)
+    logger.debug("adding %s contestants", len(contestants))
+    for c in contestants:
         # create the (record of) the contestant's appearance in this contest
-        contestantapp = contest.contestantapp_set.create(
-            contestant=contestant,
-            **{k: v for k, v in c.items() if k not in ('members', 'songs')},
-        )
+        with stage('db_write'):
+            contestantapp = contest.contestantapp_set.create(
+                contestant=groups[c['name']],
+                **{k: v for k, v in c.items() if k not in ('members', 'songs')},
+            )
 
         # add songs
         for s in c.get('songs', []):
-            # create song if it doesn't exist
-            song, created = Song.objects.get_or_create(
-                name__iexact=s['name'],
-                defaults={'name': s['name']},
-            )
-            print("%s song %s" % ("created" if created else "got", song))
-            # get the canonical name if this name is an alias
-            while song.alias_of:
-                print("following song alias")
-                song = Song.objects.get(id=song.alias_of)
             # create the (record of) the song's appearance during this contestant's appearance
-            contestantapp.songapp_set.create(
-                song=song,
-                **s,
-            )
+            with stage('db_write'):
+                contestantapp.songapp_set.create(
+                    song=songs[s['name']],
+                    **s,
+                )
 
         # add members (singers or directors)
         for m in c.get('members', []):
-            # create person if they don't exist
-            person, created = Person.objects.get_or_create(
-                name__iexact=m['name'],
-                defaults={'name': m['name']},
-            )
-            print("%s person %s" % ("created" if created else "got", person))
-            # get the canonical name if this name is an alias
-            while person.alias_of:
-                print("following member alias")
-                person = Person.objects.get(id=person.alias_of)
             # create the (record of) the person's appearance as a member of this contestant
-            contestantapp.member_set.create(
-                person=person,
-                **m,
-            )
-
-###############################################################
-# Functions to merge two contests
-###############################################################
-
-    # If we've added more contestants to an existing contest, we need to recalculate the overall rank
-    if not contest_created:
-        rank, tie_score = 0, 0
-        for contestantapp in contest.contestantapp_set.all().order_by('-tot_score'):
-            rank += 1
-            contestantapp.rank = rank - (1 if contestantapp.tot_score == tie_score else 0)
-            contestantapp.save()
-            tie_score = contestantapp.tot_score
-
-        # add stream rank
-        """
-        streamrank = contestantapp.streamrank_set.get_or_create(
-            stream=d['stream'],
-            defaults={'rank': c['rank']},
-        )
-        """
+            with stage('db_write'):
+                contestantapp.member_set.create(
+                    person=people[m['name']],
+                    **m,
+                )
+
+    # add the stream ranks, and the category ranks that some scoresheets don't give
+    with stage('db_write'):
+        calculate_ranks([contest])
+        add_to_distributions(contest)
+        update_ratings(contest)
+        update_leaderboards(contest)
+        add_judge_stats(contest)
+    transaction.on_commit(refresh_graph)
+    count('contests_imported')
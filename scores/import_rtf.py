@@ -1,9 +1,13 @@
-import re, string, csv, unicodedata, os, json, subprocess, pprint, pickle, decimal
+import re, string, csv, unicodedata, os, json, subprocess, pprint, pickle, decimal, logging
 
 try:
     from . extract_rtf import striprtf
+    from . snapshot import SnapshotWriter
+    from . instrumentation import stage, timed, STATS
 except:
     from extract_rtf import striprtf
+    from snapshot import SnapshotWriter
+    from instrumentation import stage, timed, STATS
 
 from decimal import *
 
@@ -12,6 +16,8 @@ decimal.setcontext(decimal.BasicContext)
 
 pp = pprint.PrettyPrinter(indent=4).pprint
 
+logger = logging.getLogger(__name__)
+
 PARTS = ['tenor', 'lead', 'bari', 'bass']
 CATS = {
     'Music': 'm',
@@ -86,13 +92,13 @@ def convert_all_rft2txt(dir):
         outfile = change_ext(infile, 'txt')
         try:
             with open(infile, 'rb') as f:
-                t = striprtf(f.read())
+                rtf = f.read()
+            with stage('striprtf'):
+                t = striprtf(rtf)
             with open(outfile, 'w') as f:
                 f.write(t)
-        except Exception as e:
-            print("error whilst parsing %s" % infile)
-            print(e)
-            pass
+        except Exception:
+            logger.exception("error whilst parsing %s", infile)
 
 
 ######################################################################
@@ -170,7 +176,7 @@ def parse_song(text):
 
     # If the first item in the list is a number, it means there is no title
     if split[0].isdigit():
-        print("warning - no song title")
+        logger.warning("no song title")
         song['name'] = "unknown"
     else:
         song['name'] = split.pop(0)
@@ -195,6 +201,7 @@ def parse_song(text):
     return song
 
 
+@timed('calculate_scores')
 def calculate_scores(contest):
     """
     Fill in the missing scores for a contest object, e.g. category total scores and song percentages
@@ -220,7 +227,7 @@ def calculate_scores(contest):
         for song in contestant['songs']:
             song['tot_score'] = sum(song[cat] for cat in CATS)
             if song['tot_score'] == 0:
-                print('warning - delete %s from %s' % (song, contestant))
+                logger.warning('deleting %s from %s', song, contestant)
         contestant['songs'] = [s for s in contestant['songs'] if s['tot_score'] > 0]
 
         # calculate percentage scores for each song
@@ -268,57 +275,57 @@ def txt_to_dict(filename):
         'filename': filename
     }
 
-    print('parsing %s' % filename)
+    logger.info('parsing %s', filename)
 
     with open(filename, 'r') as f:
         plain_text = f.read()
-    lines = plain_text.splitlines()
-
-
-    # Get the association from the first line of text
-    contest['assoc'] = ASSOCS[lines[0]]
-
-    # Get the contest, location, and year from the third line of text
-    r = re.compile(r'(?P<contest>.*)  -  (?P<location>.*): (?P<year>[\d/]*)')
-    m = r.match(lines[2])
-    for key in ('contest', 'location', 'year'):
-        if len(m.group(key)) > 0:
-            contest[key] = m.group(key)
+    with stage('parse'):
+        lines = plain_text.splitlines()
+
+        # Get the association from the first line of text
+        contest['assoc'] = ASSOCS[lines[0]]
+
+        # Get the contest, location, and year from the third line of text
+        r = re.compile(r'(?P<contest>.*)  -  (?P<location>.*): (?P<year>[\d/]*)')
+        m = r.match(lines[2])
+        for key in ('contest', 'location', 'year'):
+            if len(m.group(key)) > 0:
+                contest[key] = m.group(key)
+            else:
+                contest[key] = "UNKNOWN"
+                logger.warning('no %s in %s', key, filename)
+
+        # Chorus or quartet contest?
+        if 'CHORUS' in contest['contest']:
+            contest['type'] = 'c'
+        elif 'QUARTET' in contest['contest']:
+            contest['type'] = 'q'
         else:
-            contest[key] = "UNKNOWN"
-            print('warning - no %s' % key)
-
-    # Chorus or quartet contest?
-    if 'CHORUS' in contest['contest']:
-        contest['type'] = 'c'
-    elif 'QUARTET' in contest['contest']:
-        contest['type'] = 'q'
-    else:
-        print('warning - unknown contest type')
+            logger.warning('unknown contest type in %s', filename)
 
-    # Parse the contest date
-    m = re.search('Contest date: (\d{2}/\d{2}/\d{4})', plain_text)
-    if m:
-        contest['date'] = m.group(1)
-    else:
-        contest['date'] = "01/01/1900"
-        print('warning - no contest date')
-
-    # Parse the judges
-    contest['judges'] = []
-    r = re.compile('(Music|Performance|Singing|CA): (.+)')
-    for m in r.finditer(plain_text):
-        # Convert 'Performance' to 'p' etc
-        cat = CATS[m.group(1)]
-        # Split the comma separated list of judges' names
-        names = re.split(', *', m.group(2))
-        # Add to list of judges
-        for name in names:
-            contest['judges'].append({'cat': cat, 'name': name.strip()})
-
-    # Parse the contestants
-    r = re.compile(r'(\d+:.*?)\n\tCategory', re.DOTALL)
-    contest['contestants'] = [parse_contestant(m.group(1)) for m in r.finditer(plain_text)]
+        # Parse the contest date
+        m = re.search('Contest date: (\d{2}/\d{2}/\d{4})', plain_text)
+        if m:
+            contest['date'] = m.group(1)
+        else:
+            contest['date'] = "01/01/1900"
+            logger.warning('no contest date in %s', filename)
+
+        # Parse the judges
+        contest['judges'] = []
+        r = re.compile('(Music|Performance|Singing|CA): (.+)')
+        for m in r.finditer(plain_text):
+            # Convert 'Performance' to 'p' etc
+            cat = CATS[m.group(1)]
+            # Split the comma separated list of judges' names
+            names = re.split(', *', m.group(2))
+            # Add to list of judges
+            for name in names:
+                contest['judges'].append({'cat': cat, 'name': name.strip()})
+
+        # Parse the contestants
+        r = re.compile(r'(\d+:.*?)\n\tCategory', re.DOTALL)
+        contest['contestants'] = [parse_contestant(m.group(1)) for m in r.finditer(plain_text)]
 
     # Calculate totals and percentages
     calculate_scores(contest)
@@ -337,22 +344,18 @@ def txt_to_dicts(dir):
 
 if __name__ == "__main__":
 
+    logging.basicConfig(level=logging.INFO)
+
     dir = r'C:\Users\Li-Wen Yip\Documents\GitHub\barbershop-scoresheet-scraper\BABS RTF'
-    contests = []
 
     # Convert all the RTF files to TXT
     convert_all_rft2txt(dir)
 
-    # Iterate through the text files
-    for contest in txt_to_dicts(dir):
-
-        # Save as pickle
-        with open(change_ext(contest['filename'], 'pickle'), 'wb') as outfile:
-            pickle.dump(contest, outfile)
-
-        # Save as json
-        with open(change_ext(contest['filename'], 'json'), 'w') as outfile:
-            json.dump(contest, outfile, indent=2, cls=DecimalEncoder)
+    # Iterate through the text files, saving each contest to a snapshot as soon as it has been parsed
+    with SnapshotWriter(open(os.path.join(dir, 'contests.bss'), 'wb')) as snapshot:
+        for contest in txt_to_dicts(dir):
+            snapshot.write(contest)
 
-        # Append to the list of contests
-        contests.append(contest)
+    # Report where the time went
+    for line in STATS.report():
+        logger.info(line)
@@ -0,0 +1,174 @@
+"""
+Timing and counting instrumentation for the import pipeline.
+
+Each stage of the pipeline (fetch, pdftotext, striprtf, parse, calculate_scores, resolve_names, db_write) is timed with
+    with stage('fetch'):
+        ...
+and the timings are collected in a histogram per stage, so a big import run can report where the time went.
+"""
+
+import cProfile, logging, time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# histogram bucket upper bounds, in milliseconds (the last bucket is everything slower)
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class Histogram:
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+
+class Stats:
+    """
+    Counters and histograms for the current process
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counters = defaultdict(int)
+        self.timings = defaultdict(Histogram)
+        self.queries = Histogram(bounds=(1, 5, 10, 50, 100, 500, 1000))
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def observe(self, name, ms):
+        self.timings[name].observe(ms)
+
+    def report(self):
+        """
+        :return: list of lines summarising the counters and histograms
+        """
+        lines = ['%-20s %8s %10s %10s %10s' % ('stage', 'count', 'total ms', 'mean ms', 'max ms')]
+        for name, h in sorted(self.timings.items(), key=lambda item: -item[1].total):
+            lines.append('%-20s %8d %10.1f %10.2f %10.2f' % (name, h.count, h.total, h.mean, h.max))
+        if self.queries.count:
+            lines.append('queries per contest: mean %.1f, max %d, total %d'
+                         % (self.queries.mean, self.queries.max, self.queries.total))
+        for name, n in sorted(self.counters.items()):
+            lines.append('%s: %s' % (name, n))
+        return lines
+
+
+STATS = Stats()
+
+
+###############################################################
+# Instrumenting code
+###############################################################
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a stage of the pipeline
+    :param name: name of the stage, e.g. 'fetch'
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STATS.observe(name, (time.perf_counter() - start) * 1000)
+
+
+def timed(name):
+    """
+    Decorator to time every call of a function as a stage of the pipeline
+    :param name: name of the stage
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    STATS.count(name, n)
+
+
+@contextmanager
+def captured_queries():
+    """
+    Collect the SQL of the database queries run inside the block, including those of test client requests, which
+    clear connection.queries_log as they start
+    :return: list of SQL, complete at the end of the block
+    """
+    from django.core.signals import request_started
+    from django.db import connection, reset_queries
+    queries = []
+    if hasattr(connection, 'execute_wrapper'):
+        # Django 2.0+: see every query as it runs
+        def wrapper(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+        with connection.execute_wrapper(wrapper):
+            yield queries
+        return
+    # older Django: turn on the debug cursor, and read its log, which only keeps the last 9000 queries, so start it
+    # empty and don't let requests empty it
+    force_debug_cursor, connection.force_debug_cursor = connection.force_debug_cursor, True
+    reset_queries()
+    request_started.disconnect(reset_queries)
+    try:
+        yield queries
+    finally:
+        request_started.connect(reset_queries)
+        connection.force_debug_cursor = force_debug_cursor
+        if len(connection.queries_log) == connection.queries_log.maxlen:
+            logger.warning("more than %s queries, only the last ones were captured", connection.queries_log.maxlen)
+        queries.extend(query['sql'] for query in connection.queries_log)
+
+
+@contextmanager
+def count_queries():
+    """
+    Count the database queries run inside the block (e.g. while importing one contest)
+    """
+    with captured_queries() as queries:
+        yield
+    STATS.queries.observe(len(queries))
+    STATS.count('queries', len(queries))
+
+
+@contextmanager
+def profiled(filename):
+    """
+    Run the block under cProfile, and dump the stats to a file if a filename is given.
+    The dump can be read with pstats, snakeviz, or converted to a flame graph with flameprof.
+    :param filename: file to write, or None to not profile
+    """
+    if not filename:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(filename)
+        logger.info('wrote profile to %s', filename)
@@ -0,0 +1,129 @@
+"""
+Judging analytics: how the categories a judge sat on scored, compared with how the same appearances scored overall.
+
+Judge and ContestantApp are combined into two sparse matrices, held as dicts of non-zero entries:
+- judge x category: panels sat on, appearances judged and the running totals (JudgeStats)
+- judge x contestant x category: the same totals for each contestant they judged (JudgeContestantStats)
+Both are sums, so a new contest's entries are added to the stored totals instead of recalculating them.
+Aliases (of judges and of contestants) are folded into the names they're aliases of.
+"""
+
+from collections import defaultdict
+from django.db import transaction
+from .models import *
+from .bulk import insert_ignore, bulk_increment
+from .changes import log_rebuild
+from .ratings import canonical_ids
+
+# the ContestantApp field scored by each judging category (administration panels don't score)
+CATEGORY_FIELDS = {
+    'm': 'm_pc',
+    'p': 'p_pc',
+    's': 's_pc',
+}
+
+TOTAL_FIELDS = ('appearances', 'awarded_total', 'overall_total')
+
+
+def judge_matrices(judges, appearances):
+    """
+    :param judges: iterable of (contest id, canonical person id, category)
+    :param appearances: iterable of (contest id, canonical contestant id, {category: category %}, total %)
+    :return: tuple of dicts
+        (person id, category): [panels, appearances, awarded total, overall total]
+        (person id, contestant id, category): [appearances, awarded total, overall total]
+    """
+    panels = defaultdict(set)
+    for contest, person, cat in judges:
+        panels[contest].add((person, cat))
+    by_contest = defaultdict(list)
+    for contest, contestant, category_pc, pc_score in appearances:
+        by_contest[contest].append((contestant, category_pc, pc_score))
+
+    by_judge = defaultdict(lambda: [0, 0, 0.0, 0.0])
+    by_contestant = defaultdict(lambda: [0, 0.0, 0.0])
+    for contest, panel in panels.items():
+        for person, cat in panel:
+            totals = by_judge[(person, cat)]
+            totals[0] += 1
+            if cat not in CATEGORY_FIELDS:
+                continue
+            for contestant, category_pc, pc_score in by_contest[contest]:
+                awarded, overall = float(category_pc[cat]), float(pc_score)
+                totals[1] += 1
+                totals[2] += awarded
+                totals[3] += overall
+                pair = by_contestant[(person, contestant, cat)]
+                pair[0] += 1
+                pair[1] += awarded
+                pair[2] += overall
+    return by_judge, by_contestant
+
+
+def contest_matrices(contests=None):
+    """
+    :param contests: list of Contest objects, or None for every contest
+    :return: judge_matrices() for the contests
+    """
+    judges = Judge.objects.all()
+    contestantapps = ContestantApp.objects.all()
+    if contests is not None:
+        judges = judges.filter(contest__in=contests)
+        contestantapps = contestantapps.filter(contest__in=contests)
+    judges = list(judges.values_list('contest_id', 'person_id', 'cat'))
+    contestantapps = list(contestantapps.values_list('contest_id', 'contestant_id', 'pc_score',
+                                                     *CATEGORY_FIELDS.values()))
+    people = canonical_ids(None if contests is None else {j[1] for j in judges}, model=Person)
+    contestants = canonical_ids(None if contests is None else {a[1] for a in contestantapps})
+    return judge_matrices(
+        [(contest, people[person], cat) for contest, person, cat in judges],
+        [(row[0], contestants[row[1]], dict(zip(CATEGORY_FIELDS, row[3:])), row[2]) for row in contestantapps],
+    )
+
+
+###############################################################
+# Functions to (re)calculate the stats in the database
+###############################################################
+
+
+def rebuild_judge_stats():
+    """
+    Recalculate every judge's stats from scratch
+    :return: tuple (number of JudgeStats, number of JudgeContestantStats)
+    """
+    by_judge, by_contestant = contest_matrices()
+    with transaction.atomic():
+        JudgeStats.objects.all().delete()
+        JudgeContestantStats.objects.all().delete()
+        JudgeStats.objects.bulk_create([
+            JudgeStats(person_id=person, cat=cat, panels=panels, appearances=n, awarded_total=awarded,
+                       overall_total=overall)
+            for (person, cat), (panels, n, awarded, overall) in by_judge.items()
+        ], batch_size=500)
+        JudgeContestantStats.objects.bulk_create([
+            JudgeContestantStats(person_id=person, contestant_id=contestant, cat=cat, appearances=n,
+                                 awarded_total=awarded, overall_total=overall)
+            for (person, contestant, cat), (n, awarded, overall) in by_contestant.items()
+        ], batch_size=500)
+        log_rebuild()
+    return len(by_judge), len(by_contestant)
+
+
+def add_judge_stats(contest):
+    """
+    Add a newly imported contest to the stats of its judges
+    :param contest: Contest object
+    """
+    by_judge, by_contestant = contest_matrices([contest])
+    if not by_judge:
+        return
+    with transaction.atomic():
+        # make sure the rows exist, then add to them in place, so that parallel imports don't lose each other's totals
+        insert_ignore(JudgeStats, ['person', 'cat', 'panels'] + list(TOTAL_FIELDS),
+                      [key + (0, 0, 0, 0) for key in by_judge])
+        insert_ignore(JudgeContestantStats, ['person', 'contestant', 'cat'] + list(TOTAL_FIELDS),
+                      [key + (0, 0, 0) for key in by_contestant])
+        bulk_increment(JudgeStats, ['person', 'cat'], ('panels',) + TOTAL_FIELDS,
+                       [key + tuple(totals) for key, totals in by_judge.items()])
+        bulk_increment(JudgeContestantStats, ['person', 'contestant', 'cat'], TOTAL_FIELDS,
+                       [key + tuple(totals) for key, totals in by_contestant.items()])
@@ -0,0 +1,157 @@
+"""
+Leaderboards of the highest scoring appearances, kept up to date so that showing one is a read of LEADERBOARD_SIZE rows:
+- for each season, i.e. (assoc, type, stream, year), the top contestant appearances and the top song appearances
+- for each song, the top performances by quartets and by choruses
+"""
+
+from collections import defaultdict
+from django.db import connection, transaction
+from .models import *
+from .changes import log_rebuild
+
+LEADERBOARD_SIZE = 10
+
+
+###############################################################
+# Rebuilding every leaderboard
+###############################################################
+
+
+def ranked_insert_sql(table, columns, source, partition_by, order_id):
+    """
+    INSERT the top LEADERBOARD_SIZE rows of each partition, numbered with ROW_NUMBER() (SQLite 3.25+, PostgreSQL)
+    :param table: the leaderboard table
+    :param columns: list of (leaderboard column, SQL expression for it in the source table)
+    :param source: the appearances table
+    :param partition_by: SQL expressions for the leaderboard key
+    :param order_id: the column that breaks ties between equal scores
+    """
+    return (
+        'INSERT INTO {table} ({columns}, position) '
+        'SELECT {columns}, position FROM ('
+        'SELECT {select}, ROW_NUMBER() OVER (PARTITION BY {partition_by} ORDER BY pc_score DESC, {order_id}) AS position '
+        'FROM {source} WHERE contest_date IS NOT NULL'
+        ') ranked WHERE position <= %s'
+    ).format(
+        table=table, source=source, order_id=order_id, partition_by=', '.join(partition_by),
+        columns=', '.join(column for column, expression in columns),
+        select=', '.join('%s AS %s' % (expression, column) for column, expression in columns),
+    )
+
+
+def leaderboard_sql(connection):
+    """
+    :return: list of SQL statements that fill the empty leaderboard tables, each taking LEADERBOARD_SIZE as a parameter
+    """
+    season = [
+        ('assoc', 'contest_assoc'),
+        ('type', 'contest_type'),
+        ('stream', "COALESCE(contest_stream, '')"),
+        ('year', connection.ops.date_extract_sql('year', 'contest_date')),
+    ]
+    partition_by = [expression for column, expression in season]
+    return [
+        ranked_insert_sql(
+            SeasonLeaderboardEntry._meta.db_table,
+            season + [('level', "'c'"), ('pc_score', 'pc_score'), ('contestantapp_id', 'id'), ('songapp_id', 'NULL')],
+            ContestantApp._meta.db_table, partition_by, 'id'),
+        ranked_insert_sql(
+            SeasonLeaderboardEntry._meta.db_table,
+            season + [('level', "'s'"), ('pc_score', 'pc_score'), ('contestantapp_id', 'contestantapp_id'),
+                      ('songapp_id', 'id')],
+            SongApp._meta.db_table, partition_by, 'id'),
+        ranked_insert_sql(
+            SongLeaderboardEntry._meta.db_table,
+            [('song_id', 'song_id'), ('type', 'contest_type'), ('pc_score', 'pc_score'), ('songapp_id', 'id')],
+            SongApp._meta.db_table, ['song_id', 'contest_type'], 'id'),
+    ]
+
+
+def rebuild_leaderboards():
+    """
+    Recalculate every leaderboard with one INSERT ... SELECT per kind of leaderboard
+    :return: number of leaderboard entries written
+    """
+    with transaction.atomic():
+        SeasonLeaderboardEntry.objects.all().delete()
+        SongLeaderboardEntry.objects.all().delete()
+        with connection.cursor() as cursor:
+            for sql in leaderboard_sql(connection):
+                cursor.execute(sql, [LEADERBOARD_SIZE])
+        log_rebuild()
+    return SeasonLeaderboardEntry.objects.count() + SongLeaderboardEntry.objects.count()
+
+
+###############################################################
+# Updating the leaderboards for a new contest
+###############################################################
+
+
+def merge_boards(model, existing, candidates, board_fields):
+    """
+    Merge new appearances into leaderboards, replacing the entries of each leaderboard that changes
+    :param model: SeasonLeaderboardEntry or SongLeaderboardEntry
+    :param existing: the current entries of the leaderboards
+    :param candidates: dict of leaderboard key: list of (pc_score, id to break ties with, dict of entry fields)
+    :param board_fields: the fields that make up a leaderboard key
+    """
+    entry_fields = [f for f in ('contestantapp_id', 'songapp_id') if hasattr(model, f)]
+    current = defaultdict(list)
+    pks = defaultdict(list)
+    for entry in existing.order_by('position'):
+        key = tuple(getattr(entry, f) for f in board_fields)
+        order_id = entry.songapp_id or entry.contestantapp_id
+        current[key].append((entry.pc_score, order_id, {f: getattr(entry, f) for f in entry_fields}))
+        pks[key].append(entry.pk)
+    deleted, created = [], []
+    for key, new in candidates.items():
+        old = current[key]
+        top = sorted(old + new, key=lambda c: (-c[0], c[1]))[:LEADERBOARD_SIZE]
+        if [c[1] for c in top] == [c[1] for c in old]:
+            continue
+        deleted.extend(pks[key])
+        board = dict(zip(board_fields, key))
+        for position, (pc_score, order_id, fields) in enumerate(top, start=1):
+            entry = model(position=position, pc_score=pc_score, **board)
+            for f, value in fields.items():
+                setattr(entry, f, value)
+            created.append(entry)
+    model.objects.filter(pk__in=deleted).delete()
+    model.objects.bulk_create(created, batch_size=500)
+
+
+def update_leaderboards(contest):
+    """
+    Add the appearances in a newly imported contest to the leaderboards they make it onto
+    :param contest: Contest object
+    """
+    contestantapps = ContestantApp.objects.filter(contest=contest).exclude(contest_date=None).values_list(
+        'id', 'contest_assoc', 'contest_type', 'contest_stream', 'contest_date', 'pc_score')
+    songapps = SongApp.objects.filter(contestantapp__contest=contest).exclude(contest_date=None).values_list(
+        'id', 'contestantapp_id', 'song_id', 'contest_assoc', 'contest_type', 'contest_stream', 'contest_date',
+        'pc_score')
+
+    seasons = defaultdict(list)
+    songs = defaultdict(list)
+    for id, assoc, type, stream, date, pc_score in contestantapps:
+        seasons[(assoc, type, stream or '', date.year, 'c')].append(
+            (pc_score, id, {'contestantapp_id': id, 'songapp_id': None}))
+    for id, contestantapp_id, song_id, assoc, type, stream, date, pc_score in songapps:
+        seasons[(assoc, type, stream or '', date.year, 's')].append(
+            (pc_score, id, {'contestantapp_id': contestantapp_id, 'songapp_id': id}))
+        songs[(song_id, type)].append((pc_score, id, {'songapp_id': id}))
+    if not seasons:
+        return
+
+    with transaction.atomic():
+        # lock the leaderboards being changed, so that parallel imports don't overwrite each other's entries
+        # (select_for_update() does nothing on SQLite, which only allows one writer at a time anyway)
+        assoc, type, stream, year, level = next(iter(seasons))
+        merge_boards(
+            SeasonLeaderboardEntry,
+            SeasonLeaderboardEntry.objects.select_for_update().filter(assoc=assoc, type=type, stream=stream, year=year),
+            seasons, ('assoc', 'type', 'stream', 'year', 'level'))
+        merge_boards(
+            SongLeaderboardEntry,
+            SongLeaderboardEntry.objects.select_for_update().filter(song_id__in={s for s, t in songs}, type=type),
+            songs, ('song_id', 'type'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from scores.audit import run_audit
+
+
+class Command(BaseCommand):
+    help = 'Check the stored scores, ranks and aliases for rows that break the rules the importer follows, ' \
+           'e.g. after edits in the admin, failing if any are found'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10, help='rows to show for each failed check')
+
+    def handle(self, *args, **options):
+        n_failed = 0
+        for check, rows in run_audit():
+            self.stdout.write('%-34s %6d' % (check.name, len(rows)))
+            if not rows:
+                continue
+            n_failed += 1
+            self.stdout.write('  %s' % check.description)
+            self.stdout.write('  %s' % ' | '.join(check.columns))
+            for row in rows[:options['limit']]:
+                self.stdout.write('  %s' % ' | '.join(str(value) for value in row))
+            if len(rows) > options['limit']:
+                self.stdout.write('  ... and %s more' % (len(rows) - options['limit']))
+        if n_failed:
+            raise CommandError('%s checks failed' % n_failed)
+        self.stdout.write('No problems found')
@@ -0,0 +1,136 @@
+import copy, json, os, time, tracemalloc
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from scores.extract_rtf import striprtf
+from scores.import_from_dict import calculate_scores
+from scores.instrumentation import STATS, captured_queries
+from scores.synthetic import ContestGenerator, contest_to_rtf, import_contests, sample_urls
+
+# one baseline per database backend, e.g. benchmark_baseline_sqlite.json
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmark_baseline_%s.json' % connection.vendor)
+
+
+def measure(func, repeat=3):
+    """
+    Time a function, then run it once more to count its queries and peak memory
+    :param func: function to measure, called with no arguments
+    :param repeat: number of timed runs (the fastest is reported)
+    :return: dict of seconds, queries, peak_kb
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    with captured_queries() as queries:
+        func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(seconds), 'queries': len(queries), 'peak_kb': peak // 1024}
+
+
+def measure_import(contests, n_traced=10):
+    """
+    Import contests into an empty database. An import can't be repeated, so the contests are timed (and their queries
+    counted) in a single run, except for the last few, which are imported with tracemalloc on to find the peak memory
+    :param contests: list of contest dicts
+    :param n_traced: number of contests to import with tracemalloc on
+    :return: dict of seconds, queries, peak_kb, contests
+    """
+    # the importer counts its own queries, see import_from_dict.import_contest_from_dict
+    STATS.reset()
+    start = time.perf_counter()
+    import_contests(contests[:-n_traced])
+    seconds = time.perf_counter() - start
+    queries = STATS.counters['queries']
+    tracemalloc.start()
+    import_contests(contests[-n_traced:])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': seconds, 'queries': queries, 'peak_kb': peak // 1024, 'contests': len(contests) - n_traced}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark importing and page rendering against a seeded synthetic database, ' \
+           'optionally comparing the results with a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, nargs='+', default=[1],
+                            help='sizes of the synthetic database, as multiples of db.sqlite3 (e.g. 1 10 100)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=3, help='number of timed runs of each benchmark')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline results file')
+        parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='report a regression if a benchmark is this much slower than the baseline')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        results = {}
+        try:
+            for scale in options['scale']:
+                # each scale gets a fresh test database
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                try:
+                    results[str(scale)] = self.run_benchmarks(scale, options['seed'], options['repeat'])
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            teardown_test_environment()
+
+        self.report(results, options)
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write('Saved baseline to %s' % options['baseline'])
+
+    def run_benchmarks(self, scale, seed, repeat):
+        results = {}
+        generator = ContestGenerator(scale=scale, seed=seed)
+        contests = list(generator.contests())
+
+        # parsing and calculating
+        sample = contests[:50]
+        results['calculate_scores'] = measure(
+            lambda: [calculate_scores(c) for c in copy.deepcopy(sample)], repeat)
+        rtf = [contest_to_rtf(c) for c in sample]
+        results['striprtf'] = measure(lambda: [striprtf(r) for r in rtf], repeat)
+
+        # importing the whole synthetic database (only once, it's the slow part)
+        results['import_contest_from_dict'] = measure_import(contests)
+
+        # rendering pages, using the busiest object for each detail page, without the cache of responses
+        middleware = [m for m in settings.MIDDLEWARE if m != 'scores.middleware.DataVersionMiddleware']
+        with override_settings(MIDDLEWARE=middleware):
+            client = Client()
+            for name, url in sample_urls().items():
+                results['view:%s' % name] = measure(lambda: client.get(url), repeat)
+        return results
+
+    def report(self, results, options):
+        baseline = {}
+        if os.path.exists(options['baseline']) and not options['save_baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        regressions = 0
+        for scale, benchmarks in sorted(results.items(), key=lambda item: int(item[0])):
+            self.stdout.write('\nScale %sx, %s' % (scale, connection.vendor))
+            self.stdout.write('%-30s %10s %8s %10s  %s' % ('benchmark', 'seconds', 'queries', 'peak KB', 'vs baseline'))
+            for name, result in sorted(benchmarks.items()):
+                comparison = ''
+                old = baseline.get(scale, {}).get(name)
+                if old:
+                    ratio = result['seconds'] / old['seconds'] if old['seconds'] else 1
+                    comparison = '%.2fx time, %+d queries' % (ratio, result['queries'] - old['queries'])
+                    if ratio > 1 + options['tolerance'] or result['queries'] > old['queries']:
+                        comparison += '  REGRESSION'
+                        regressions += 1
+                self.stdout.write('%-30s %10.4f %8d %10d  %s' % (
+                    name, result['seconds'], result['queries'], result['peak_kb'], comparison))
+        if baseline:
+            self.stdout.write('\n%s regression(s) compared with %s' % (regressions, options['baseline']))
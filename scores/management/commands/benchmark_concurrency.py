@@ -0,0 +1,118 @@
+import os, tempfile, threading, time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from scores.middleware import percentile
+from scores.synthetic import ContestGenerator, import_contests, sample_urls
+
+
+class Command(BaseCommand):
+    help = 'Benchmark page reads while contests are being imported, against a seeded SQLite test database, ' \
+           'with and without SCORES_SQLITE_PRAGMAS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.5,
+                            help='size of the synthetic database, as a multiple of db.sqlite3')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--readers', type=int, default=4, help='number of threads requesting pages')
+        parser.add_argument('--imports', type=int, default=20, help='number of contests imported during the run')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark is for SQLite')
+        contests = list(ContestGenerator(scale=options['scale'], seed=options['seed']).contests())
+        if len(contests) <= options['imports']:
+            raise CommandError('--scale is too small for %s imports' % options['imports'])
+
+        setup_test_environment()
+        try:
+            # default journaling, then the configured pragmas
+            results = [
+                ('default', self.run(contests, options, {'busy_timeout': 5000})),
+                ('SCORES_SQLITE_PRAGMAS', self.run(contests, options, None)),
+            ]
+        finally:
+            teardown_test_environment()
+
+        self.stdout.write('\n%-22s %8s %8s %8s %8s %8s %10s %8s' % (
+            'profile', 'pages', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'imports/s', 'failed'))
+        for name, r in results:
+            times = sorted(r['read_times'])
+            self.stdout.write('%-22s %8d %8d %8.1f %8.1f %8.1f %10.2f %8d' % (
+                name, len(times), r['read_errors'],
+                percentile(times, 0.5) * 1000, percentile(times, 0.95) * 1000, percentile(times, 0.99) * 1000,
+                r['imports'] / r['seconds'], r['import_errors']))
+
+    def run(self, contests, options, pragmas):
+        """
+        Seed a test database with all but the last few contests, then import those while reader threads request pages
+        :param pragmas: SCORES_SQLITE_PRAGMAS to use, or None for the configured ones
+        :return: dict of read_times, read_errors, imports, import_errors, seconds
+        """
+        # threads can't share an in-memory database, so the test database has to be a file
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        old_test_name = test_settings.get('NAME')
+        fd, test_name = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        test_settings['NAME'] = test_name
+        profile = {} if pragmas is None else {'SCORES_SQLITE_PRAGMAS': pragmas}
+        try:
+            with override_settings(**profile):
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                try:
+                    import_contests(contests[:-options['imports']])
+                    urls = list(sample_urls().values())
+                    return self.run_threads(contests[-options['imports']:], urls, options['readers'])
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            test_settings['NAME'] = old_test_name
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(test_name + suffix):
+                    os.remove(test_name + suffix)
+
+    def run_threads(self, contests, urls, n_readers):
+        connection.close()      # each thread opens its own connection
+        done = threading.Event()
+        lock = threading.Lock()
+        result = {'read_times': [], 'read_errors': 0, 'imports': 0, 'import_errors': 0}
+
+        def read():
+            client = Client()
+            try:
+                while not done.is_set():
+                    for url in urls:
+                        start = time.perf_counter()
+                        try:
+                            client.get(url)
+                        except OperationalError:
+                            with lock:
+                                result['read_errors'] += 1
+                            continue
+                        with lock:
+                            result['read_times'].append(time.perf_counter() - start)
+            finally:
+                connection.close()
+
+        def write():
+            try:
+                for contest in contests:
+                    try:
+                        import_contests([contest])
+                        result['imports'] += 1
+                    except OperationalError:
+                        result['import_errors'] += 1
+            finally:
+                done.set()
+                connection.close()
+
+        readers = [threading.Thread(target=read) for _ in range(n_readers)]
+        for thread in readers:
+            thread.start()
+        start = time.perf_counter()
+        write()
+        result['seconds'] = time.perf_counter() - start
+        for thread in readers:
+            thread.join()
+        return result
@@ -0,0 +1,23 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from scores.static_site import build_site
+
+
+class Command(BaseCommand):
+    help = 'Render the public results pages to a directory that any static file server can serve, ' \
+           're-rendering only the pages changed since the last build in that directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='the directory to build the site in')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='processes to render pages with (default: one per CPU)')
+        parser.add_argument('--full', action='store_true', help='render every page, ignoring the last build')
+
+    def handle(self, *args, **options):
+        counts, errors = build_site(options['output'], options['processes'], options['full'])
+        for url, error in errors:
+            self.stderr.write('%s: %s' % (url, error))
+        if errors:
+            raise CommandError('%s pages could not be rendered; the next build will try them again' % len(errors))
+        self.stdout.write('Rendered %(rendered)s of %(pages)s pages, deleted %(deleted)s old files and copied '
+                          '%(static)s static files, up to change %(seq)s' % counts)
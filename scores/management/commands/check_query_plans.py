@@ -0,0 +1,157 @@
+import re
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from scores import urls
+from scores.changes import data_version
+from scores.instrumentation import captured_queries
+from scores.synthetic import ContestGenerator, import_contests, sample_urls
+
+# a scan of a whole table, i.e. one that isn't using an index
+FULL_SCAN = {
+    'sqlite': re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+
+# list pages show every row of their table, so a full scan of that table is expected
+ALLOWED_SCANS = {
+    'contest_list': {'scores_contest'},
+    'contestant_list': {'scores_contestant'},
+    'person_list': {'scores_person'},
+    'song_list': {'scores_song'},
+    'judge_list': {'scores_judgestats'},
+    # name__icontains can't use an index
+    'person_autocomplete': {'scores_person'},
+}
+
+# the data version query (changes.data_version()), which every page runs, reads the change log backwards by seq and
+# stops at the first row, but SQLite reports it as a scan
+VERSION_SCANS = {'scores_changelogentry'}
+
+# views that write to the database, or that report on the process rather than the data, so aren't checked
+UNCHECKED_VIEWS = {'contest_upload', 'person_update', 'import', 'import_rtf', 'update_aliases', 'query_stats', 'metrics'}
+
+
+def capture_queries(func):
+    """
+    Run a function and return the queries it ran
+    :return: list of (sql, params)
+    """
+    queries = []
+    if hasattr(connection, 'execute_wrapper'):
+        # Django 2.0+: keep the parameters, so the queries can be explained exactly as they ran
+        def wrapper(execute, sql, params, many, context):
+            if not many:
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+        with connection.execute_wrapper(wrapper):
+            func()
+    else:
+        # older Django only logs the sql with the parameters filled in
+        with captured_queries() as sql:
+            func()
+        queries = [(q, None) for q in sql]
+    return queries
+
+
+def prefer_indexes():
+    """
+    On PostgreSQL, only let the planner use a sequential scan when there's no usable index: test tables are small
+    enough that it would choose one regardless
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+
+
+def explain(sql, params):
+    """
+    :return: list of lines of the query plan
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    """
+    :return: set of the tables that a query plan scans in full
+    """
+    pattern = FULL_SCAN[connection.vendor]
+    return {m.group(1) for m in (pattern.search(line) for line in plan) if m}
+
+
+class Command(BaseCommand):
+    help = 'Render every page against a seeded test database and EXPLAIN each of its queries, ' \
+           'failing if any of them scans a whole table instead of using an index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.25,
+                            help='size of the synthetic database, as a multiple of db.sqlite3')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--show-plans', action='store_true', help='print the plan of every query')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCAN:
+            raise CommandError("Can't read query plans from %s" % connection.vendor)
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            prefer_indexes()
+            import_contests(list(ContestGenerator(scale=options['scale'], seed=options['seed']).contests()))
+            violations = self.check_pages(options['show_plans'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if violations:
+            for page, sql, tables, plan in violations:
+                self.stdout.write('\n%s scans %s:\n  %s' % (page, ', '.join(sorted(tables)), sql))
+                for line in plan:
+                    self.stdout.write('    %s' % line)
+            raise CommandError('%s queries scan a whole table' % len(violations))
+        self.stdout.write('No full table scans')
+
+    def check_pages(self, show_plans):
+        """
+        :return: list of (page, sql, tables scanned in full, plan)
+        """
+        pages = sample_urls()
+        missing = {pattern.name for pattern in urls.urlpatterns} - UNCHECKED_VIEWS - set(pages)
+        if missing:
+            raise CommandError('No sample url for %s' % ', '.join(sorted(missing)))
+        version_sql = {sql for sql, params in capture_queries(data_version)}
+        # pages served from the cache of responses would only run the data version query
+        caches[getattr(settings, 'SCORES_RESPONSE_CACHE', 'default')].clear()
+        client = Client()
+        violations = []
+        for page, url in OrderedDict(sorted(pages.items())).items():
+            queries = capture_queries(lambda: client.get(url))
+            if not queries:
+                # every page reads the database, so the queries weren't captured, and nothing would be checked
+                raise CommandError('No queries captured for %s' % page)
+            # the same query with different parameters has the same plan
+            seen = set()
+            for sql, params in queries:
+                if sql in seen:
+                    continue
+                seen.add(sql)
+                plan = explain(sql, params)
+                tables = full_scans(plan) - ALLOWED_SCANS.get(page, set())
+                if sql in version_sql:
+                    tables -= VERSION_SCANS
+                if show_plans:
+                    self.stdout.write('\n%s: %s' % (page, sql))
+                    for line in plan:
+                        self.stdout.write('    %s' % line)
+                if tables:
+                    violations.append((page, sql, tables, plan))
+            self.stdout.write('%-20s %4d queries, %4d distinct' % (page, len(queries), len(seen)))
+        return violations
@@ -0,0 +1,92 @@
+import os, time
+from django.core.management.base import BaseCommand, CommandError
+from scores.scrape_pdf import PDF_BACKENDS, fetch_pdf, parse_contest_text
+
+# pdf scoresheets, each with the text `pdftotext -raw -enc UTF-8 -eol unix` writes for it in <name>.txt
+SCORESHEETS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'fixtures', 'scoresheets')
+
+
+def parse(text, source):
+    """
+    :return: the contest dict, without its raw text, or None if the scoresheet is not of a format the regexes recognise
+    """
+    try:
+        contest = parse_contest_text(text, source)
+    except AttributeError:
+        return None
+    contest.pop('raw_text')
+    return contest
+
+
+class Command(BaseCommand):
+    help = 'Extract the text of a corpus of pdf scoresheets with each pdf backend, check that they parse to the ' \
+           'same contests, and compare how fast they are'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='*', default=[SCORESHEETS],
+                            help='urls or paths of pdf scoresheets, or directories of them (default: the fixtures)')
+        parser.add_argument('--repeat', type=int, default=3, help='times to extract each file, keeping the fastest')
+        parser.add_argument('--expected', action='store_true',
+                            help='check each backend against the text in the .txt file next to each pdf, '
+                                 'skipping pdftotext if it is not installed')
+
+    def handle(self, *args, **options):
+        sources = []
+        for source in options['sources']:
+            if os.path.isdir(source):
+                sources.extend(sorted(os.path.join(source, name) for name in os.listdir(source)
+                                      if name.lower().endswith('.pdf')))
+            else:
+                sources.append(source)
+
+        backends = dict(PDF_BACKENDS)
+        seconds = dict.fromkeys(backends, 0.0)
+        n_bytes = n_different_text = n_different = 0
+        for source in sources:
+            data = fetch_pdf(source)
+            n_bytes += len(data)
+            texts, contests = {}, {}
+            for backend, to_text in list(backends.items()):
+                best = None
+                for i in range(options['repeat']):
+                    start = time.perf_counter()
+                    try:
+                        texts[backend] = to_text(data)
+                    except FileNotFoundError:
+                        if not options['expected']:
+                            raise CommandError('pdftotext not found, set SCORES_PDFTOTEXT to its path')
+                        self.stdout.write('pdftotext not found, only checking the other backends')
+                        del backends[backend], seconds[backend]
+                        break
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                if backend in texts:
+                    seconds[backend] += best
+                    contests[backend] = parse(texts[backend], source)
+
+            if options['expected']:
+                with open(os.path.splitext(source)[0] + '.txt', encoding='utf-8', newline='') as f:
+                    expected = f.read()
+                texts['expected'], contests['expected'] = expected, parse(expected, source)
+                wrong = sorted(backend for backend in backends if texts[backend] != expected)
+                same_text = not wrong
+                same = all(contests[backend] == contests['expected'] for backend in backends)
+                self.stdout.write('%-10s %s%s' % ('same' if same_text else 'same*' if same else 'DIFFERENT', source,
+                                                 ' (%s)' % ', '.join(wrong) if wrong else ''))
+            else:
+                same_text = len(set(texts.values())) == 1
+                same = all(contest == contests['python'] for contest in contests.values())
+                self.stdout.write('%-10s %s' % ('same' if same_text else 'same*' if same else 'DIFFERENT', source))
+            n_different_text += not same_text
+            n_different += not same
+
+        self.stdout.write('%s files, %.1f MB' % (len(sources), n_bytes / 1e6))
+        for backend, total in seconds.items():
+            self.stdout.write('%-10s %8.3f s %8.1f files/s %8.2f MB/s' % (
+                backend, total, len(sources) / total if total else 0, n_bytes / 1e6 / total if total else 0))
+        if n_different_text:
+            self.stdout.write('* %s files with different text that parses to the same contest' % n_different_text)
+        if n_different:
+            raise CommandError('%s files parse to different contests' % n_different)
+        if options['expected'] and n_different_text:
+            raise CommandError('%s files have different text than expected' % n_different_text)
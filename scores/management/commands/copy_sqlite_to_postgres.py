@@ -0,0 +1,85 @@
+import io, os, sqlite3, time
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+# rows sent to PostgreSQL in each COPY
+BATCH_SIZE = 10000
+
+
+def csv_value(value):
+    """
+    Format a value for COPY ... WITH (FORMAT csv), in which an unquoted empty field is NULL and a quoted one is ''
+    """
+    if value is None:
+        return ''
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, bytes):
+        value = '\\x' + value.hex()     # bytea hex format
+    return '"%s"' % str(value).replace('"', '""')
+
+
+class Command(BaseCommand):
+    help = 'Copy every table of an SQLite database (by default db.sqlite3) into an empty, migrated PostgreSQL ' \
+           'database, using COPY, then reset the id sequences'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=os.path.join(settings.BASE_DIR, 'db.sqlite3'),
+                            help='SQLite database to copy, migrated to the same version')
+        parser.add_argument('--database', default='default', help='PostgreSQL database to copy into')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            raise CommandError('%s is a %s database. Set DATABASE_ENGINE=postgresql and the other DATABASE_* '
+                               'variables, and run manage.py migrate first' % (options['database'], connection.vendor))
+        if not os.path.exists(options['source']):
+            raise CommandError('%s does not exist' % options['source'])
+
+        source = sqlite3.connect(options['source'])
+        try:
+            source_tables = {row[0] for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            # django_migrations is left alone, the destination has its own
+            models = [m for m in apps.get_models(include_auto_created=True)
+                      if m._meta.managed and not m._meta.proxy and m._meta.db_table in source_tables]
+            with transaction.atomic(using=options['database']), connection.cursor() as cursor:
+                # migrate creates content types and permissions, which would clash with the copies
+                cursor.execute('TRUNCATE %s CASCADE' % ', '.join(
+                    connection.ops.quote_name(m._meta.db_table) for m in models))
+                # Django's foreign keys are DEFERRABLE INITIALLY DEFERRED, so the tables can be copied in any order
+                for model in models:
+                    start = time.perf_counter()
+                    n = self.copy_table(source, cursor, model, connection.ops.quote_name)
+                    self.stdout.write('%-40s %8d rows %8.2fs' % (model._meta.db_table, n, time.perf_counter() - start))
+                for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+        finally:
+            source.close()
+        self.stdout.write('Copied %s tables' % len(models))
+
+    def copy_table(self, source, cursor, model, qn):
+        """
+        Copy one table in batches of BATCH_SIZE rows
+        :return: number of rows copied
+        """
+        table = model._meta.db_table
+        columns = [f.column for f in model._meta.local_concrete_fields]
+        source_columns = {row[1] for row in source.execute('PRAGMA table_info(%s)' % qn(table))}
+        missing = set(columns) - source_columns
+        if missing:
+            raise CommandError('%s has no %s column(s), migrate it first' % (table, ', '.join(sorted(missing))))
+
+        column_list = ', '.join(qn(c) for c in columns)
+        copy_sql = 'COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (qn(table), column_list)
+        rows = source.execute('SELECT %s FROM %s' % (column_list, qn(table)))
+        n = 0
+        while True:
+            batch = rows.fetchmany(BATCH_SIZE)
+            if not batch:
+                return n
+            data = io.StringIO(''.join(','.join(csv_value(v) for v in row) + '\n' for row in batch))
+            cursor.copy_expert(copy_sql, data)
+            n += len(batch)
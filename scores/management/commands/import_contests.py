@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from scores.import_from_dict import prepare_for_import, import_contest_from_dict
+from scores.instrumentation import STATS, profiled
+from scores.stream_json import read_contests
+from scores.validation import validate_contests
+
+
+class Command(BaseCommand):
+    help = 'Import contests from snapshot (.bss), json or json lines files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='snapshot or json files to import')
+        parser.add_argument('--profile', metavar='FILE', help='write cProfile stats for the import to FILE')
+
+    def handle(self, *args, **options):
+        # validate every contest in every file before importing any of them
+        errors = []
+        for filename in options['files']:
+            with open(filename, 'rb') as f:
+                n, file_errors = validate_contests(read_contests(f))
+            for i, contest_errors in sorted(file_errors.items()):
+                errors.extend('%s contest %s: %s' % (filename, i, e) for e in contest_errors)
+        if errors:
+            raise CommandError('Nothing imported, invalid contests:\n' + '\n'.join(errors))
+
+        STATS.reset()
+        with profiled(options['profile']):
+            for filename in options['files']:
+                with open(filename, 'rb') as f:
+                    for contest in read_contests(f):
+                        with transaction.atomic():
+                            prepare_for_import(contest)
+                            import_contest_from_dict(contest)
+
+        self.stdout.write('\n'.join(STATS.report()))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from scores.import_from_dict import prepare_for_import, import_contest_from_dict
+from scores.instrumentation import STATS, profiled
+from scores.scrape_pdf import get_contest_dict_from_url
+from scores.validation import validate_contest
+
+
+class Command(BaseCommand):
+    help = 'Import contests from the urls of pdf scoresheets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='urls of pdf scoresheets')
+        parser.add_argument('--profile', metavar='FILE', help='write cProfile stats for the import to FILE')
+
+    def handle(self, *args, **options):
+        STATS.reset()
+        with profiled(options['profile']):
+            for url in options['urls']:
+                try:
+                    contest = get_contest_dict_from_url(url)
+                except AttributeError:  # this probably means that the scoresheet is not of the right format, skip it
+                    self.stderr.write('Skipped %s: scoresheet not recognised' % url)
+                    continue
+                errors = validate_contest(contest)
+                if errors:
+                    self.stderr.write('Skipped %s:\n  %s' % (url, '\n  '.join(errors)))
+                    continue
+                with transaction.atomic():
+                    prepare_for_import(contest)
+                    import_contest_from_dict(contest)
+
+        self.stdout.write('\n'.join(STATS.report()))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from scores.distributions import rebuild_distributions
+from scores.models import Contest
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the score distributions used for percentile ranks, for all contests or the groups of some contests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('contest_ids', nargs='*', type=int,
+                            help='ids of contests whose assoc, type, stream and year to rebuild (default: all)')
+
+    def handle(self, *args, **options):
+        contests = Contest.objects.filter(id__in=options['contest_ids']) if options['contest_ids'] else None
+        n = rebuild_distributions(contests)
+        self.stdout.write('Wrote %s score distributions' % n)
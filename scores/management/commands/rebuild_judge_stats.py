@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from scores.judging import rebuild_judge_stats
+
+
+class Command(BaseCommand):
+    help = 'Recalculate every judge\'s stats from scratch, e.g. after changing aliases or deleting contests'
+
+    def handle(self, *args, **options):
+        n_judges, n_pairs = rebuild_judge_stats()
+        self.stdout.write('Wrote %s judge stats and %s judge-contestant stats' % (n_judges, n_pairs))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from scores.leaderboards import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Recalculate every season and song leaderboard from scratch, e.g. after deleting contests'
+
+    def handle(self, *args, **options):
+        n_entries = rebuild_leaderboards()
+        self.stdout.write('Wrote %s leaderboard entries' % n_entries)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from scores.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recalculate every contestant rating from scratch, e.g. after changing contestant aliases'
+
+    def handle(self, *args, **options):
+        n_contestants, n_appearances = rebuild_ratings()
+        self.stdout.write('Rated %s contestants from %s appearances' % (n_contestants, n_appearances))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from scores.models import Contest
+from scores.ranking import calculate_ranks
+
+
+class Command(BaseCommand):
+    help = 'Recalculate overall, category and stream ranks for some or all contests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('contest_ids', nargs='*', type=int, help='ids of the contests to rerank (default: all)')
+        parser.add_argument('--overall', action='store_true',
+                            help='also recalculate the overall rank from the total score, replacing the scoresheet rank')
+
+    def handle(self, *args, **options):
+        contests = Contest.objects.filter(id__in=options['contest_ids']) if options['contest_ids'] else None
+        n_contestantapps, n_streams = calculate_ranks(contests, overall=options['overall'])
+        self.stdout.write('Updated ranks for %s contestant appearances and %s streams' % (n_contestantapps, n_streams))
@@ -0,0 +1,238 @@
+import calendar, gzip, logging, re, threading, time
+from collections import defaultdict, deque
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from .changes import data_version
+from .collaboration import sync_graph
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# number of recent requests kept per view for the percentiles
+SAMPLES_PER_VIEW = 1000
+
+# replaces literals in logged SQL, so that queries that differ only in their parameters count as duplicates
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class ViewStats:
+    """
+    Rolling samples of (wall seconds, db seconds, queries, duplicate queries) per view, for the current process
+    """
+    FIELDS = ('wall', 'db', 'queries', 'duplicates')
+
+    def __init__(self, maxlen=SAMPLES_PER_VIEW):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=maxlen))
+        self.totals = defaultdict(lambda: [0, 0.0])     # count and total wall time since the process started
+
+    def record(self, view, wall, db, queries, duplicates):
+        with self.lock:
+            self.samples[view].append((wall, db, queries, duplicates))
+            self.totals[view][0] += 1
+            self.totals[view][1] += wall
+
+    def summary(self, quantiles=(0.5, 0.95, 0.99)):
+        """
+        :return: list of (view, count, total wall seconds, {field: {quantile: value}})
+        """
+        with self.lock:
+            samples = {view: list(s) for view, s in self.samples.items()}
+            totals = {view: tuple(t) for view, t in self.totals.items()}
+        rows = []
+        for view in sorted(samples):
+            columns = list(zip(*samples[view]))
+            percentiles = {
+                field: {q: percentile(sorted(values), q) for q in quantiles}
+                for field, values in zip(self.FIELDS, columns)
+            }
+            rows.append((view, totals[view][0], totals[view][1], percentiles))
+        return rows
+
+
+def percentile(sorted_values, q):
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+VIEW_STATS = ViewStats()
+
+
+class QueryStatsMiddleware:
+    """
+    Records the wall time, database time, number of queries and number of duplicate queries (a sign of N+1 queries)
+    for every request, per view, and logs a warning when a view runs more than SCORES_QUERY_BUDGET queries
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.budget = getattr(settings, 'SCORES_QUERY_BUDGET', 50)
+
+    def __call__(self, request):
+        queries = []
+        start = time.perf_counter()
+        if hasattr(connection, 'execute_wrapper'):
+            # Django 2.0+: time each query as it runs
+            def wrapper(execute, sql, params, many, context):
+                query_start = time.perf_counter()
+                try:
+                    return execute(sql, params, many, context)
+                finally:
+                    queries.append((sql, time.perf_counter() - query_start))
+            with connection.execute_wrapper(wrapper):
+                response = self.get_response(request)
+        else:
+            # older Django: turn on the debug cursor and read its log
+            force_debug_cursor, connection.force_debug_cursor = connection.force_debug_cursor, True
+            first = len(connection.queries_log)
+            try:
+                response = self.get_response(request)
+            finally:
+                connection.force_debug_cursor = force_debug_cursor
+            queries = [(SQL_LITERALS.sub('?', q['sql']), float(q['time'])) for q in list(connection.queries_log)[first:]]
+        wall = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        n = len(queries)
+        duplicates = n - len({sql for sql, duration in queries})
+        VIEW_STATS.record(view, wall, sum(duration for sql, duration in queries), n, duplicates)
+        if n > self.budget:
+            logger.warning('%s ran %s queries (budget %s, %s duplicates) for %s',
+                           view, n, self.budget, duplicates, request.path)
+        return response
+
+
+# views that aren't a function of the data, or that write to it
+UNCACHED_VIEWS = {
+    'scores:contest_upload', 'scores:import', 'scores:import_rtf', 'scores:update_aliases', 'scores:person_update',
+    'scores:person_autocomplete', 'scores:query_stats', 'scores:metrics',
+}
+
+# views that read the collaboration graph, which each process refreshes on its own schedule
+GRAPH_VIEWS = {
+    'scores:person_detail', 'scores:person_path', 'scores:person_collaborators_api', 'scores:person_shared_api',
+    'scores:person_path_api',
+}
+
+# the encodings that bodies are cached in, most preferred first, with functions to compress them
+ENCODINGS = [('gzip', lambda body: gzip.compress(body, 6))]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', lambda body: brotli.compress(body, quality=5)))
+
+# response headers that are the middleware's to set, or that mustn't be cached
+UNCACHED_HEADERS = {'content-length', 'content-encoding', 'etag', 'last-modified', 'vary', 'set-cookie'}
+
+
+def accepted_encoding(request):
+    """
+    :return: the most preferred encoding in ENCODINGS that the request accepts, or None
+    """
+    accepted = {part.split(';')[0].strip().lower() for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')}
+    return next((name for name, compress in ENCODINGS if name in accepted), None)
+
+
+class DataVersionMiddleware:
+    """
+    Conditional GET and a cache of compressed responses for the read views, keyed by the data version (the last seq
+    in the change log, see changes.data_version), so neither goes stale: any import, admin write or rebuild of derived
+    data bumps the version. Pages that read the collaboration graph bring it up to the version before they're rendered.
+
+    Every response to an anonymous GET gets the version as its ETag, and the time of the last change as its
+    Last-Modified, so a repeat request is answered with a 304 after one query. The body of a first request is cached
+    compressed, in the cache named by SCORES_RESPONSE_CACHE, so the next request for the same url from any client is
+    served from the cache. Requests with a session cookie, and responses that set cookies or use the CSRF token, are
+    passed through, as they might be different for each user.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = caches[getattr(settings, 'SCORES_RESPONSE_CACHE', 'default')]
+        self.timeout = getattr(settings, 'SCORES_RESPONSE_CACHE_TIMEOUT', 24 * 60 * 60)
+
+    def cacheable(self, request):
+        """
+        :return: the name of the view, if its responses can be cached, otherwise None
+        """
+        if request.method != 'GET' or settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.namespace == 'scores' and match.view_name not in UNCACHED_VIEWS:
+            return match.view_name
+        return None
+
+    def __call__(self, request):
+        view = self.cacheable(request)
+        if view is None:
+            return self.get_response(request)
+
+        seq, changed = data_version()
+        etag = 'W/"%s"' % seq
+        last_modified = changed and calendar.timegm(changed.utctimetuple())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            if view in GRAPH_VIEWS:
+                # the graph must be at least as new as the version the page is cached under
+                sync_graph(seq)
+            response, cached = self.cached_response(request, seq)
+            if not cached:
+                return response
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        # the response depends on whether there's a session cookie, as well as on the encodings accepted
+        patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
+        return response
+
+    def cached_response(self, request, seq):
+        """
+        The response from the cache, rendering it and caching its body first if it isn't there
+        :return: tuple (response, whether it could be cached)
+        """
+        key = 'scores.response:%s:%s' % (seq, request.get_full_path())
+        encoding = accepted_encoding(request)
+        entry = self.cache.get(key)
+        if entry is None:
+            response = self.get_response(request)
+            if response.status_code != 200 or response.streaming or response.cookies \
+                    or request.META.get('CSRF_COOKIE_USED'):
+                return response, False
+            entry = {
+                'headers': [(name, value) for name, value in response.items()
+                            if name.lower() not in UNCACHED_HEADERS],
+                None: response.content,
+            }
+        elif encoding in entry:
+            return entry_response(entry, encoding), True
+        # compress each body once, the first time a client accepts its encoding
+        if encoding is not None:
+            entry[encoding] = dict(ENCODINGS)[encoding](entry[None])
+        self.cache.set(key, entry, self.timeout)
+        return entry_response(entry, encoding), True
+
+
+def entry_response(entry, encoding):
+    """
+    :param entry: a cached response, as a dict of headers and the body in each encoding
+    :param encoding: the encoding to send, or None to send it uncompressed
+    """
+    response = HttpResponse(entry[encoding])
+    for name, value in entry['headers']:
+        response[name] = value
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    return response
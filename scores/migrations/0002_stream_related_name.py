@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 04:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stream',
+            name='contestantapp',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='streamrank_set', related_query_name='streamrank', to='scores.ContestantApp'),
+        ),
+    ]
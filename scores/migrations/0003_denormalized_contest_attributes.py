@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 04:18
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+ATTRIBUTES = ('assoc', 'date', 'stream', 'type')
+
+
+def copy_contest_attributes(apps, schema_editor):
+    Contest = apps.get_model('scores', 'Contest')
+    ContestantApp = apps.get_model('scores', 'ContestantApp')
+    SongApp = apps.get_model('scores', 'SongApp')
+    contest = Contest.objects.filter(pk=OuterRef('contest_id'))
+    ContestantApp.objects.update(**{
+        'contest_' + field: Subquery(contest.values(field)[:1]) for field in ATTRIBUTES
+    })
+    contestantapp = ContestantApp.objects.filter(pk=OuterRef('contestantapp_id'))
+    SongApp.objects.update(**{
+        'contest_' + field: Subquery(contestantapp.values('contest_' + field)[:1]) for field in ATTRIBUTES
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0002_stream_related_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contestantapp',
+            name='contest_assoc',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='contestantapp',
+            name='contest_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='contestantapp',
+            name='contest_stream',
+            field=models.CharField(blank=True, choices=[('I', 'International'), ('N', 'National'), ('Y', 'Youth'), ('S', 'Senior')], editable=False, max_length=1, null=True),
+        ),
+        migrations.AddField(
+            model_name='contestantapp',
+            name='contest_type',
+            field=models.CharField(blank=True, choices=[('q', 'Quartet'), ('c', 'Chorus')], editable=False, max_length=1, null=True),
+        ),
+        migrations.AddField(
+            model_name='songapp',
+            name='contest_assoc',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='songapp',
+            name='contest_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='songapp',
+            name='contest_stream',
+            field=models.CharField(blank=True, choices=[('I', 'International'), ('N', 'National'), ('Y', 'Youth'), ('S', 'Senior')], editable=False, max_length=1, null=True),
+        ),
+        migrations.AddField(
+            model_name='songapp',
+            name='contest_type',
+            field=models.CharField(blank=True, choices=[('q', 'Quartet'), ('c', 'Chorus')], editable=False, max_length=1, null=True),
+        ),
+        migrations.RunPython(copy_contest_attributes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contestantapp',
+            index=models.Index(fields=['contestant', 'contest_date'], name='contestantapp_contestant_date'),
+        ),
+        migrations.AddIndex(
+            model_name='contestantapp',
+            index=models.Index(fields=['contest_type', 'contest_date'], name='contestantapp_type_date'),
+        ),
+        migrations.AddIndex(
+            model_name='songapp',
+            index=models.Index(fields=['song', 'contest_type', 'pc_score'], name='songapp_song_type_score'),
+        ),
+        migrations.AddIndex(
+            model_name='songapp',
+            index=models.Index(fields=['song', 'contest_type', 'contest_date'], name='songapp_song_type_date'),
+        ),
+    ]
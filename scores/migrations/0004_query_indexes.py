@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 04:19
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0003_denormalized_contest_attributes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contest',
+            index=models.Index(fields=['assoc', '-year', '-date'], name='contest_assoc_year_date'),
+        ),
+        migrations.AddIndex(
+            model_name='contest',
+            index=models.Index(fields=['type', 'date'], name='contest_type_date'),
+        ),
+        migrations.AddIndex(
+            model_name='contest',
+            index=models.Index(fields=['date'], name='contest_date'),
+        ),
+        migrations.AddIndex(
+            model_name='contestantapp',
+            index=models.Index(fields=['contest', '-tot_score'], name='contestantapp_contest_score'),
+        ),
+        migrations.AddIndex(
+            model_name='judge',
+            index=models.Index(fields=['person', 'contest'], name='judge_person_contest'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['person', 'part'], name='member_person_part'),
+        ),
+    ]
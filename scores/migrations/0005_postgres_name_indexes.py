@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 05:02
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Names are looked up with name__iexact when importing and name__icontains when autocompleting, which PostgreSQL runs
+# as UPPER("name"::text) = UPPER(%s) and UPPER("name"::text) LIKE UPPER(%s), so the indexes are on UPPER("name"::text).
+# SQLite runs both as LIKE, which can't use an index either way.
+TABLES = ('scores_person', 'scores_contestant', 'scores_song')
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        schema_editor.execute('CREATE INDEX %s_upper_name ON %s (UPPER("name"::text))' % (table, table))
+        schema_editor.execute('CREATE INDEX %s_name_trgm ON %s USING gin (UPPER("name"::text) gin_trgm_ops)'
+                              % (table, table))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute('DROP INDEX IF EXISTS %s_upper_name' % table)
+        schema_editor.execute('DROP INDEX IF EXISTS %s_name_trgm' % table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0004_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
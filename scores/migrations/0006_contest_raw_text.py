@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 04:24
+from __future__ import unicode_literals
+
+import zlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def compress_raw_text(apps, schema_editor):
+    Contest = apps.get_model('scores', 'Contest')
+    ContestRawText = apps.get_model('scores', 'ContestRawText')
+    ContestRawText.objects.bulk_create((
+        ContestRawText(contest_id=pk, compressed=zlib.compress(text.encode('utf-8'), 9))
+        for pk, text in Contest.objects.exclude(raw_text=None).exclude(raw_text='').values_list('pk', 'raw_text')
+    ), batch_size=100)
+
+
+def decompress_raw_text(apps, schema_editor):
+    Contest = apps.get_model('scores', 'Contest')
+    ContestRawText = apps.get_model('scores', 'ContestRawText')
+    for raw_text in ContestRawText.objects.all():
+        Contest.objects.filter(pk=raw_text.contest_id).update(
+            raw_text=zlib.decompress(bytes(raw_text.compressed)).decode('utf-8'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0005_postgres_name_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContestRawText',
+            fields=[
+                ('contest', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='scores.Contest')),
+                ('compressed', models.BinaryField()),
+            ],
+        ),
+        migrations.RunPython(compress_raw_text, decompress_raw_text),
+        migrations.RemoveField(
+            model_name='contest',
+            name='raw_text',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 04:25
+from __future__ import unicode_literals
+
+from django.db import migrations
+import scores.slugs
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0006_contest_raw_text'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contestant',
+            name='slug',
+            field=scores.slugs.NameSlugField(always_update=True, editable=False, populate_from='name', unique=True),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='slug',
+            field=scores.slugs.NameSlugField(always_update=True, editable=False, populate_from='name', unique=True),
+        ),
+        migrations.AlterField(
+            model_name='song',
+            name='slug',
+            field=scores.slugs.NameSlugField(always_update=True, editable=False, populate_from='name', unique=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 05:40
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Unique indexes on the natural keys, which the importer relies on for INSERT ... ON CONFLICT DO NOTHING.
+# Names are compared ignoring case, as name__iexact does (SQLite's UPPER() only changes ASCII letters).
+UNIQUE_INDEXES = (
+    ('person_name_key', 'scores_person', 'UPPER("name")'),
+    ('song_name_key', 'scores_song', 'UPPER("name")'),
+    ('contestant_name_key', 'scores_contestant', 'UPPER("name"), "assoc", "type"'),
+    ('contest_natural_key', 'scores_contest', '"assoc", "contest", "date", COALESCE("stream", \'\')'),
+)
+
+# the non-unique UPPER(name) indexes from 0005_postgres_name_indexes, which the unique indexes replace
+POSTGRES_INDEXES = ('scores_person', 'scores_contestant', 'scores_song')
+
+
+def create_indexes(apps, schema_editor):
+    for name, table, columns in UNIQUE_INDEXES:
+        schema_editor.execute('CREATE UNIQUE INDEX %s ON %s (%s)' % (name, table, columns))
+    if schema_editor.connection.vendor == 'postgresql':
+        for table in POSTGRES_INDEXES:
+            schema_editor.execute('DROP INDEX IF EXISTS %s_upper_name' % table)
+
+
+def drop_indexes(apps, schema_editor):
+    for name, table, columns in UNIQUE_INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % name)
+    if schema_editor.connection.vendor == 'postgresql':
+        for table in POSTGRES_INDEXES:
+            schema_editor.execute('CREATE INDEX %s_upper_name ON %s (UPPER("name"::text))' % (table, table))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0007_name_slug_field'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
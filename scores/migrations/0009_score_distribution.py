@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 04:30
+from __future__ import unicode_literals
+
+import sys
+from array import array
+from collections import defaultdict
+
+from django.db import migrations, models
+
+FIELDS = ('pc_score', 'm_pc', 'p_pc', 's_pc')
+
+
+def build_distributions(apps, schema_editor):
+    # the same as distributions.rebuild_distributions(), with the historical models
+    ScoreDistribution = apps.get_model('scores', 'ScoreDistribution')
+    distributions = []
+    for level, model_name in (('c', 'ContestantApp'), ('s', 'SongApp')):
+        model = apps.get_model('scores', model_name)
+        groups = defaultdict(lambda: defaultdict(list))
+        rows = model.objects.exclude(contest_date=None).values_list(
+            'contest_assoc', 'contest_type', 'contest_stream', 'contest_date', *FIELDS)
+        for row in rows:
+            key = (row[0], row[1], row[2] or '', row[3].year)
+            for field, score in zip(FIELDS, row[4:]):
+                if score is not None:
+                    groups[key][field].append(int(round(score * 10)))
+        for (assoc, type, stream, year), scores in groups.items():
+            for field, values in scores.items():
+                packed = array('H', sorted(values))
+                if sys.byteorder == 'big':
+                    packed.byteswap()
+                distributions.append(ScoreDistribution(
+                    assoc=assoc, type=type, stream=stream, year=year, level=level, field=field,
+                    n=len(packed), packed=packed.tobytes()))
+    ScoreDistribution.objects.bulk_create(distributions, batch_size=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0008_natural_key_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreDistribution',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assoc', models.CharField(max_length=100)),
+                ('type', models.CharField(max_length=1)),
+                ('stream', models.CharField(blank=True, max_length=1)),
+                ('year', models.IntegerField()),
+                ('level', models.CharField(choices=[('c', 'Contestant'), ('s', 'Song')], max_length=1)),
+                ('field', models.CharField(max_length=10)),
+                ('n', models.IntegerField()),
+                ('packed', models.BinaryField()),
+            ],
+            options={
+                'unique_together': set([('assoc', 'type', 'stream', 'year', 'level', 'field')]),
+            },
+        ),
+        migrations.RunPython(build_distributions, migrations.RunPython.noop),
+    ]
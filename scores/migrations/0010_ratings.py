@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 04:32
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from scores.ratings import replay
+
+
+def rate_existing_contests(apps, schema_editor):
+    # the same as ratings.rebuild_ratings(), with the historical models
+    Contestant = apps.get_model('scores', 'Contestant')
+    ContestantApp = apps.get_model('scores', 'ContestantApp')
+    Rating = apps.get_model('scores', 'Rating')
+    RatingHistory = apps.get_model('scores', 'RatingHistory')
+    alias_of = dict(Contestant.objects.values_list('id', 'alias_of_id'))
+
+    def canonical(c):
+        seen = set()
+        while alias_of.get(c) and c not in seen:
+            seen.add(c)
+            c = alias_of[c]
+        return c
+
+    rows = ContestantApp.objects.exclude(contest_date=None).order_by('contest_date', 'contest_id').values_list(
+        'id', 'contest_id', 'contest_date', 'contestant_id', 'rank')
+    ratings = {}
+    history = replay([row[:3] + (canonical(row[3]), row[4]) for row in rows], ratings)
+    RatingHistory.objects.bulk_create([
+        RatingHistory(contestantapp_id=app, contestant_id=c, contest_date=date, before=before, after=after)
+        for app, c, date, before, after in history
+    ], batch_size=500)
+    Rating.objects.bulk_create([
+        Rating(contestant_id=c, rating=rating, contests=contests, last_date=last_date)
+        for c, (rating, contests, last_date) in ratings.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0009_score_distribution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Rating',
+            fields=[
+                ('contestant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='scores.Contestant')),
+                ('rating', models.FloatField()),
+                ('contests', models.IntegerField()),
+                ('last_date', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RatingHistory',
+            fields=[
+                ('contestantapp', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='scores.ContestantApp')),
+                ('contest_date', models.DateField()),
+                ('before', models.FloatField()),
+                ('after', models.FloatField()),
+                ('contestant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='scores.Contestant')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['-rating'], name='rating_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='ratinghistory',
+            index=models.Index(fields=['contestant', 'contest_date'], name='ratinghistory_contestant_date'),
+        ),
+        migrations.RunPython(rate_existing_contests, migrations.RunPython.noop),
+    ]
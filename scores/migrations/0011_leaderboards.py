@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 04:33
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from scores.leaderboards import LEADERBOARD_SIZE, leaderboard_sql
+
+
+def build_leaderboards(apps, schema_editor):
+    # the same as leaderboards.rebuild_leaderboards(), which only uses raw SQL
+    for sql in leaderboard_sql(schema_editor.connection):
+        schema_editor.execute(sql, [LEADERBOARD_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0010_ratings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SongLeaderboardEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=1)),
+                ('position', models.IntegerField()),
+                ('pc_score', models.DecimalField(decimal_places=1, max_digits=4, verbose_name='Total %')),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='scores.Song')),
+                ('songapp', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='scores.SongApp')),
+            ],
+            options={
+                'unique_together': set([('song', 'type', 'position')]),
+            },
+        ),
+        migrations.CreateModel(
+            name='SeasonLeaderboardEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assoc', models.CharField(max_length=100)),
+                ('type', models.CharField(max_length=1)),
+                ('stream', models.CharField(blank=True, max_length=1)),
+                ('year', models.IntegerField()),
+                ('level', models.CharField(choices=[('c', 'Contestant'), ('s', 'Song')], max_length=1)),
+                ('position', models.IntegerField()),
+                ('pc_score', models.DecimalField(decimal_places=1, max_digits=4, verbose_name='Total %')),
+                ('contestantapp', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='scores.ContestantApp')),
+                ('songapp', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='scores.SongApp')),
+            ],
+            options={
+                'unique_together': set([('assoc', 'type', 'stream', 'year', 'level', 'position')]),
+            },
+        ),
+        migrations.RunPython(build_leaderboards, migrations.RunPython.noop),
+    ]
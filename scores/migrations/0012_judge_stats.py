@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 04:39
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from scores.judging import CATEGORY_FIELDS, judge_matrices
+
+
+def build_judge_stats(apps, schema_editor):
+    # the same as judging.rebuild_judge_stats(), with the historical models
+    Judge = apps.get_model('scores', 'Judge')
+    ContestantApp = apps.get_model('scores', 'ContestantApp')
+    JudgeStats = apps.get_model('scores', 'JudgeStats')
+    JudgeContestantStats = apps.get_model('scores', 'JudgeContestantStats')
+
+    def canonical(model):
+        alias_of = dict(model.objects.values_list('id', 'alias_of_id'))
+
+        def follow(id):
+            seen = set()
+            while alias_of.get(id) and id not in seen:
+                seen.add(id)
+                id = alias_of[id]
+            return id
+        return follow
+
+    person = canonical(apps.get_model('scores', 'Person'))
+    contestant = canonical(apps.get_model('scores', 'Contestant'))
+    rows = ContestantApp.objects.values_list('contest_id', 'contestant_id', 'pc_score', *CATEGORY_FIELDS.values())
+    by_judge, by_contestant = judge_matrices(
+        [(c, person(p), cat) for c, p, cat in Judge.objects.values_list('contest_id', 'person_id', 'cat')],
+        [(row[0], contestant(row[1]), dict(zip(CATEGORY_FIELDS, row[3:])), row[2]) for row in rows],
+    )
+    JudgeStats.objects.bulk_create([
+        JudgeStats(person_id=p, cat=cat, panels=panels, appearances=n, awarded_total=awarded, overall_total=overall)
+        for (p, cat), (panels, n, awarded, overall) in by_judge.items()
+    ], batch_size=500)
+    JudgeContestantStats.objects.bulk_create([
+        JudgeContestantStats(person_id=p, contestant_id=c, cat=cat, appearances=n, awarded_total=awarded,
+                             overall_total=overall)
+        for (p, c, cat), (n, awarded, overall) in by_contestant.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0011_leaderboards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JudgeStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appearances', models.IntegerField(default=0)),
+                ('awarded_total', models.FloatField(default=0)),
+                ('overall_total', models.FloatField(default=0)),
+                ('cat', models.CharField(choices=[('m', 'Music'), ('s', 'Singing'), ('p', 'Presentation'), ('a', 'Administration')], max_length=1, verbose_name='Category')),
+                ('panels', models.IntegerField(default=0)),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='scores.Person')),
+            ],
+            options={
+                'unique_together': set([('person', 'cat')]),
+            },
+        ),
+        migrations.CreateModel(
+            name='JudgeContestantStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appearances', models.IntegerField(default=0)),
+                ('awarded_total', models.FloatField(default=0)),
+                ('overall_total', models.FloatField(default=0)),
+                ('cat', models.CharField(choices=[('m', 'Music'), ('s', 'Singing'), ('p', 'Presentation'), ('a', 'Administration')], max_length=1, verbose_name='Category')),
+                ('contestant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='scores.Contestant')),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='scores.Person')),
+            ],
+            options={
+                'unique_together': set([('person', 'contestant', 'cat')]),
+            },
+        ),
+        migrations.RunPython(build_judge_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 04:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scores', '0012_judge_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=30)),
+                ('object_id', models.IntegerField()),
+                ('action', models.CharField(choices=[('i', 'Insert'), ('u', 'Update'), ('d', 'Delete')], max_length=1)),
+                ('time', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -1,46 +1,73 @@
+import sys, zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from django.core.exceptions import ValidationError
 from django.db import models
-from autoslug import AutoSlugField
+from django.utils import timezone
+from .slugs import NameSlugField
 
 #################################################################
 # Models for Person, Group, and Song names
 #################################################################
 
 
-class Person(models.Model):
+class UniqueName:
+    """
+    Checks the unique indexes on UPPER(name) (see migration 0008) when a form validates a name, ignoring case as they
+    do, so that a clash is a form error rather than an IntegrityError
+    """
+    # the other fields in the name's unique index
+    name_key_fields = ()
+
+    def validate_unique(self, exclude=None):
+        super().validate_unique(exclude)
+        if exclude and 'name' in exclude:
+            return
+        clash = type(self)._default_manager.filter(
+            name__iexact=self.name, **{field: getattr(self, field) for field in self.name_key_fields}
+        ).exclude(pk=self.pk).first()
+        if clash is not None:
+            raise ValidationError({'name': '%s "%s" already exists' % (
+                self._meta.verbose_name.capitalize(), clash.name)})
+
+
+class Person(UniqueName, models.Model):
     """
     A unique person, who may be known by several names
     """
     name = models.CharField(max_length=100)
-    slug = AutoSlugField(populate_from='name', always_update=True, unique=True)
+    slug = NameSlugField(populate_from='name', always_update=True, unique=True)
     alias_of = models.ForeignKey("self", blank=True, null=True, on_delete=models.PROTECT)
 
     def __str__(self):
         return self.name
 
 
-class Contestant(models.Model):
+class Contestant(UniqueName, models.Model):
     """
     A unique quartet or chorus, who may be known by several names
     """
+    name_key_fields = ('assoc', 'type')
+
     name = models.CharField(max_length=100)
     assoc = models.CharField(max_length=100)
     type = models.CharField(max_length=1, choices=(
         ('c', 'Chorus'),
         ('q', 'Quartet'),
     ))
-    slug = AutoSlugField(populate_from='name', always_update=True, unique=True)
+    slug = NameSlugField(populate_from='name', always_update=True, unique=True)
     alias_of = models.ForeignKey("self", blank=True, null=True, on_delete=models.PROTECT)
 
     def __str__(self):
         return self.name
 
 
-class Song(models.Model):
+class Song(UniqueName, models.Model):
     """
     A unique song, which may be known by several names
     """
     name = models.CharField(max_length=100)
-    slug = AutoSlugField(populate_from='name', always_update=True, unique=True)
+    slug = NameSlugField(populate_from='name', always_update=True, unique=True)
     alias_of = models.ForeignKey("self", blank=True, null=True, on_delete=models.PROTECT)
 
     def __str__(self):
@@ -67,7 +94,6 @@ class Contest(models.Model):
     contest = models.CharField(max_length=100)
     date = models.DateField()
     location = models.CharField(max_length=100)
-    raw_text = models.TextField(blank=True, null=True)
     stream = models.CharField('Stream', max_length=1, blank=True, null=True, choices=STREAM_CHOICES)
     type = models.CharField(max_length=1, choices=(
         ('q', 'Quartet'),
@@ -75,10 +101,41 @@ class Contest(models.Model):
     ))
     year = models.CharField(max_length=20)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['assoc', '-year', '-date'], name='contest_assoc_year_date'),
+            models.Index(fields=['type', 'date'], name='contest_type_date'),
+            models.Index(fields=['date'], name='contest_date'),
+        ]
+
     # Methods
     def __str__(self):
         return " / ".join((self.assoc, self.contest, self.date.strftime('%x')))
 
+    def get_raw_text(self):
+        """
+        The text of the scoresheet, loaded from ContestRawText
+        :return: text, or None if there isn't any
+        """
+        raw_text = ContestRawText.objects.filter(contest=self).first()
+        return raw_text.text if raw_text else None
+
+
+class ContestRawText(models.Model):
+    """
+    The text of a contest's scoresheet, compressed, in its own table so that loading a Contest doesn't load the text
+    """
+    contest = models.OneToOneField(Contest, on_delete=models.CASCADE, primary_key=True)
+    compressed = models.BinaryField()
+
+    @property
+    def text(self):
+        return zlib.decompress(bytes(self.compressed)).decode('utf-8')
+
+    @text.setter
+    def text(self, value):
+        self.compressed = zlib.compress(value.encode('utf-8'), 9)
+
 
 class ContestURL(models.Model):
     contest = models.ForeignKey(Contest, on_delete=models.CASCADE)
@@ -103,12 +160,46 @@ class Judge(models.Model):
         ('a', 'Administration'),
     ))
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['person', 'contest'], name='judge_person_contest'),
+        ]
+
     # Methods
     def __str__(self):
         return '%s (%s)' % (self.person.name, self.cat)
 
 
-class ContestantApp(models.Model):
+# the Contest fields copied to ContestAttributes
+CONTEST_ATTRIBUTES = ('assoc', 'date', 'stream', 'type')
+
+
+class ContestAttributes(models.Model):
+    """
+    Copies of the contest's attributes, so that appearances can be filtered and sorted without joining to Contest.
+    Kept up to date by the signals in signals.py.
+    """
+    contest_assoc = models.CharField(max_length=100, blank=True, null=True, editable=False)
+    contest_date = models.DateField(blank=True, null=True, editable=False)
+    contest_stream = models.CharField(max_length=1, blank=True, null=True, editable=False, choices=STREAM_CHOICES)
+    contest_type = models.CharField(max_length=1, blank=True, null=True, editable=False, choices=(
+        ('q', 'Quartet'),
+        ('c', 'Chorus'),
+    ))
+
+    class Meta:
+        abstract = True
+
+    def copy_contest_attributes(self, source):
+        """
+        :param source: a Contest, or another object with the contest attributes
+        """
+        prefix = '' if isinstance(source, Contest) else 'contest_'
+        for field in CONTEST_ATTRIBUTES:
+            setattr(self, 'contest_' + field, getattr(source, prefix + field))
+
+
+class ContestantApp(ContestAttributes):
     """
     Represents a contestant's appearance in a contest
     One Contest --< Many ContestantApps >-- One Contestant
@@ -134,22 +225,33 @@ class ContestantApp(models.Model):
     n = models.IntegerField('Number of songs')
     size = models.IntegerField(blank=True, null=True)     # chorus only
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['contestant', 'contest_date'], name='contestantapp_contestant_date'),
+            models.Index(fields=['contest_type', 'contest_date'], name='contestantapp_type_date'),
+            models.Index(fields=['contest', '-tot_score'], name='contestantapp_contest_score'),
+        ]
+
     # Methods
     def __str__(self):
-        return "%s - %s" % (self.contestant.name, self.contest.date)
+        return "%s - %s" % (self.contestant.name, self.contest_date)
 
     # check if quartet or chorus
     def type(self):
-        return self.contest.type[0]
+        return self.contest_type
 
 
 class Stream(models.Model):
-    contestantapp = models.ForeignKey(ContestantApp, on_delete=models.CASCADE)
+    """
+    Represents a contestant's appearance in one stream of a (possibly combined) contest, and their rank within it
+    """
+    contestantapp = models.ForeignKey(ContestantApp, on_delete=models.CASCADE,
+                                      related_name='streamrank_set', related_query_name='streamrank')
     stream = models.CharField('Stream', max_length=1, choices=STREAM_CHOICES)
     rank = models.IntegerField(blank=True, null=True)
 
 
-class SongApp(models.Model):
+class SongApp(ContestAttributes):
     """
     Models the appearance (the singing) of a Song during a ContestantApp
     One ContestantApp --< Many SongApps >-- One Song
@@ -172,14 +274,14 @@ class SongApp(models.Model):
     pc_score = models.DecimalField('Total %', max_digits=4, decimal_places=1)
     n = models.IntegerField('Number of songs')
 
-    def __str__(self):
-        return "%s - %s" % (self.song.name, self.contestantapp.contest.date)
+    class Meta:
+        indexes = [
+            models.Index(fields=['song', 'contest_type', 'pc_score'], name='songapp_song_type_score'),
+            models.Index(fields=['song', 'contest_type', 'contest_date'], name='songapp_song_type_date'),
+        ]
 
-    # def contest_type(self):
-    #     return self.contestantapp.contest.type
-    #
-    # def get_contest_type_display(self):
-    #     return self.contestantapp.contest.get_type_display()
+    def __str__(self):
+        return "%s - %s" % (self.song.name, self.contest_date)
 
 class Member(models.Model):
     """
@@ -199,6 +301,11 @@ class Member(models.Model):
         ('director', 'Dir'),
     ))
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['person', 'part'], name='member_person_part'),
+        ]
+
     def __str__(self):
         return self.person.name
 
@@ -209,3 +316,214 @@ class Video(models.Model):
     """
     songapp = models.ForeignKey(SongApp, on_delete=models.CASCADE)
     link = models.URLField()
+
+
+#################################################################
+# Precomputed statistics
+#################################################################
+
+
+class ScoreDistribution(models.Model):
+    """
+    The sorted scores of every contestant (or song) appearance in a group of comparable contests, i.e. contests with
+    the same assoc, type, stream and year, for finding the percentile rank of a score (see distributions.py)
+    """
+    assoc = models.CharField(max_length=100)
+    type = models.CharField(max_length=1)
+    stream = models.CharField(max_length=1, blank=True)     # '' if the contests don't have a stream
+    year = models.IntegerField()
+    level = models.CharField(max_length=1, choices=(
+        ('c', 'Contestant'),
+        ('s', 'Song'),
+    ))
+    field = models.CharField(max_length=10)     # pc_score, m_pc, p_pc or s_pc
+    n = models.IntegerField()
+    # the scores in tenths of a percent, sorted, as unsigned 16 bit little-endian integers
+    packed = models.BinaryField()
+
+    class Meta:
+        unique_together = ('assoc', 'type', 'stream', 'year', 'level', 'field')
+
+    def __str__(self):
+        return '%s %s %s %s %s %s (%s)' % (self.assoc, self.type, self.stream, self.year, self.level, self.field, self.n)
+
+    @property
+    def values(self):
+        # unpacked once per object, so that each percentile_rank() is just a binary search
+        if getattr(self, '_values', None) is None:
+            self._values = array('H')
+            self._values.frombytes(bytes(self.packed))
+            if sys.byteorder == 'big':
+                self._values.byteswap()
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = array('H', values)
+        packed = array('H', values)
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        self.packed = packed.tobytes()
+        self.n = len(packed)
+
+    def percentile_rank(self, score):
+        """
+        The percentage of scores in the distribution below this one, counting equal scores as half below
+        :param score: a percentage, e.g. Decimal('72.4')
+        :return: 0 to 100, or None if the distribution is empty
+        """
+        values = self.values
+        if not values:
+            return None
+        tenths = int(round(score * 10))
+        below, not_above = bisect_left(values, tenths), bisect_right(values, tenths)
+        return 100 * (below + not_above) / 2 / len(values)
+
+
+class Rating(models.Model):
+    """
+    A contestant's current rating, from their ranks in every contest so far (see ratings.py)
+    """
+    contestant = models.OneToOneField(Contestant, on_delete=models.CASCADE, primary_key=True)
+    rating = models.FloatField()
+    contests = models.IntegerField()
+    last_date = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating'], name='rating_rating'),
+        ]
+
+    def __str__(self):
+        return '%s: %.0f' % (self.contestant.name, self.rating)
+
+
+class RatingHistory(models.Model):
+    """
+    A contestant's rating before and after one of their appearances
+    """
+    contestantapp = models.OneToOneField(ContestantApp, on_delete=models.CASCADE, primary_key=True)
+    # the canonical contestant, i.e. after following aliases
+    contestant = models.ForeignKey(Contestant, on_delete=models.CASCADE)
+    contest_date = models.DateField()
+    before = models.FloatField()
+    after = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['contestant', 'contest_date'], name='ratinghistory_contestant_date'),
+        ]
+
+    def __str__(self):
+        return '%s - %s: %.0f' % (self.contestant.name, self.contest_date, self.after)
+
+
+class SeasonLeaderboardEntry(models.Model):
+    """
+    One of the highest scoring contestant (or song) appearances in a season, i.e. among contests with the same assoc,
+    type, stream and year (see leaderboards.py)
+    """
+    assoc = models.CharField(max_length=100)
+    type = models.CharField(max_length=1)
+    stream = models.CharField(max_length=1, blank=True)     # '' if the contests don't have a stream
+    year = models.IntegerField()
+    level = models.CharField(max_length=1, choices=(
+        ('c', 'Contestant'),
+        ('s', 'Song'),
+    ))
+    position = models.IntegerField()
+    pc_score = models.DecimalField('Total %', max_digits=4, decimal_places=1)
+    contestantapp = models.ForeignKey(ContestantApp, on_delete=models.CASCADE)
+    songapp = models.ForeignKey(SongApp, on_delete=models.CASCADE, blank=True, null=True)     # song level only
+
+    class Meta:
+        unique_together = ('assoc', 'type', 'stream', 'year', 'level', 'position')
+
+
+class SongLeaderboardEntry(models.Model):
+    """
+    One of the highest scoring performances of a song, by quartets or by choruses (see leaderboards.py)
+    """
+    song = models.ForeignKey(Song, on_delete=models.CASCADE)
+    type = models.CharField(max_length=1)
+    position = models.IntegerField()
+    pc_score = models.DecimalField('Total %', max_digits=4, decimal_places=1)
+    songapp = models.ForeignKey(SongApp, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('song', 'type', 'position')
+
+    @property
+    def contestantapp(self):
+        return self.songapp.contestantapp
+
+
+class JudgeTotals(models.Model):
+    """
+    Running totals of the category scores a judge's panels gave, and of the total scores of the same appearances,
+    so that averages can be found without joining Judge to ContestantApp (see judging.py)
+    """
+    appearances = models.IntegerField(default=0)
+    awarded_total = models.FloatField(default=0)     # sum of the category % of each appearance judged
+    overall_total = models.FloatField(default=0)     # sum of the total % of the same appearances
+
+    class Meta:
+        abstract = True
+
+    def avg_awarded(self):
+        return self.awarded_total / self.appearances if self.appearances else None
+
+    def avg_overall(self):
+        return self.overall_total / self.appearances if self.appearances else None
+
+    def difference(self):
+        """
+        :return: how much higher the category scored than the appearances did overall, in percentage points
+        """
+        return (self.awarded_total - self.overall_total) / self.appearances if self.appearances else None
+
+
+class JudgeStats(JudgeTotals):
+    """
+    A judge's record in one category: the panels they sat on, and how the category scored on those panels
+    """
+    person = models.ForeignKey(Person, on_delete=models.CASCADE)
+    cat = models.CharField('Category', max_length=1, choices=Judge._meta.get_field('cat').choices)
+    panels = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('person', 'cat')
+
+    def __str__(self):
+        return '%s (%s): %s panels' % (self.person.name, self.cat, self.panels)
+
+
+class JudgeContestantStats(JudgeTotals):
+    """
+    How a judge's category scored one contestant, over every contest where they judged them
+    """
+    person = models.ForeignKey(Person, on_delete=models.CASCADE)
+    contestant = models.ForeignKey(Contestant, on_delete=models.CASCADE)
+    cat = models.CharField('Category', max_length=1, choices=Judge._meta.get_field('cat').choices)
+
+    class Meta:
+        unique_together = ('person', 'contestant', 'cat')
+
+
+class ChangeLogEntry(models.Model):
+    """
+    An append-only record of an insert, update or delete of a row, for consumers that sync incrementally by asking
+    for the changes after the last seq they saw (see changes.py)
+    """
+    seq = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=30)     # model_name, e.g. 'contestantapp'
+    object_id = models.IntegerField()
+    action = models.CharField(max_length=1, choices=(
+        ('i', 'Insert'),
+        ('u', 'Update'),
+        ('d', 'Delete'),
+    ))
+    time = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return '%s: %s %s %s' % (self.seq, self.get_action_display(), self.model, self.object_id)
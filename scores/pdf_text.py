@@ -0,0 +1,394 @@
+"""
+Text extraction from the bytes of a PDF file in this process, with PyPDF2 reading the content streams, instead of
+writing the file to disk and starting pdftotext.
+
+The text comes out as `pdftotext -raw` (xpdf) writes it, as the scoresheet regexes in scrape_pdf were written against
+that: words in the order they're drawn rather than sorted by position, each followed by a space if the next word
+carries on the same line, by nothing if the next word touches it, and by a newline otherwise; each page ends with a
+form feed. A word ends at a space, at the end of each string drawn, and where the next character doesn't follow on
+from the last; the thresholds for all of these are xpdf's (TextOutputDev.cc), as fractions of the font size.
+"""
+
+import codecs, math, numbers, re
+from io import BytesIO
+from PyPDF2 import PdfFileReader
+from PyPDF2.pdf import ContentStream
+
+# a character further than this after the end of a word, or this far back over it, starts a new word
+MIN_WORD_BREAK_SPACE = 0.1
+MIN_DUP_BREAK_OVERLAP = 0.2
+
+# a character whose baseline is more than this many points from the word's starts a new word
+MAX_BASE_DELTA = 0.5
+
+# words whose baselines are closer than this are on the same line, and separated by a space if further apart than
+# MIN_WORD_SPACING
+MAX_INTRA_LINE_DELTA = 0.5
+MIN_WORD_SPACING = 0.1
+
+IDENTITY = (1, 0, 0, 1, 0, 0)
+
+# the codecs closest to the simple font encodings
+BASE_ENCODINGS = {
+    '/WinAnsiEncoding': 'cp1252',
+    '/MacRomanEncoding': 'mac_roman',
+    '/StandardEncoding': 'latin-1',
+}
+
+# glyph names that can appear in an encoding's /Differences, other than single characters and uniXXXX
+GLYPH_NAMES = {
+    'space': ' ', 'exclam': '!', 'quotedbl': '"', 'numbersign': '#', 'dollar': '$', 'percent': '%',
+    'ampersand': '&', 'quotesingle': "'", 'quoteright': '’', 'quoteleft': '‘', 'parenleft': '(',
+    'parenright': ')', 'asterisk': '*', 'plus': '+', 'comma': ',', 'hyphen': '-', 'period': '.', 'slash': '/',
+    'zero': '0', 'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5', 'six': '6', 'seven': '7',
+    'eight': '8', 'nine': '9', 'colon': ':', 'semicolon': ';', 'less': '<', 'equal': '=', 'greater': '>',
+    'question': '?', 'at': '@', 'bracketleft': '[', 'backslash': '\\', 'bracketright': ']', 'underscore': '_',
+    'endash': '–', 'emdash': '—', 'quotedblleft': '“', 'quotedblright': '”',
+    'eacute': 'é', 'egrave': 'è', 'aacute': 'á', 'oacute': 'ó', 'udieresis': 'ü',
+    'odieresis': 'ö', 'adieresis': 'ä', 'ccedilla': 'ç', 'nbspace': ' ',
+}
+
+# Helvetica's widths (in 1/1000 em) from its AFM, for the standard fonts that PDFs may use without giving widths
+HELVETICA_WIDTHS = dict(zip(
+    ' !"#$%&\'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~',
+    (278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278) + (556,) * 10 +
+    (278, 278, 584, 584, 584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+     667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556, 333, 556, 556, 500, 556, 556,
+     278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334,
+     260, 334, 584),
+))
+COURIER_WIDTH = 600
+
+
+def multiply(m1, m2):
+    """
+    :return: the product of two PDF matrices (a, b, c, d, e, f), i.e. m1 applied first, then m2
+    """
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (a1 * a2 + b1 * c2, a1 * b2 + b1 * d2, c1 * a2 + d1 * c2, c1 * b2 + d1 * d2,
+            e1 * a2 + f1 * c2 + e2, e1 * b2 + f1 * d2 + f2)
+
+
+def translate(x, y):
+    return 1, 0, 0, 1, x, y
+
+
+def get(dictionary, key, default=None):
+    """
+    dictionary.get(), following an indirect reference to the value, as PyPDF2's [] does but its get() doesn't
+    """
+    return dictionary[key] if key in dictionary else default
+
+
+def raw_bytes(string):
+    """
+    The bytes of a PDF string operand, which PyPDF2 may have decoded as text
+    """
+    return bytes(string.original_bytes) if hasattr(string, 'original_bytes') else bytes(string)
+
+
+###############################################################
+# Fonts
+###############################################################
+
+
+def parse_to_unicode(data):
+    """
+    Read the character code to text mappings of a ToUnicode CMap
+    :param data: the CMap stream's bytes
+    :return: dict of code: text
+    """
+    def text(hex):
+        return codecs.decode(hex, 'hex').decode('utf-16-be', 'replace')
+
+    data = data.decode('latin-1')
+    mapping = {}
+    for block in re.findall(r'beginbfchar(.*?)endbfchar', data, re.DOTALL):
+        for src, dst in re.findall(r'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]*)>', block):
+            mapping[int(src, 16)] = text(dst)
+    for block in re.findall(r'beginbfrange(.*?)endbfrange', data, re.DOTALL):
+        for lo, hi, dst in re.findall(r'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f]*>|\[[^\]]*\])', block):
+            lo, hi = int(lo, 16), int(hi, 16)
+            if dst.startswith('['):
+                for code, hex in zip(range(lo, hi + 1), re.findall(r'<([0-9A-Fa-f]*)>', dst)):
+                    mapping[code] = text(hex)
+            else:
+                # the last byte of the destination counts up through the range
+                start = int(dst[1:-1] or '0', 16)
+                width = max(len(dst) - 2, 4)
+                for code in range(lo, hi + 1):
+                    mapping[code] = text('%0*x' % (width, start + code - lo))
+    return mapping
+
+
+def glyph_text(name):
+    name = name.lstrip('/')
+    if len(name) == 1:
+        return name
+    if re.match(r'^uni[0-9A-Fa-f]{4}$', name):
+        return chr(int(name[3:], 16))
+    return GLYPH_NAMES.get(name)
+
+
+class Font:
+    """
+    What's needed from a font to place its text: the text and width of each character code
+    """
+    def __init__(self, font):
+        """
+        :param font: font dictionary
+        """
+        self.two_byte = get(font, '/Subtype') == '/Type0'
+        self.to_unicode = {}
+        if '/ToUnicode' in font:
+            self.to_unicode = parse_to_unicode(font['/ToUnicode'].getData())
+
+        self.encoding = {}
+        if self.two_byte:
+            descendant = font['/DescendantFonts'][0].getObject()
+            self.widths = cid_widths(get(descendant, '/W', []))
+            self.default_width = float(get(descendant, '/DW', 1000))
+            return
+
+        encoding = get(font, '/Encoding')
+        differences = []
+        if hasattr(encoding, 'keys'):
+            differences = get(encoding, '/Differences', [])
+            encoding = get(encoding, '/BaseEncoding')
+        codec = BASE_ENCODINGS.get(encoding, 'cp1252')
+        for code in range(256):
+            self.encoding[code] = bytes([code]).decode(codec, 'replace')
+        code = 0
+        for item in differences:
+            item = item.getObject()
+            if isinstance(item, int):
+                code = item
+                continue
+            text = glyph_text(item)
+            if text is not None:
+                self.encoding[code] = text
+            code += 1
+
+        first = int(get(font, '/FirstChar', 0))
+        self.widths = {first + i: float(w.getObject()) for i, w in enumerate(get(font, '/Widths', []))}
+        descriptor = get(font, '/FontDescriptor')
+        self.default_width = float(get(descriptor, '/MissingWidth', 0)) if descriptor else 0.0
+        if not self.widths:
+            # one of the standard fonts, whose widths PDF readers know
+            if 'Courier' in get(font, '/BaseFont', ''):
+                self.widths = {code: COURIER_WIDTH for code in range(256)}
+            else:
+                self.widths = {code: HELVETICA_WIDTHS.get(self.encoding[code], 556) for code in range(256)}
+
+    def characters(self, data):
+        """
+        :param data: the bytes of a string drawn in the font
+        :return: iterable of (code, text, width in 1/1000 em, whether it's a single byte space)
+        """
+        if self.two_byte:
+            codes = [data[i] << 8 | data[i + 1] for i in range(0, len(data) - 1, 2)]
+        else:
+            codes = list(data)
+        for code in codes:
+            text = self.to_unicode.get(code)
+            if text is None:
+                text = self.encoding.get(code, chr(code))
+            yield code, text, self.widths.get(code, self.default_width), code == 32 and not self.two_byte
+
+
+def cid_widths(w):
+    """
+    :param w: a CIDFont's /W array, of "first [w1 w2 ...]" and "first last w" entries
+    :return: dict of CID: width
+    """
+    w = [item.getObject() for item in w]
+    widths = {}
+    i = 0
+    while i < len(w) - 1:
+        if isinstance(w[i + 1], list):
+            widths.update((int(w[i]) + j, float(width)) for j, width in enumerate(w[i + 1]))
+            i += 2
+        else:
+            widths.update((cid, float(w[i + 2])) for cid in range(int(w[i]), int(w[i + 1]) + 1))
+            i += 3
+    return widths
+
+
+###############################################################
+# Pages
+###############################################################
+
+
+class Word:
+    __slots__ = ('text', 'x_min', 'x_max', 'base', 'font_size')
+
+    def __init__(self, x, base, font_size):
+        self.text = []
+        self.x_min = self.x_max = x
+        self.base = base
+        self.font_size = font_size
+
+
+class PageText:
+    """
+    Runs a page's content streams, collecting the words drawn, in the order they're drawn
+    """
+    def __init__(self, reader, fonts):
+        """
+        :param fonts: dict of font dictionary id: Font, shared between the pages of a file
+        """
+        self.reader = reader
+        self.fonts = fonts
+        self.words = []
+        self.word = None
+
+    def end_word(self):
+        if self.word is not None and self.word.text:
+            self.words.append(self.word)
+        self.word = None
+
+    def add_character(self, x, base, width, font_size, text):
+        if text == ' ':
+            self.end_word()
+            return
+        word = self.word
+        if word is not None and word.text:
+            space = x - word.x_max
+            if space < -MIN_DUP_BREAK_OVERLAP * word.font_size or space > MIN_WORD_BREAK_SPACE * word.font_size \
+                    or abs(base - word.base) > MAX_BASE_DELTA or font_size != word.font_size:
+                self.end_word()
+                word = None
+        if word is None:
+            word = self.word = Word(x, base, font_size)
+        word.text.append(text)
+        word.x_max = x + width
+
+    def run(self, contents, resources, ctm=IDENTITY):
+        """
+        Follow the text and graphics state operators of a content stream, and place the characters it draws
+        """
+        if contents is None:
+            return
+        resources = resources if resources is not None else {}
+        fonts = get(resources, '/Font', {})
+        xobjects = get(resources, '/XObject', {})
+        state = {'ctm': ctm, 'font': None, 'size': 0.0, 'tc': 0.0, 'tw': 0.0, 'th': 1.0, 'tl': 0.0, 'rise': 0.0}
+        stack = []
+        tm = tlm = IDENTITY
+
+        def show(string):
+            nonlocal tm
+            font, size, th = state['font'], state['size'], state['th']
+            if font is None:
+                return
+            m = multiply(tm, state['ctm'])
+            font_size = size * math.hypot(m[2], m[3])
+            for code, text, width, is_space in font.characters(raw_bytes(string)):
+                m = multiply(tm, state['ctm'])
+                x, base = m[4], m[5] + state['rise'] * m[3]
+                advance = (width / 1000 * size + state['tc'] + (state['tw'] if is_space else 0)) * th
+                # e.g. a ligature's characters share its width
+                width = advance * m[0] / max(len(text), 1)
+                for i, character in enumerate(text):
+                    self.add_character(x + i * width, base, width, font_size, character)
+                tm = multiply(translate(advance, 0), tm)
+            self.end_word()
+
+        def next_line(tx, ty):
+            nonlocal tm, tlm
+            tlm = tm = multiply(translate(tx, ty), tlm)
+
+        for operands, operator in ContentStream(contents, self.reader).operations:
+            operator = operator.decode('latin-1') if isinstance(operator, bytes) else operator
+            if operator == 'Tj':
+                show(operands[0])
+            elif operator == 'TJ':
+                for item in operands[0]:
+                    if isinstance(item, numbers.Number):
+                        tm = multiply(translate(-float(item) / 1000 * state['size'] * state['th'], 0), tm)
+                    else:
+                        show(item)
+            elif operator == 'Td':
+                next_line(float(operands[0]), float(operands[1]))
+            elif operator == 'TD':
+                state['tl'] = -float(operands[1])
+                next_line(float(operands[0]), float(operands[1]))
+            elif operator == 'Tm':
+                tlm = tm = tuple(float(operand) for operand in operands)
+            elif operator == 'T*':
+                next_line(0, -state['tl'])
+            elif operator == "'":
+                next_line(0, -state['tl'])
+                show(operands[0])
+            elif operator == '"':
+                state['tw'], state['tc'] = float(operands[0]), float(operands[1])
+                next_line(0, -state['tl'])
+                show(operands[2])
+            elif operator == 'Tf':
+                state['font'] = self.font(get(fonts, operands[0]))
+                state['size'] = float(operands[1])
+            elif operator == 'Tc':
+                state['tc'] = float(operands[0])
+            elif operator == 'Tw':
+                state['tw'] = float(operands[0])
+            elif operator == 'Tz':
+                state['th'] = float(operands[0]) / 100
+            elif operator == 'TL':
+                state['tl'] = float(operands[0])
+            elif operator == 'Ts':
+                state['rise'] = float(operands[0])
+            elif operator == 'BT':
+                tm = tlm = IDENTITY
+            elif operator == 'q':
+                stack.append(dict(state))
+            elif operator == 'Q' and stack:
+                state = stack.pop()
+            elif operator == 'cm':
+                state['ctm'] = multiply(tuple(float(operand) for operand in operands), state['ctm'])
+            elif operator == 'Do':
+                xobject = get(xobjects, operands[0])
+                if xobject is not None and get(xobject, '/Subtype') == '/Form':
+                    matrix = tuple(float(n) for n in get(xobject, '/Matrix', IDENTITY))
+                    self.run(xobject, get(xobject, '/Resources', resources), multiply(matrix, state['ctm']))
+
+    def font(self, font):
+        if font is None:
+            return None
+        font = font.getObject()
+        if id(font) not in self.fonts:
+            self.fonts[id(font)] = Font(font)
+        return self.fonts[id(font)]
+
+    def text(self):
+        """
+        :return: the page's words, in raw order
+        """
+        self.end_word()
+        parts = []
+        for word, next in zip(self.words, self.words[1:] + [None]):
+            parts.append(''.join(word.text))
+            if next is not None and abs(next.base - word.base) < MAX_INTRA_LINE_DELTA * word.font_size \
+                    and next.x_min > word.x_max - MIN_DUP_BREAK_OVERLAP * word.font_size:
+                if next.x_min > word.x_max + MIN_WORD_SPACING * word.font_size:
+                    parts.append(' ')
+            else:
+                parts.append('\n')
+        return ''.join(parts)
+
+
+def pdf_to_text(data):
+    """
+    Extract the text of a PDF file, as pdftotext -raw does
+    :param data: the bytes of the PDF file
+    :return: text as string
+    """
+    reader = PdfFileReader(BytesIO(data), strict=False)
+    fonts = {}
+    pages = []
+    for i in range(reader.getNumPages()):
+        page = reader.getPage(i)
+        text = PageText(reader, fonts)
+        text.run(page.getContents(), get(page, '/Resources'))
+        pages.append(text.text() + '\f')
+    return ''.join(pages)
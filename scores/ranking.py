@@ -0,0 +1,109 @@
+from collections import defaultdict
+from .models import *
+from .bulk import bulk_update
+from .changes import UPDATE, log_changes
+
+# ContestantApp rank fields, ranked by tot_score, m, p and s respectively
+RANK_FIELDS = ['rank', 'rank_m', 'rank_p', 'rank_s']
+CATEGORY_RANK_FIELDS = RANK_FIELDS[1:]
+
+###############################################################
+# Rank helpers
+###############################################################
+
+
+def rank_with_ties(scores):
+    """
+    Rank a list of (id, score) pairs, highest score first, giving tied scores the same rank
+    (i.e. the equivalent of SQL RANK() OVER (ORDER BY score DESC))
+    :param scores: list of (id, score) tuples
+    :return: dict of id: rank
+    """
+    ranks = {}
+    rank, previous = 0, None
+    for position, (id, score) in enumerate(sorted(scores, key=lambda x: x[1], reverse=True), start=1):
+        if score != previous:
+            rank, previous = position, score
+        ranks[id] = rank
+    return ranks
+
+
+def partition(rows, key):
+    """
+    Group rows into partitions (i.e. the equivalent of SQL PARTITION BY)
+    :param rows: iterable of tuples
+    :param key: function that returns the partition key of a row
+    :return: dict of partition key: list of rows
+    """
+    partitions = defaultdict(list)
+    for row in rows:
+        partitions[key(row)].append(row)
+    return partitions
+
+
+###############################################################
+# Functions to (re)calculate ranks in the database
+###############################################################
+
+
+def add_missing_streams(contestantapps):
+    """
+    Create a Stream record for each contestant appearance in a contest that has a stream but no Stream records yet
+    :param contestantapps: ContestantApp queryset
+    :return: number of Stream records created
+    """
+    missing = contestantapps.filter(
+        contest__stream__isnull=False,
+        streamrank__isnull=True,
+    ).values_list('id', 'contest__stream')
+    streams = [Stream(contestantapp_id=id, stream=stream) for id, stream in missing]
+    Stream.objects.bulk_create(streams)
+    return len(streams)
+
+
+def calculate_ranks(contests=None, overall=False):
+    """
+    Recalculate the category and stream ranks (and optionally the overall rank) of every contestant in the given contests
+    The overall rank printed on the scoresheet is official (it can reflect tie-breaks and corrections that aren't in the
+    scores), so it is only recalculated when asked to, e.g. after merging contests. Stream ranks follow the overall rank.
+    :param contests: Contest queryset or list of contests, or None to recalculate the whole database
+    :param overall: whether to also recalculate the overall rank from the total score
+    :return: tuple (number of ContestantApps updated, number of Streams updated)
+    """
+    fields = RANK_FIELDS if overall else CATEGORY_RANK_FIELDS
+    contestantapps = ContestantApp.objects.all()
+    if contests is not None:
+        contestantapps = contestantapps.filter(contest__in=contests)
+    add_missing_streams(contestantapps)
+
+    # overall and category ranks, partitioned by contest
+    rows = list(contestantapps.values_list('id', 'contest_id', 'tot_score', 'm', 'p', 's', *RANK_FIELDS))
+    ranks = {key: {} for key in RANK_FIELDS}
+    for contest_rows in partition(rows, lambda row: row[1]).values():
+        for i, key in enumerate(RANK_FIELDS):
+            ranks[key].update(rank_with_ties([(row[0], row[2 + i]) for row in contest_rows]))
+    # only write back the rows that have changed
+    updates = []
+    for row in rows:
+        old = dict(zip(RANK_FIELDS, row[6:]))
+        new = tuple(ranks[key][row[0]] for key in fields)
+        if new != tuple(old[key] for key in fields):
+            updates.append((row[0],) + new)
+    n_contestantapps = bulk_update(ContestantApp, updates, fields)
+
+    # stream ranks, partitioned by contest and stream, in order of overall rank
+    rows = Stream.objects.filter(contestantapp__in=contestantapps).values_list(
+        'id', 'contestantapp__contest_id', 'stream', 'contestantapp__rank', 'rank', 'contestantapp_id')
+    updates = []
+    changed = set()
+    for stream_rows in partition(rows, lambda row: (row[1], row[2])).values():
+        stream_ranks = rank_with_ties([(row[0], -row[3]) for row in stream_rows])
+        for row in stream_rows:
+            if stream_ranks[row[0]] != row[4]:
+                updates.append((row[0], stream_ranks[row[0]]))
+                changed.add(row[5])
+    n_streams = bulk_update(Stream, updates, ['rank'])
+    # streams aren't logged themselves, but their ranks are shown as part of the appearance
+    log_changes(ContestantApp, sorted(changed), UPDATE)
+
+    return n_contestantapps, n_streams
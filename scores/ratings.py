@@ -0,0 +1,222 @@
+"""
+Elo ratings for contestants, for comparing quartets and choruses across years and associations.
+
+Each contest counts as a round robin: every contestant "plays" every other contestant in the contest, winning if they
+ranked higher, so a contestant's rating rises most when they beat higher rated contestants.
+Ratings belong to the canonical contestant, i.e. appearances under an alias count towards the name it's an alias of.
+"""
+
+from itertools import groupby
+from django.db import transaction
+from django.db.models import Q
+from .models import *
+from .changes import log_rebuild
+from .bulk import bulk_update
+
+INITIAL_RATING = 1500.0
+K_FACTOR = 32.0
+
+
+def expected_score(rating, opponent):
+    """
+    :return: the chance of beating an opponent, from 0 to 1
+    """
+    return 1 / (1 + 10 ** ((opponent - rating) / 400))
+
+
+def rate_contest(ratings, placings):
+    """
+    :param ratings: dict of contestant id: rating before the contest
+    :param placings: dict of contestant id: rank in the contest
+    :return: dict of contestant id: rating after the contest
+    """
+    n = len(placings)
+    after = {}
+    for contestant, rank in placings.items():
+        if n < 2:
+            after[contestant] = ratings[contestant]
+            continue
+        total = 0
+        for opponent, opponent_rank in placings.items():
+            if opponent != contestant:
+                actual = 1 if rank < opponent_rank else 0.5 if rank == opponent_rank else 0
+                total += actual - expected_score(ratings[contestant], ratings[opponent])
+        after[contestant] = ratings[contestant] + K_FACTOR * total / (n - 1)
+    return after
+
+
+def replay(rows, ratings):
+    """
+    Play through contests in order, updating the ratings
+    :param rows: iterable of (contestantapp id, contest id, contest date, canonical contestant id, rank),
+        ordered by contest date and contest id
+    :param ratings: dict of contestant id: [rating, number of contests, date of last contest], updated in place
+    :return: list of (contestantapp id, contestant id, contest date, rating before, rating after)
+    """
+    history = []
+    for contest_id, contest_rows in groupby(rows, lambda row: row[1]):
+        contest_rows = list(contest_rows)
+        # a contestant may appear twice under different aliases; their best rank counts
+        placings = {}
+        for row in contest_rows:
+            placings[row[3]] = min(row[4], placings.get(row[3], row[4]))
+        before = {c: ratings[c][0] if c in ratings else INITIAL_RATING for c in placings}
+        after = rate_contest(before, placings)
+        date = contest_rows[0][2]
+        for c in placings:
+            contests = ratings[c][1] if c in ratings else 0
+            ratings[c] = [after[c], contests + 1, date]
+        history.extend((row[0], row[3], date, before[row[3]], after[row[3]]) for row in contest_rows)
+    return history
+
+
+def canonical_ids(ids=None, model=Contestant):
+    """
+    Follow aliases to the canonical contestants (or people, or songs)
+    :param ids: contestant ids, or None for every contestant
+    :param model: Contestant, Person or Song
+    :return: dict of contestant id: canonical contestant id
+    """
+    aliases = model.objects.all() if ids is None else model.objects.filter(id__in=ids)
+    alias_of = dict(aliases.values_list('id', 'alias_of_id'))
+    # fetch the rest of each alias chain a link at a time (for ids=None they're all here already)
+    missing = {a for a in alias_of.values() if a and a not in alias_of}
+    while missing:
+        alias_of.update(model.objects.filter(id__in=missing).values_list('id', 'alias_of_id'))
+        missing = {a for a in alias_of.values() if a and a not in alias_of}
+    canonical = {}
+    for id in alias_of:
+        c, seen = id, set()
+        while alias_of.get(c) and c not in seen:
+            seen.add(c)
+            c = alias_of[c]
+        canonical[id] = c
+    return canonical
+
+
+def appearance_rows(contestantapps, canonical):
+    rows = contestantapps.order_by('contest_date', 'contest_id').values_list(
+        'id', 'contest_id', 'contest_date', 'contestant_id', 'rank')
+    return [(id, contest_id, date, canonical[contestant], rank) for id, contest_id, date, contestant, rank in rows]
+
+
+###############################################################
+# Functions to (re)calculate ratings in the database
+###############################################################
+
+
+def rebuild_ratings():
+    """
+    Recalculate every rating from scratch, replaying every contest in date order in memory
+    :return: tuple (number of contestants rated, number of appearances)
+    """
+    ratings = {}
+    history = replay(appearance_rows(ContestantApp.objects.exclude(contest_date=None), canonical_ids()), ratings)
+    with transaction.atomic():
+        RatingHistory.objects.all().delete()
+        Rating.objects.all().delete()
+        save_ratings(ratings, history, {})
+        log_rebuild()
+    return len(ratings), len(history)
+
+
+def update_ratings(contest):
+    """
+    Update the ratings of the contestants in a newly imported contest.
+    If there are later contests already rated, the ratings from those that this one changes are replayed too.
+    :param contest: Contest object
+    """
+    contestantapps = ContestantApp.objects.filter(contest=contest, ratinghistory__isnull=True)
+    contestant_ids = list(contestantapps.values_list('contestant_id', flat=True))
+    if not contestant_ids:
+        return
+    canonical = canonical_ids(contestant_ids)
+    later = RatingHistory.objects.filter(
+        Q(contest_date__gt=contest.date) | Q(contest_date=contest.date, contestantapp__contest_id__gt=contest.id))
+    with transaction.atomic():
+        # lock the ratings, so that parallel imports don't overwrite each other's updates
+        # (select_for_update() does nothing on SQLite, which only allows one writer at a time anyway)
+        existing = {r.contestant_id: r for r in
+                    Rating.objects.select_for_update().filter(contestant_id__in=set(canonical.values()))}
+        if later.exists():
+            replay_later(contest, appearance_rows(contestantapps, canonical), later, existing)
+            return
+        ratings = {c: [r.rating, r.contests, r.last_date] for c, r in existing.items()}
+        history = replay(appearance_rows(contestantapps, canonical), ratings)
+        save_ratings(ratings, history, existing)
+
+
+def replay_later(contest, rows, later, existing):
+    """
+    Rate a contest that's dated before some contests already rated, and then replay, in order, the later contests
+    that include a contestant whose rating that changes. Their ratings change too, so the contests after that which
+    include them are replayed, and so on; a later contest with none of them plays out as it did before.
+    :param contest: Contest object
+    :param rows: the contest's appearance rows (see appearance_rows())
+    :param later: RatingHistory queryset of the contests after it
+    :param existing: dict of contestant id: Rating object already in the database, for the contest's contestants
+    """
+    placed = {row[3] for row in rows}
+    # each contestant's rating just before the contest, from their last appearance before it
+    before = {}
+    earlier = RatingHistory.objects.filter(contestant_id__in=placed).filter(
+        Q(contest_date__lt=contest.date) | Q(contest_date=contest.date, contestantapp__contest_id__lt=contest.id))
+    for c, after in earlier.order_by('contest_date', 'contestantapp__contest_id').values_list('contestant_id', 'after'):
+        before[c] = after
+    ratings = {c: [before.get(c, INITIAL_RATING), 0, None] for c in placed}
+    history = replay(rows, ratings)
+
+    # (contestantapp id, contest id, contestant id, rating before, rank) of every later appearance, in order
+    later_rows = later.order_by('contest_date', 'contestantapp__contest_id').values_list(
+        'contestantapp_id', 'contestantapp__contest_id', 'contestant_id', 'before', 'contestantapp__rank')
+    changed = {}
+    for contest_id, contest_rows in groupby(later_rows, lambda row: row[1]):
+        contest_rows = list(contest_rows)
+        if not any(row[2] in ratings for row in contest_rows):
+            continue
+        # the others come in with the same rating as before
+        start = {row[2]: ratings[row[2]][0] if row[2] in ratings else row[3] for row in contest_rows}
+        placings = {}
+        for row in contest_rows:
+            placings[row[2]] = min(row[4], placings.get(row[2], row[4]))
+        after = rate_contest(start, placings)
+        for c in placings:
+            ratings[c] = [after[c], 0, None]
+        changed.update((row[0], (start[row[2]], after[row[2]])) for row in contest_rows)
+
+    RatingHistory.objects.bulk_create([
+        RatingHistory(contestantapp_id=app, contestant_id=c, contest_date=date, before=before, after=after)
+        for app, c, date, before, after in history
+    ], batch_size=500)
+    bulk_update(RatingHistory, [(app, before, after) for app, (before, after) in changed.items()], ['before', 'after'])
+
+    # only the contest's own contestants have another contest to count
+    others = Rating.objects.select_for_update().filter(contestant_id__in=set(ratings) - placed)
+    updates = []
+    for r in list(existing.values()) + list(others):
+        if r.contestant_id in placed:
+            updates.append((r.contestant_id, ratings[r.contestant_id][0], r.contests + 1,
+                            max(r.last_date, contest.date)))
+        else:
+            updates.append((r.contestant_id, ratings[r.contestant_id][0], r.contests, r.last_date))
+    bulk_update(Rating, updates, ['rating', 'contests', 'last_date'])
+    Rating.objects.bulk_create([Rating(contestant_id=c, rating=ratings[c][0], contests=1, last_date=contest.date)
+                                for c in placed if c not in existing], batch_size=500)
+
+
+def save_ratings(ratings, history, existing):
+    """
+    :param ratings: dict of contestant id: [rating, number of contests, date of last contest]
+    :param history: list of (contestantapp id, contestant id, contest date, rating before, rating after)
+    :param existing: dict of contestant id: Rating object already in the database
+    """
+    RatingHistory.objects.bulk_create([
+        RatingHistory(contestantapp_id=app, contestant_id=c, contest_date=date, before=before, after=after)
+        for app, c, date, before, after in history
+    ], batch_size=500)
+    bulk_update(Rating, [(c, rating, contests, last_date) for c, (rating, contests, last_date) in ratings.items()
+                         if c in existing], ['rating', 'contests', 'last_date'])
+    Rating.objects.bulk_create([
+        Rating(contestant_id=c, rating=rating, contests=contests, last_date=last_date)
+        for c, (rating, contests, last_date) in ratings.items() if c not in existing
+    ], batch_size=500)
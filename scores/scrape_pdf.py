@@ -1,37 +1,77 @@
 from datetime import datetime
 from bs4 import BeautifulSoup
-from urllib.request import urlopen, urlretrieve
+from urllib.request import urlopen
 from urllib.parse import urlparse, urljoin
 import re
+from django.conf import settings
 from django.http import HttpResponseRedirect, HttpResponse
-from PyPDF2 import PdfFileWriter, PdfFileReader
-import re, string, csv, unicodedata, os, json, subprocess, pprint
+import re, string, csv, unicodedata, os, json, subprocess, pprint, tempfile
+from .instrumentation import stage, timed
+from .pdf_text import pdf_to_text
 
 ###############################################################
 # PDF Handling Functions
 ###############################################################
 
 
-def pdftotext(url):
+def fetch_pdf(url):
+    """
+    Read a PDF file
+    :param url: url of pdf file, or the path of a local file
+    :return: the bytes of the file
+    """
+    with stage('fetch'):
+        if urlparse(url).scheme in ('http', 'https', 'ftp', 'file'):
+            with urlopen(url) as f:
+                return f.read()
+        with open(url, 'rb') as f:
+            return f.read()
+
+
+def pdftotext_subprocess(data):
+    """
+    Convert PDF file to text by running pdftotext -raw (from xpdf or poppler), found at settings.SCORES_PDFTOTEXT
+    :param data: the bytes of the pdf file
+    :return: text as string
+    """
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        f.write(data)
+    try:
+        result = subprocess.run(
+            [getattr(settings, 'SCORES_PDFTOTEXT', 'pdftotext'), '-raw', '-enc', 'UTF-8', '-eol', 'unix', f.name, '-'],
+            stdout=subprocess.PIPE, check=True,
+        )
+    finally:
+        os.unlink(f.name)
+    return result.stdout.decode('utf-8')
+
+
+# ways of converting a pdf file to text, which give the same text; settings.SCORES_PDF_BACKEND chooses one
+PDF_BACKENDS = {
+    'python': pdf_to_text,
+    'pdftotext': pdftotext_subprocess,
+}
+
+
+def pdf_data_to_text(data, backend=None):
+    """
+    Convert PDF file to text
+    :param data: the bytes of the pdf file
+    :param backend: key of PDF_BACKENDS, or None for settings.SCORES_PDF_BACKEND
+    :return: text as string
+    """
+    with stage('pdftotext'):
+        return PDF_BACKENDS[backend or getattr(settings, 'SCORES_PDF_BACKEND', 'pdftotext')](data)
+
+
+def pdftotext(url, backend=None):
     """
     Convert PDF file to text
     :param url: url of pdf file
+    :param backend: key of PDF_BACKENDS, or None for settings.SCORES_PDF_BACKEND
     :return: text as string
     """
-    PDFTOTEXT = r'C:\Program Files\Xpdf\bin64\pdftotext.exe'
-    # download the pdf file
-    filename, headers = urlretrieve(url)
-    textfilename = filename + ".txt"
-    # convert the pdf file to a text file
-    subprocess.run([PDFTOTEXT, '-raw', filename, textfilename])
-    # read the text file
-    with open(textfilename) as f:
-        text = f.read()
-    # clean up
-    os.unlink(textfilename)
-    os.unlink(filename)         # NB if URL points to a local file, it will be deleted!!!
-    # return the text
-    return text
+    return pdf_data_to_text(fetch_pdf(url), backend)
 
 
 ###############################################################
@@ -195,6 +235,12 @@ def get_contest_dict_from_url(url):
     # extract the text from the pdf
     text = pdftotext(url)
 
+    # parse it
+    return parse_contest_text(text, url)
+
+
+@timed('parse')
+def parse_contest_text(text, url):
     # parse text to extract contest
     contest = get_contest_details(text)
 
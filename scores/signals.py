@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import *
+from .changes import CHANGE_MODELS, INSERT, UPDATE, DELETE, log_changes
+
+###############################################################
+# Keep the copies of contest attributes on ContestantApp and SongApp up to date
+###############################################################
+
+
+@receiver(pre_save, sender=ContestantApp)
+def contestantapp_copy_contest_attributes(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.copy_contest_attributes(instance.contest)
+
+
+@receiver(pre_save, sender=SongApp)
+def songapp_copy_contest_attributes(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.copy_contest_attributes(instance.contestantapp)
+
+
+@receiver(post_save, sender=ContestantApp)
+def contestantapp_update_attributes(sender, instance, created, raw=False, **kwargs):
+    # the appearance may have been moved to another contest
+    if created or raw:
+        return
+    songapps = SongApp.objects.filter(contestantapp=instance)
+    songapps.update(**{'contest_' + field: getattr(instance, 'contest_' + field) for field in CONTEST_ATTRIBUTES})
+    log_changes(SongApp, songapps.values_list('pk', flat=True), UPDATE)
+
+
+@receiver(post_save, sender=Contest)
+def contest_update_attributes(sender, instance, created, raw=False, **kwargs):
+    # a new contest doesn't have any appearances yet
+    if created or raw:
+        return
+    attributes = {'contest_' + field: getattr(instance, field) for field in CONTEST_ATTRIBUTES}
+    for appearances in (ContestantApp.objects.filter(contest=instance),
+                        SongApp.objects.filter(contestantapp__contest=instance)):
+        appearances.update(**attributes)
+        log_changes(appearances.model, appearances.values_list('pk', flat=True), UPDATE)
+
+
+###############################################################
+# Change log
+###############################################################
+
+
+@receiver(post_save, sender=ContestRawText)
+@receiver(post_delete, sender=ContestRawText)
+def raw_text_changed(sender, instance, **kwargs):
+    # the scoresheet text isn't logged itself, but it's shown as part of its contest
+    log_changes(Contest, [instance.contest_id], UPDATE)
+
+
+def log_save(sender, instance, created, **kwargs):
+    log_changes(sender, [instance.pk], INSERT if created else UPDATE)
+
+
+def log_delete(sender, instance, **kwargs):
+    log_changes(sender, [instance.pk], DELETE)
+
+
+for model in CHANGE_MODELS:
+    post_save.connect(log_save, sender=model, dispatch_uid='log_save_%s' % model._meta.model_name)
+    post_delete.connect(log_delete, sender=model, dispatch_uid='log_delete_%s' % model._meta.model_name)
+
+
+###############################################################
+# SQLite connection settings
+###############################################################
+
+
+@receiver(connection_created)
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Apply SCORES_SQLITE_PRAGMAS to every new SQLite connection.
+    journal_mode=WAL lets pages be read while a contest is being imported, instead of readers and the writer
+    locking each other out.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SCORES_SQLITE_PRAGMAS', {}).items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
@@ -0,0 +1,80 @@
+from django.db.models import Q
+from django.db.models.signals import post_init
+from autoslug import AutoSlugField
+from autoslug.utils import crop_slug
+
+# number of names to check for collisions in each query (SQLite limits the depth of an expression)
+SLUG_QUERY_BATCH = 200
+
+# room left at the end of a cropped slug for the separator and index, e.g. "-12"
+INDEX_ROOM = 4
+
+
+class NameSlugField(AutoSlugField):
+    """
+    AutoSlugField that keeps a slug it already has, unless the field it's populated from has changed.
+    AutoSlugField(always_update=True) looks for a free slug every time an object is saved, e.g. when PersonUpdate only
+    changes alias_of, and bulk_create() has to do the same for every object. This field only does that when the name
+    has changed since the object was loaded, or when it has no slug yet (see allocate_slugs()).
+    """
+    def contribute_to_class(self, cls, name, **kwargs):
+        super(NameSlugField, self).contribute_to_class(cls, name, **kwargs)
+        if not cls._meta.abstract:
+            post_init.connect(self.remember_source, sender=cls, weak=False)
+
+    def source_key(self):
+        return '_%s_source' % self.name
+
+    def remember_source(self, instance, **kwargs):
+        # read __dict__ directly, so that a deferred name isn't loaded
+        instance.__dict__[self.source_key()] = instance.__dict__.get(self.populate_from)
+
+    def pre_save(self, instance, add):
+        slug = getattr(instance, self.attname)
+        source = instance.__dict__.get(self.populate_from)
+        if slug and source == instance.__dict__.get(self.source_key()):
+            return slug
+        slug = super(NameSlugField, self).pre_save(instance, add)
+        instance.__dict__[self.source_key()] = source
+        return slug
+
+
+def base_slug(field, name):
+    """
+    The slug that AutoSlugField would try first
+    """
+    return crop_slug(field, field.slugify(name) or field.model._meta.model_name)
+
+
+def allocate_slugs(model, names, field_name='slug'):
+    """
+    Choose unique slugs for a batch of new objects, in the way AutoSlugField would (name, name-2, name-3...),
+    but with one query per SLUG_QUERY_BATCH names instead of one or more per object
+    :param model: Person, Contestant or Song
+    :param names: list of names
+    :param field_name: the slug field
+    :return: list of slugs, in the same order as the names
+    """
+    field = model._meta.get_field(field_name)
+    bases = [base_slug(field, name) for name in names]
+
+    # fetch every existing slug that could collide: the base slug, or the base slug with an index on the end
+    prefixes = sorted({base[:field.max_length - INDEX_ROOM] for base in bases})
+    taken = set()
+    for i in range(0, len(prefixes), SLUG_QUERY_BATCH):
+        query = Q()
+        for prefix in prefixes[i:i + SLUG_QUERY_BATCH]:
+            query |= Q(**{field_name + '__startswith': prefix})
+        taken.update(model._default_manager.filter(query).values_list(field_name, flat=True))
+
+    # then find free slugs in memory, remembering the ones given out so far in this batch
+    slugs = []
+    for base in bases:
+        slug, index = base, 1
+        while slug in taken:
+            index += 1
+            tail = '%s%d' % (field.index_sep, index)
+            slug = base[:field.max_length - len(tail)] + tail
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
@@ -0,0 +1,130 @@
+"""
+Compact binary snapshot format for parsed contest dicts.
+
+A snapshot file is a header followed by one record per contest, so contests can be written and read one at a time:
+    header:  MAGIC (6 bytes) + format version (1 byte)
+    record:  length of the payload (4 bytes, big-endian) + payload (zlib compressed compact JSON of one contest dict)
+"""
+
+import datetime, decimal, json, struct, zlib
+
+MAGIC = b'BSSNAP'
+VERSION = 1
+
+HEADER = struct.Struct('>6sB')
+RECORD_LENGTH = struct.Struct('>I')
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class SnapshotEncoder(json.JSONEncoder):
+    """
+    Like DecimalEncoder, but also writes dates in the dd/mm/yyyy format that prepare_for_import() reads
+    """
+    def default(self, o):
+        if isinstance(o, decimal.Decimal):
+            return float(o)
+        if isinstance(o, (datetime.date, datetime.datetime)):
+            return o.strftime('%d/%m/%Y')
+        return super(SnapshotEncoder, self).default(o)
+
+
+######################################################################
+### WRITING
+######################################################################
+
+class SnapshotWriter:
+    """
+    Writes contest dicts to a snapshot file one at a time, e.g.
+        with SnapshotWriter(open('contests.bss', 'wb')) as writer:
+            for contest in txt_to_dicts(dir):
+                writer.write(contest)
+    """
+    def __init__(self, fileobj, level=6):
+        self.fileobj = fileobj
+        self.level = level
+        self.count = 0
+        self.fileobj.write(HEADER.pack(MAGIC, VERSION))
+
+    def write(self, contest):
+        payload = zlib.compress(
+            json.dumps(contest, separators=(',', ':'), cls=SnapshotEncoder).encode('utf-8'),
+            self.level,
+        )
+        self.fileobj.write(RECORD_LENGTH.pack(len(payload)))
+        self.fileobj.write(payload)
+        self.count += 1
+
+    def close(self):
+        self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_snapshot(filename, contests):
+    """
+    Write an iterable of contest dicts to a snapshot file
+    :param filename:
+    :param contests: iterable of contest dicts
+    :return: number of contests written
+    """
+    with SnapshotWriter(open(filename, 'wb')) as writer:
+        for contest in contests:
+            writer.write(contest)
+    return writer.count
+
+
+######################################################################
+### READING
+######################################################################
+
+def read_exactly(fileobj, size):
+    """
+    Read exactly size bytes from a file, or raise SnapshotError if the file ends first
+    """
+    data = fileobj.read(size)
+    while len(data) < size:
+        more = fileobj.read(size - len(data))
+        if not more:
+            raise SnapshotError('snapshot is truncated')
+        data += more
+    return data
+
+
+def is_snapshot(fileobj):
+    """
+    Check whether a file is a snapshot, without moving the file position
+    :param fileobj: seekable binary file object
+    :return: True or False
+    """
+    position = fileobj.tell()
+    magic = fileobj.read(len(MAGIC))
+    fileobj.seek(position)
+    return magic == MAGIC
+
+
+def read_snapshot(fileobj):
+    """
+    Read contest dicts from a snapshot file one at a time
+    :param fileobj: binary file object, positioned at the start of the snapshot
+    :return: generator of contest dicts
+    """
+    magic, version = HEADER.unpack(read_exactly(fileobj, HEADER.size))
+    if magic != MAGIC:
+        raise SnapshotError('not a snapshot file')
+    if version != VERSION:
+        raise SnapshotError('unsupported snapshot version %s' % version)
+    while True:
+        length = fileobj.read(RECORD_LENGTH.size)
+        if not length:
+            return
+        if len(length) < RECORD_LENGTH.size:
+            length += read_exactly(fileobj, RECORD_LENGTH.size - len(length))
+        payload = read_exactly(fileobj, RECORD_LENGTH.unpack(length)[0])
+        yield json.loads(zlib.decompress(payload).decode('utf-8'))
@@ -0,0 +1,330 @@
+"""
+A static copy of the public results pages, for serving from any static file server: every contest, contestant,
+person and song page, and the list pages, are rendered to <output>/<url>/index.html, with the static files they use.
+
+The build keeps a manifest of the pages it wrote, and of the contests and (assoc, type, stream, year) groups each one
+shows, with the change log seq it was built at. Rebuilding reads the change log since then, and re-renders only:
+- the pages showing a contest that has changed, or showing percentiles in a group with a changed contest
+- the pages of new, renamed or otherwise changed names, and the pages showing the contests they're in (a name doesn't
+  change any percentiles, so their groups aren't rebuilt)
+- every contestant page, if a contest was added before the latest one, as that changes the ratings after it
+- the list pages
+- every page showing a contest, if derived data (ratings, ranks, percentiles...) has been rebuilt from scratch
+and deletes the pages of objects that no longer exist. Pages are rendered by a pool of processes.
+
+Only what the pages show by default is built: a static server ignores query strings, so the contest page's scoresheet
+text and the contestant page's chart data are built as pages of their own, but ?table=1 tables are not.
+"""
+
+import json, logging, os, shutil
+from collections import defaultdict, namedtuple
+from multiprocessing import Pool
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.staticfiles import finders
+from django.db import connections
+from django.db.models import Max
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from .models import *
+from .distributions import group_key
+from .changes import REBUILD, changes_since
+
+logger = logging.getLogger(__name__)
+
+# the file in the output directory that records what was built
+MANIFEST = '.build_manifest.json'
+
+# change log entries read at a time
+CHANGES_BATCH = 5000
+
+# pages rendered by a worker process at a time
+CHUNK_SIZE = 50
+
+LIST_PAGES = ('contest_list', 'contestant_list', 'person_list', 'song_list', 'judge_list', 'leaderboard_list')
+
+# a page's urls (each rendered to <url>/index.html), and the contests and groups it shows
+Page = namedtuple('Page', ('urls', 'contests', 'groups'))
+
+
+def group_name(key):
+    return '|'.join(str(part) for part in key)
+
+
+###############################################################
+# What to build
+###############################################################
+
+
+def site_pages():
+    """
+    Every page of the site, with what it depends on, read with one query per table
+    :return: dict of page key, e.g. 'contest:12': Page
+    """
+    contests = {id: (date, group_name(group_key(assoc, type, stream, date)))
+                for id, assoc, type, stream, date
+                in Contest.objects.values_list('id', 'assoc', 'type', 'stream', 'date')}
+    raw_texts = set(ContestRawText.objects.values_list('contest_id', flat=True))
+
+    pages = {}
+    for id, (date, group) in contests.items():
+        urls = [reverse('scores:contest_detail', args=[id])]
+        if id in raw_texts:
+            urls.append(reverse('scores:contest_raw_text', args=[id]))
+        pages['contest:%s' % id] = Page(urls, {id}, {group})
+
+    def add_pages(model, appearances, url_names, grouped=None):
+        """
+        :param appearances: iterable of (object id, contest id)
+        :param url_names: the urls of each object's pages, with the query string to render them with
+        :param grouped: iterable of (object id, contest id) whose percentiles the page shows
+        """
+        shown = defaultdict(set)
+        for id, contest in appearances:
+            shown[id].add(contest)
+        groups = defaultdict(set)
+        for id, contest in grouped or ():
+            groups[id].add(contests[contest][1])
+        for id, slug in model.objects.values_list('id', 'slug'):
+            pages['%s:%s' % (model._meta.model_name, id)] = Page(
+                [reverse(name, args=[slug]) + query for name, query in url_names], shown[id], groups[id])
+
+    # the contestant page lists no scores, just a chart of its history, and the rating at the end of it
+    add_pages(Contestant, ContestantApp.objects.values_list('contestant_id', 'contest_id'),
+              [('scores:contestant_detail', ''), ('scores:contestant_history_api', '?points=200')])
+    members = list(Member.objects.values_list('person_id', 'contestantapp__contest_id'))
+    add_pages(Person, members + list(Judge.objects.values_list('person_id', 'contest_id')),
+              [('scores:person_detail', '')], members)
+    sung = list(SongApp.objects.values_list('song_id', 'contestantapp__contest_id'))
+    add_pages(Song, sung, [('scores:song_detail', '')], sung)
+
+    for name in LIST_PAGES:
+        pages['list:%s' % name] = Page([reverse('scores:%s' % name)], set(), set())
+    return pages
+
+
+def changed_since(seq, until, manifest_pages):
+    """
+    :param seq: the change log seq of the last build
+    :param until: the seq to read changes up to, which the pages were read at or after
+    :param manifest_pages: dict of page key: Page from the last build, for what deleted contests showed
+    :return: tuple (set of changed contest ids, set of ids of contests showing changed names, set of groups of
+        changed contests, set of changed page keys)
+    """
+    ids = defaultdict(set)
+    while True:
+        entries = changes_since(seq, CHANGES_BATCH, until=until)
+        for entry in entries:
+            ids[entry.model].add(entry.object_id)
+        if len(entries) < CHANGES_BATCH:
+            break
+        seq = entries[-1].seq
+
+    contests = set(ids['contest'])
+    if ids[REBUILD]:
+        # derived data may have changed anywhere
+        contests |= set(Contest.objects.values_list('id', flat=True))
+    contests |= set(ContestantApp.objects.filter(id__in=ids['contestantapp']).values_list('contest_id', flat=True))
+    contests |= set(SongApp.objects.filter(id__in=ids['songapp']).values_list(
+        'contestantapp__contest_id', flat=True))
+    contests |= set(Member.objects.filter(id__in=ids['member']).values_list(
+        'contestantapp__contest_id', flat=True))
+    contests |= set(Judge.objects.filter(id__in=ids['judge']).values_list('contest_id', flat=True))
+
+    # a changed name changes its own page, and every contest it's shown in
+    keys = set()
+    named = set()
+    for model, appearances in (
+            (Contestant, ContestantApp.objects.filter(contestant__in=ids['contestant']).values_list('contest_id')),
+            (Person, Member.objects.filter(person__in=ids['person']).values_list('contestantapp__contest_id')),
+            (Person, Judge.objects.filter(person__in=ids['person']).values_list('contest_id')),
+            (Song, SongApp.objects.filter(song__in=ids['song']).values_list('contestantapp__contest_id'))):
+        name = model._meta.model_name
+        keys |= {'%s:%s' % (name, id) for id in ids[name]}
+        named |= {contest for contest, in appearances}
+
+    groups = set()
+    for contest in contests:
+        # the group of a deleted contest is only in the last manifest
+        page = manifest_pages.get('contest:%s' % contest)
+        if page:
+            groups |= page.groups
+    groups |= {group_name(group_key(*row)) for row in Contest.objects.filter(id__in=contests).values_list(
+        'assoc', 'type', 'stream', 'date')}
+    return contests, named, groups, keys
+
+
+###############################################################
+# Rendering
+###############################################################
+
+
+def page_path(output, url):
+    """
+    :return: the file a url is written to, ignoring its query string
+    """
+    return os.path.join(output, url.split('?')[0].lstrip('/'), 'index.html')
+
+
+def remove_page(output, url):
+    """
+    Delete a url's file, and the directories that leaves empty
+    """
+    filename = page_path(output, url)
+    if os.path.exists(filename):
+        os.remove(filename)
+    directory = os.path.dirname(filename)
+    while os.path.abspath(directory) != os.path.abspath(output) and os.path.isdir(directory) \
+            and not os.listdir(directory):
+        os.rmdir(directory)
+        directory = os.path.dirname(directory)
+
+
+def render_pages(args):
+    """
+    Render some urls to files, in a worker process
+    :param args: tuple (output directory, list of urls)
+    :return: list of (url, error) for the urls that couldn't be rendered
+    """
+    output, urls = args
+    factory = RequestFactory()
+    errors = []
+    for url in urls:
+        path, _, query = url.partition('?')
+        request = factory.get(url)
+        request.user = AnonymousUser()
+        match = resolve(path)
+        try:
+            response = match.func(request, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        except Exception as e:
+            logger.exception("error rendering %s", url)
+            errors.append((url, repr(e)))
+            continue
+        if response.status_code != 200:
+            errors.append((url, 'status %s' % response.status_code))
+            continue
+        filename = page_path(output, url)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'wb') as f:
+            f.write(response.content)
+    return errors
+
+
+def render_all(output, urls, processes):
+    """
+    Render urls, split between processes
+    :return: list of (url, error)
+    """
+    chunks = [(output, urls[i:i + CHUNK_SIZE]) for i in range(0, len(urls), CHUNK_SIZE)]
+    if processes <= 1 or len(chunks) <= 1:
+        return [error for chunk in chunks for error in render_pages(chunk)]
+    # each worker opens its own database connection, rather than sharing this process's
+    connections.close_all()
+    with Pool(processes) as pool:
+        return [error for errors in pool.imap_unordered(render_pages, chunks) for error in errors]
+
+
+def copy_static_files(output):
+    """
+    Copy the files the static files finders find to where STATIC_URL points
+    :return: the number of files copied
+    """
+    root = os.path.join(output, settings.STATIC_URL.strip('/'))
+    n = 0
+    for finder in finders.get_finders():
+        for path, storage in finder.list([]):
+            target = os.path.join(root, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(storage.path(path), target)
+            n += 1
+    return n
+
+
+###############################################################
+# Building
+###############################################################
+
+
+def read_manifest(output):
+    """
+    :return: dict with the seq, latest contest date and pages of the last build, or None if there wasn't one
+    """
+    try:
+        with open(os.path.join(output, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return None
+    manifest['pages'] = {key: Page(urls, set(contests), set(groups))
+                         for key, (urls, contests, groups) in manifest['pages'].items()}
+    return manifest
+
+
+def write_manifest(output, seq, last_date, pages):
+    filename = os.path.join(output, MANIFEST)
+    with open(filename + '.tmp', 'w') as f:
+        json.dump({
+            'seq': seq,
+            'last_date': last_date,
+            'pages': {key: (page.urls, sorted(page.contests), sorted(page.groups)) for key, page in pages.items()},
+        }, f)
+    os.replace(filename + '.tmp', filename)
+
+
+def build_site(output, processes=1, full=False):
+    """
+    Build the site, or bring the last build up to date
+    :param output: the output directory
+    :param processes: the number of processes to render with
+    :param full: rebuild every page, even if there's a build to update
+    :return: tuple (dict of counts: pages, rendered, deleted files, static files, and the seq built at;
+        list of (url, error) for the pages that couldn't be rendered, in which case the manifest isn't updated)
+    """
+    manifest = None if full else read_manifest(output)
+    # read before the pages, so that changes made while building are in the pages, or after the seq built at
+    seq = ChangeLogEntry.objects.aggregate(seq=Max('seq'))['seq'] or 0
+    last_date = Contest.objects.aggregate(date=Max('date'))['date']
+    last_date = last_date and last_date.isoformat()
+    pages = site_pages()
+
+    if manifest is None:
+        dirty = set(pages)
+        old_pages = {}
+    else:
+        old_pages = manifest['pages']
+        contests, named, groups, keys = changed_since(manifest['seq'], seq, old_pages)
+        shown = contests | named
+        dirty = {key for key, page in pages.items() if key not in old_pages or page.urls != old_pages[key].urls
+                 or page.contests & shown or page.groups & groups}
+        # a page showing a deleted contest only depends on it in the last manifest
+        dirty |= {key for key, page in old_pages.items() if page.contests & shown or page.groups & groups}
+        dirty = (dirty | keys) & set(pages)
+        if dirty or seq != manifest['seq']:
+            dirty |= {key for key in pages if key.startswith('list:')}
+        # ratings are calculated in date order, so a contest before the last one changes the ratings after it
+        dates = Contest.objects.filter(id__in=contests).values_list('date', flat=True)
+        if manifest['last_date'] and any(date.isoformat() < manifest['last_date'] for date in dates):
+            dirty |= {key for key in pages if key.startswith('contestant:')}
+
+    # remove the files of deleted pages, and of urls that pages no longer have, e.g. after a rename
+    stale = set()
+    for key, page in old_pages.items():
+        stale |= set(page.urls) - set(pages[key].urls if key in pages else ())
+    for url in stale:
+        remove_page(output, url)
+
+    urls = sorted(url for key in dirty for url in pages[key].urls)
+    logger.info("rendering %s pages (%s urls) of %s", len(dirty), len(urls), len(pages))
+    os.makedirs(output, exist_ok=True)
+    errors = render_all(output, urls, processes)
+    n_static = copy_static_files(output)
+    if not errors:
+        write_manifest(output, seq, last_date, pages)
+    return {
+        'pages': len(pages),
+        'rendered': len(dirty),
+        'deleted': len(stale),
+        'static': n_static,
+        'seq': seq,
+    }, errors
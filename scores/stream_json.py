@@ -0,0 +1,72 @@
+import codecs, json, re
+from .snapshot import is_snapshot, read_snapshot
+
+# whitespace between values, plus commas between the values of a top-level array
+WHITESPACE = re.compile(r'\s*')
+ARRAY_SEPARATORS = re.compile(r'[\s,]*')
+
+
+###############################################################
+# Incremental JSON parsing
+###############################################################
+
+
+def iter_json_values(chunks):
+    """
+    Parse a stream of JSON one top-level value at a time, without loading the whole stream into memory.
+    Accepts a single value, a top-level array (each item is yielded in turn), or JSON Lines / concatenated values.
+    :param chunks: iterable of bytes, e.g. UploadedFile.chunks()
+    :return: generator of parsed values
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8-sig')()
+    chunks = iter(chunks)
+    buffer, pos, eof = '', 0, False
+    in_array = None     # None until we've seen the first non-whitespace character
+
+    while True:
+        # skip to the start of the next value
+        pos = (ARRAY_SEPARATORS if in_array else WHITESPACE).match(buffer, pos).end()
+        end = None
+        if pos < len(buffer):
+            # decide whether this is a top-level array
+            if in_array is None:
+                in_array = buffer[pos] == '['
+                if in_array:
+                    pos += 1
+                    continue
+            if in_array and buffer[pos] == ']':
+                return
+            # try to parse a complete value
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if eof:
+                    raise
+        elif eof:
+            return
+
+        # read the next chunk if the value is incomplete, or if it runs to the end of the buffer (it might continue)
+        if end is None or (end == len(buffer) and not eof):
+            chunk = next(chunks, None)
+            eof = chunk is None
+            buffer, pos = buffer[pos:] + utf8.decode(chunk or b'', final=eof), 0
+            continue
+
+        yield value
+        pos = end
+
+
+def read_contests(fileobj):
+    """
+    Read contest dicts one at a time from a snapshot file, or from a json file containing a contest, a list of
+    contests, or one contest per line (JSON Lines). Always starts from the beginning of the file, so it can be read twice.
+    :param fileobj: seekable binary file object, e.g. an UploadedFile
+    :return: generator of contest dicts
+    """
+    fileobj.seek(0)
+    if is_snapshot(fileobj):
+        return read_snapshot(fileobj)
+    if hasattr(fileobj, 'chunks'):
+        return iter_json_values(fileobj.chunks())
+    return iter_json_values(iter(lambda: fileobj.read(64 * 2 ** 10), b''))
@@ -0,0 +1,186 @@
+"""
+Seeded generator of synthetic contest dicts, for benchmarking.
+
+Scale 1 produces roughly the same volumes as the current db.sqlite3
+(131 contests, ~2200 contestant appearances, ~4500 song appearances, ~800 people, ~900 songs),
+and the name pools grow with the scale so that larger databases have proportionally more distinct names.
+"""
+
+import copy, datetime, random
+from django.db import transaction
+from django.db.models import Count
+from django.urls import reverse
+from .import_from_dict import prepare_for_import, import_contest_from_dict
+from .models import Contest, ContestRawText, Contestant, Person, SeasonLeaderboardEntry, Song
+
+# volumes at scale 1, taken from db.sqlite3
+CONTESTS = 131
+PEOPLE = 776
+SONGS = 896
+QUARTETS = 330
+CHORUSES = 150
+
+CONTEST_NAMES = {
+    'q': ('QUARTET PRELIMS', 'QUARTET SEMI-FINAL', 'QUARTET FINAL', 'NATIONAL SENIORS QUARTET PRELIM'),
+    'c': ('CHORUS FINAL', 'SOUTHERN CHORUS PRELIMS', 'NORTHERN CHORUS PRELIMS'),
+}
+LOCATIONS = ('HARROGATE', 'BOURNEMOUTH', 'SOUTHPORT', 'DERBY', 'BRIGHTON')
+PARTS = ('tenor', 'lead', 'bari', 'bass')
+STREAMS = (None, None, None, 'N', 'Y', 'S')
+
+
+class ContestGenerator:
+    """
+    Generates contest dicts in the format returned by scrape_pdf.get_contest_dict_from_url(), e.g.
+        for contest in ContestGenerator(scale=10, seed=1).contests():
+            prepare_for_import(contest)
+            import_contest_from_dict(contest)
+    """
+    def __init__(self, scale=1, seed=0):
+        self.scale = scale
+        self.random = random.Random(seed)
+        self.people = ['Person %s' % i for i in range(int(PEOPLE * scale))]
+        self.songs = ['Song Title %s' % i for i in range(int(SONGS * scale))]
+        self.quartets = ['Quartet %s' % i for i in range(int(QUARTETS * scale))]
+        self.choruses = ['Chorus %s' % i for i in range(int(CHORUSES * scale))]
+        # each quartet keeps the same singers most of the time
+        self.lineups = {q: self.random.sample(self.people, 4) for q in self.quartets}
+
+    def contests(self):
+        """
+        :return: generator of contest dicts
+        """
+        for i in range(int(CONTESTS * self.scale)):
+            yield self.contest(i)
+
+    def contest(self, i):
+        r = self.random
+        type = 'q' if r.random() < 0.72 else 'c'
+        date = datetime.date(1990, 1, 1) + datetime.timedelta(days=r.randrange(28 * 365))
+        n_judges = r.choice((2, 3, 3, 3, 4))
+        judges = [{'cat': cat, 'name': r.choice(self.people)} for cat in 'mps' for _ in range(n_judges)]
+        judges += [{'cat': 'a', 'name': r.choice(self.people)} for _ in range(r.randint(2, 5))]
+        pool = self.quartets if type == 'q' else self.choruses
+        contestants = [self.contestant(name, type, n_judges) for name in r.sample(pool, min(len(pool), r.randint(8, 26)))]
+        contestants.sort(key=lambda c: -c['tot_score'])
+        for rank, c in enumerate(contestants, start=1):
+            c['rank'] = rank
+        return {
+            'assoc': 'THE BRITISH ASSOCIATION OF BARBERSHOP SINGERS',
+            'contest': '%s %s' % (r.choice(CONTEST_NAMES[type]), i),
+            'stream': r.choice(STREAMS),
+            'location': r.choice(LOCATIONS),
+            'year': str(date.year),
+            'date': date.strftime('%d/%m/%Y'),
+            'type': type,
+            'url': 'http://example.com/synthetic/%s.pdf' % i,
+            'raw_text': 'Synthetic scoresheet %s\n' % i * 40,
+            'judges': judges,
+            'contestants': contestants,
+        }
+
+    def contestant(self, name, type, n_judges):
+        r = self.random
+        ability = r.uniform(45, 85)
+        songs = []
+        for title in r.sample(self.songs, 2):
+            songs.append({'name': title, **{
+                cat: int(round(n_judges * min(100, max(0, r.gauss(ability, 4))))) for cat in 'mps'
+            }})
+        if type == 'q':
+            lineup = self.lineups[name]
+            if r.random() < 0.2:
+                lineup = lineup[:3] + [r.choice(self.people)]
+            members = [{'part': part, 'name': person} for part, person in zip(PARTS, lineup)]
+        else:
+            members = [{'part': 'director', 'name': r.choice(self.people)}]
+        tot_score = sum(s[cat] for s in songs for cat in 'mps')
+        contestant = {
+            'name': name,
+            'tot_score': tot_score,
+            'pc_score': round(tot_score / n_judges / 3 / len(songs), 1),
+            'rank_m': None,
+            'rank_p': None,
+            'rank_s': None,
+            'songs': songs,
+            'members': members,
+        }
+        if type == 'c':
+            contestant['size'] = r.randint(12, 90)
+        return contestant
+
+
+def contest_to_rtf(contest):
+    """
+    Render a contest dict as an RTF scoresheet, in the layout that import_rtf.txt_to_dict() parses
+    :param contest: contest dict
+    :return: RTF as bytes
+    """
+    lines = [
+        'THE BRITISH ASSOCIATION OF BARBERSHOP SINGERS',
+        '',
+        '%s  -  %s: %s' % (contest['contest'], contest['location'], contest['year']),
+        'Contest date: %s' % contest['date'],
+    ]
+    for cat, label in (('m', 'Music'), ('p', 'Performance'), ('s', 'Singing'), ('a', 'CA')):
+        lines.append('%s: %s' % (label, ', '.join(j['name'] for j in contest['judges'] if j['cat'] == cat)))
+    for c in contest['contestants']:
+        members = ', '.join(m['name'] for m in c['members'])
+        for i, s in enumerate(c['songs']):
+            prefix = '%s: %s  (%s)' % (c['rank'], c['name'], members) if i == 0 else ''
+            lines.append('%s\\tab %s\\tab %s\\tab %s\\tab %s' % (prefix, s['name'], s['m'], s['p'], s['s']))
+        lines.append('\\tab Category')
+    body = '\\par\n'.join(lines)
+    return ('{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 Arial;}}\n%s\\par\n}' % body).encode('ascii')
+
+
+def import_contests(contests):
+    """
+    Import a list of contest dicts, leaving the dicts unchanged
+    """
+    for contest in copy.deepcopy(contests):
+        with transaction.atomic():
+            prepare_for_import(contest)
+            import_contest_from_dict(contest)
+
+
+def sample_urls():
+    """
+    The url of every page and api view that reads the data: list pages, and the busiest object for each detail page
+    :return: dict of url name: url
+    """
+    contest = Contest.objects.annotate(n=Count('contestantapp')).order_by('-n')[0]
+    contestant = Contestant.objects.annotate(n=Count('contestantapp')).order_by('-n')[0]
+    person = Person.objects.annotate(n=Count('member')).order_by('-n')[0]
+    # someone who sang with them, and someone who sang in as few quartet appearances as anyone, to find a path to
+    partner = Person.objects.filter(member__contestantapp__member__person=person).exclude(id=person.id)[0]
+    far = Person.objects.filter(member__contestantapp__contest_type='q').annotate(
+        n=Count('member')).order_by('n', 'id')[0]
+    song = Song.objects.annotate(n=Count('songapp')).order_by('-n')[0]
+    raw_text = ContestRawText.objects.order_by('contest_id')[0]
+    season = SeasonLeaderboardEntry.objects.filter(position=1, level='c').order_by('assoc', '-year', 'type', 'stream')[0]
+    season_args = [season.assoc, season.type, season.year] + ([season.stream] if season.stream else [])
+    return {
+        'contest_list': reverse('scores:contest_list'),
+        'contestant_list': reverse('scores:contestant_list'),
+        'person_list': reverse('scores:person_list'),
+        'song_list': reverse('scores:song_list'),
+        'contest_detail': reverse('scores:contest_detail', args=[contest.id]),
+        'contest_raw_text': reverse('scores:contest_raw_text', args=[raw_text.contest_id]),
+        'contestant_detail': reverse('scores:contestant_detail', args=[contestant.slug]),
+        'contestant_history_api': reverse('scores:contestant_history_api', args=[contestant.slug]) + '?points=200',
+        'person_detail': reverse('scores:person_detail', args=[person.slug]),
+        'person_path': reverse('scores:person_path', args=[person.slug, far.slug]),
+        'person_collaborators_api': reverse('scores:person_collaborators_api', args=[person.slug]),
+        'person_shared_api': reverse('scores:person_shared_api', args=[person.slug, partner.slug]),
+        'person_path_api': reverse('scores:person_path_api', args=[person.slug, far.slug]),
+        'person_autocomplete': reverse('scores:person_autocomplete') + '?q=%s' % person.name[:3],
+        'song_detail': reverse('scores:song_detail', args=[song.slug]),
+        'song_leaderboard_api': reverse('scores:song_leaderboard_api', args=[song.slug]),
+        'leaderboard_list': reverse('scores:leaderboard_list'),
+        'leaderboard': reverse('scores:leaderboard', args=season_args),
+        'leaderboard_api': reverse('scores:leaderboard_api', args=season_args) + '?level=s',
+        'judge_list': reverse('scores:judge_list'),
+        'judge_stats_api': reverse('scores:judge_stats_api') + '?cat=m',
+        'changes': reverse('scores:changes') + '?since=0&models=contest,member',
+    }
@@ -0,0 +1,19 @@
+from django import template
+from ..distributions import PercentileLookup
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def percentile_rank(context, appearance, field='pc_score'):
+    """
+    The percentile rank of a contestant or song appearance's score among the same assoc, type, stream and year, e.g.
+        {% load percentiles %}
+        {% percentile_rank contestantapp 'pc_score' %}
+    """
+    # one lookup per template render, so each group's distributions are only loaded once
+    lookup = context.render_context.get('percentile_lookup')
+    if lookup is None:
+        lookup = context.render_context['percentile_lookup'] = PercentileLookup()
+    rank = lookup.percentile_rank(appearance, field)
+    return '' if rank is None else '%d' % round(rank)
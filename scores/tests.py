@@ -1,3 +1,43 @@
-from django.test import TestCase
+import os
+from io import StringIO
+from django.test import SimpleTestCase, TestCase
+from .management.commands.check_query_plans import Command as CheckQueryPlans, prefer_indexes
+from .management.commands.compare_pdf_backends import SCORESHEETS, parse
+from .scrape_pdf import PDF_BACKENDS, fetch_pdf
+from .synthetic import ContestGenerator, import_contests
 
-# Create your tests here.
+
+class QueryPlanTests(TestCase):
+    """
+    The queries of every page use indexes, on a small synthetic database (see manage.py check_query_plans)
+    """
+    @classmethod
+    def setUpTestData(cls):
+        import_contests(list(ContestGenerator(scale=0.1, seed=0).contests()))
+
+    def test_no_full_table_scans(self):
+        prefer_indexes()
+        violations = CheckQueryPlans(stdout=StringIO()).check_pages(show_plans=False)
+        self.assertEqual([(page, sorted(tables), sql) for page, sql, tables, plan in violations], [])
+
+
+class PdfBackendTests(SimpleTestCase):
+    """
+    Every pdf backend's text of the fixture scoresheets parses to the same contest as the text pdftotext -raw wrote
+    for them (see manage.py compare_pdf_backends --expected)
+    """
+    def test_backends_parse_the_same_contests(self):
+        paths = sorted(os.path.join(SCORESHEETS, name) for name in os.listdir(SCORESHEETS) if name.endswith('.pdf'))
+        self.assertTrue(paths)
+        for path in paths:
+            with open(os.path.splitext(path)[0] + '.txt', encoding='utf-8', newline='') as f:
+                expected = parse(f.read(), path)
+            self.assertIsNotNone(expected, path)
+            data = fetch_pdf(path)
+            for backend, to_text in PDF_BACKENDS.items():
+                with self.subTest(scoresheet=os.path.basename(path), backend=backend):
+                    try:
+                        text = to_text(data)
+                    except FileNotFoundError:
+                        self.skipTest('pdftotext not found, set SCORES_PDFTOTEXT to its path')
+                    self.assertEqual(parse(text, path), expected)
@@ -8,16 +8,35 @@ urlpatterns = [
 
     url(r'^contest/$', views.ContestList.as_view(), name='contest_list'),
     url(r'^contest/(?P<pk>[0-9]+)/$', views.ContestView.as_view(), name='contest_detail'),
+    url(r'^contest/(?P<pk>[0-9]+)/raw_text/$', views.RawText, name='contest_raw_text'),
     url(r'^contest/upload/$', views.ContestUpload, name='contest_upload'),
     url(r'^contestant/$', views.ContestantList.as_view(), name='contestant_list'),
     url(r'^contestant/(?P<slug>[\w-]+)/$', views.ContestantView.as_view(), name='contestant_detail'),
+    url(r'^api/contestant/(?P<slug>[\w-]+)/history/$', views.ContestantHistoryApi, name='contestant_history_api'),
     url(r'^song/$', views.SongList.as_view(), name='song_list'),
     url(r'^song/(?P<slug>[\w-]+)/$', views.SongView.as_view(), name='song_detail'),
+    url(r'^leaderboard/$', views.Leaderboards, name='leaderboard_list'),
+    url(r'^leaderboard/(?P<assoc>[\w-]+)/(?P<type>[qc])/(?P<year>[0-9]{4})/(?:(?P<stream>[A-Z])/)?$',
+        views.Leaderboard, name='leaderboard'),
+    url(r'^api/leaderboard/(?P<assoc>[\w-]+)/(?P<type>[qc])/(?P<year>[0-9]{4})/(?:(?P<stream>[A-Z])/)?$',
+        views.LeaderboardApi, name='leaderboard_api'),
+    url(r'^api/song/(?P<slug>[\w-]+)/leaderboard/$', views.SongLeaderboardApi, name='song_leaderboard_api'),
     url(r'^person/$', views.PersonList.as_view(), name='person_list'),
     url(r'^person/(?P<slug>[\w-]+)/$', views.PersonView.as_view(), name='person_detail'),
     url(r'^person/(?P<slug>[\w-]+)/update/$', views.PersonUpdate.as_view(success_url="/scores/person/{slug}/"), name='person_update'),
+    url(r'^person/(?P<slug>[\w-]+)/path/(?P<other>[\w-]+)/$', views.CollaborationPath, name='person_path'),
+    url(r'^api/person/(?P<slug>[\w-]+)/collaborators/$', views.CollaboratorsApi, name='person_collaborators_api'),
+    url(r'^api/person/(?P<slug>[\w-]+)/shared/(?P<other>[\w-]+)/$', views.SharedQuartetsApi,
+        name='person_shared_api'),
+    url(r'^api/person/(?P<slug>[\w-]+)/path/(?P<other>[\w-]+)/$', views.CollaborationPathApi,
+        name='person_path_api'),
+    url(r'^judge/$', views.JudgeList, name='judge_list'),
+    url(r'^api/judge/$', views.JudgeStatsApi, name='judge_stats_api'),
+    url(r'^changes/$', views.Changes, name='changes'),
     url(r'^import/$', views.Import, name='import'),
     url(r'^import_rtf/$', views.import_rtf_view, name='import_rtf'),
     url(r'^update_aliases/$', views.UpdateAliases, name='update_aliases'),
+    url(r'^stats/$', views.QueryStats, name='query_stats'),
+    url(r'^metrics/$', views.Metrics, name='metrics'),
     url(r'^person_autocomplete/$', views.PersonAutocomplete.as_view(create_field='name'), name='person_autocomplete'),
 ]
\ No newline at end of file
@@ -0,0 +1,245 @@
+import datetime, decimal, re
+
+###############################################################
+# Schema for contest dicts
+###############################################################
+
+# value checkers: each returns an error message, or None if the value is ok
+NUMBER_TYPES = (int, float, decimal.Decimal)
+
+
+def is_string(value):
+    if not isinstance(value, str):
+        return 'expected a string, got %s' % type(value).__name__
+
+
+def is_number(value):
+    if isinstance(value, bool) or not isinstance(value, NUMBER_TYPES):
+        return 'expected a number, got %s' % type(value).__name__
+
+
+def is_integer(value):
+    if isinstance(value, bool) or not isinstance(value, int):
+        return 'expected an integer, got %s' % type(value).__name__
+
+
+def one_of(*choices):
+    def check(value):
+        if value not in choices:
+            return 'expected one of %s, got %r' % (', '.join(repr(c) for c in choices), value)
+    return check
+
+
+def is_date(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return
+    if not isinstance(value, str) or not re.match(r'^(\d{2}/\d{2}/\d{4}|\d{2} \w{3} \d{4})$', value):
+        return 'expected a date like 31/12/2017 or 31 Dec 2017, got %r' % (value,)
+
+
+def nullable(check):
+    def nullable_check(value):
+        if value is not None:
+            return check(value)
+    return nullable_check
+
+
+def list_of(schema):
+    # placeholder that compile_schema() replaces with a compiled validator for the items in the list
+    return ('list', schema)
+
+
+ASSOCS = (
+    'THE BRITISH ASSOCIATION OF BARBERSHOP SINGERS', 'BABS',
+    'LADIES ASSOCIATION OF BRITISH BARBERSHOP SINGERS', 'LABBS',
+)
+
+# (check, required) for each key
+JUDGE_SCHEMA = {
+    'name': (is_string, True),
+    'cat': (one_of('m', 'p', 's', 'a'), True),
+}
+
+MEMBER_SCHEMA = {
+    'name': (is_string, True),
+    'part': (one_of('tenor', 'lead', 'bari', 'bass', 'director'), True),
+}
+
+SONG_SCHEMA = {
+    'name': (is_string, True),
+    'm': (is_number, True),
+    'p': (is_number, True),
+    's': (is_number, True),
+    'mr': (nullable(is_number), False),
+    'pr': (nullable(is_number), False),
+    # calculated by calculate_scores(), but may already be there
+    'n': (is_integer, False),
+    'tot_score': (is_number, False),
+    'm_pc': (is_number, False),
+    'p_pc': (is_number, False),
+    's_pc': (is_number, False),
+    'pc_score': (is_number, False),
+}
+
+CONTESTANT_SCHEMA = {
+    'name': (is_string, True),
+    'rank': (is_integer, True),
+    'tot_score': (is_number, True),
+    'pc_score': (is_number, True),
+    'rank_m': (nullable(is_integer), False),
+    'rank_p': (nullable(is_integer), False),
+    'rank_s': (nullable(is_integer), False),
+    'size': (nullable(is_integer), False),
+    'songs': (list_of(SONG_SCHEMA), True),
+    'members': (list_of(MEMBER_SCHEMA), False),
+    # calculated by calculate_scores(), but may already be there
+    'n': (is_integer, False),
+    'm': (is_number, False),
+    'p': (is_number, False),
+    's': (is_number, False),
+    'm_pc': (is_number, False),
+    'p_pc': (is_number, False),
+    's_pc': (is_number, False),
+}
+
+CONTEST_SCHEMA = {
+    'assoc': (one_of(*ASSOCS), True),
+    'contest': (is_string, True),
+    'date': (is_date, True),
+    'location': (is_string, True),
+    'year': (is_string, True),
+    'type': (one_of('q', 'c'), True),
+    'stream': (nullable(one_of('I', 'N', 'Y', 'S')), False),
+    'raw_text': (nullable(is_string), False),
+    # one of url or filename is required, see check_contest()
+    'url': (is_string, False),
+    'filename': (is_string, False),
+    'judges': (list_of(JUDGE_SCHEMA), True),
+    'contestants': (list_of(CONTESTANT_SCHEMA), True),
+}
+
+
+###############################################################
+# Compiling the schema to validator functions
+###############################################################
+
+
+def compile_schema(schema):
+    """
+    Compile a schema into a function that validates a record and appends any errors to a list
+    :param schema: dict of key: (check, required)
+    :return: function(record, path, errors)
+    """
+    allowed = frozenset(schema)
+    required = tuple(key for key, (check, is_required) in schema.items() if is_required)
+    checks = []
+    for key, (check, is_required) in schema.items():
+        if isinstance(check, tuple) and check[0] == 'list':
+            checks.append((key, compile_list(compile_schema(check[1]))))
+        else:
+            checks.append((key, compile_value(check)))
+
+    def validate(record, path, errors):
+        if not isinstance(record, dict):
+            errors.append('%s: expected an object, got %s' % (path or 'contest', type(record).__name__))
+            return
+        for key in required:
+            if key not in record:
+                errors.append('%s%s: missing' % (path, key))
+        for key in record.keys() - allowed:
+            errors.append('%s%s: unexpected field' % (path, key))
+        for key, check in checks:
+            if key in record:
+                check(record[key], '%s%s' % (path, key), errors)
+
+    return validate
+
+
+def compile_value(check):
+    def validate(value, path, errors):
+        message = check(value)
+        if message:
+            errors.append('%s: %s' % (path, message))
+    return validate
+
+
+def compile_list(validate_item):
+    def validate(value, path, errors):
+        if not isinstance(value, list):
+            errors.append('%s: expected a list, got %s' % (path, type(value).__name__))
+            return
+        for i, item in enumerate(value):
+            validate_item(item, '%s[%s].' % (path, i), errors)
+    return validate
+
+
+validate_contest_schema = compile_schema(CONTEST_SCHEMA)
+
+
+###############################################################
+# Validating contest dicts
+###############################################################
+
+
+class ContestValidationError(ValueError):
+    """
+    Raised when one or more contest dicts are invalid
+    :param errors: dict of contest number: list of error messages
+    """
+    def __init__(self, errors):
+        self.errors = errors
+        super(ContestValidationError, self).__init__('%s invalid contest(s)' % len(errors))
+
+
+def check_contest(contest, errors):
+    """
+    Check the things that the schema can't, i.e. that depend on several fields
+    """
+    if 'url' not in contest and 'filename' not in contest:
+        errors.append('url: missing')
+
+    # calculate_scores() divides by the number of judges in each category
+    judges = contest.get('judges')
+    if isinstance(judges, list):
+        cats = {j.get('cat') for j in judges if isinstance(j, dict)}
+        for cat in ('m', 'p', 's'):
+            if cat not in cats:
+                errors.append('judges: no %s judges' % cat)
+
+    # calculate_scores() checks that the contestant total is the sum of the song scores
+    for i, c in enumerate(contest.get('contestants') or []):
+        try:
+            tot_score = sum(s[cat] for s in c['songs'] for cat in ('m', 'p', 's'))
+            if int(c['tot_score']) != tot_score:
+                errors.append('contestants[%s].tot_score: %s is not the sum of the song scores (%s)'
+                              % (i, c['tot_score'], tot_score))
+        except (KeyError, TypeError, ValueError):
+            pass    # already reported by the schema
+
+
+def validate_contest(contest):
+    """
+    Validate a contest dict (as parsed from a scoresheet, i.e. before prepare_for_import)
+    :param contest: contest dict
+    :return: list of error messages, empty if the contest is valid
+    """
+    errors = []
+    validate_contest_schema(contest, '', errors)
+    if isinstance(contest, dict):
+        check_contest(contest, errors)
+    return errors
+
+
+def validate_contests(contests):
+    """
+    Validate a batch of contest dicts in one pass, reporting every error in every contest
+    :param contests: iterable of contest dicts
+    :return: tuple (number of contests checked, dict of contest number: list of error messages)
+    """
+    errors = {}
+    n = 0
+    for n, contest in enumerate(contests, start=1):
+        contest_errors = validate_contest(contest)
+        if contest_errors:
+            errors[n] = contest_errors
+    return n, errors
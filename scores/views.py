@@ -1,18 +1,27 @@
 from django.shortcuts import get_object_or_404, render
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, HttpResponse, JsonResponse, Http404
 from django.urls import reverse
 from django.views import generic
 from django.utils import timezone
+from django.utils.html import escape
 from collections import defaultdict
+from django.db import transaction
 from django.db.models import Count, Min, Max, Avg, Case, When, Sum, IntegerField
+from django.contrib.admin.views.decorators import staff_member_required
 from dal import autocomplete
 
 from .scrape_pdf import *
 from .models import *
 from .forms import *
 from .import_from_dict import *
+from .stream_json import read_contests
+from .validation import validate_contest, validate_contests
+from .middleware import VIEW_STATS
+from .collaboration import get_graph
+from .history import contestant_history
+from .changes import changes_since
 
-import time, json, pprint
+import json, pprint
 
 pf = pprint.PrettyPrinter(indent=4, width=120).pformat
 
@@ -28,8 +37,13 @@ class PersonAutocomplete(autocomplete.Select2QuerySetView):
     def has_add_permission(self, request):
         return True
 
+    def create_object(self, text):
+        # names are unique ignoring case, so pick the person already known by the name, in any case
+        return Person.objects.get_or_create(name__iexact=text, defaults={'name': text})[0]
+
 class ContestList(generic.ListView):
     model = Contest
+    ordering = ('assoc', '-year', '-date')
 
 
 class ContestView(generic.DetailView):
@@ -42,6 +56,35 @@ class ContestantList(generic.ListView):
 
 class ContestantView(generic.DetailView):
     model = Contestant
+    def get_context_data(self, **kwargs):
+        context = super(ContestantView, self).get_context_data(**kwargs)
+        # the chart of the contestant's history is fetched from ContestantHistoryApi;
+        # every appearance and rating change is only listed when asked for
+        if self.request.GET.get('table'):
+            context['contestantapps'] = self.object.contestantapp_set.select_related(
+                'contest', 'contestant',
+            ).prefetch_related(
+                'streamrank_set', 'member_set__person', 'songapp_set__song',
+            ).order_by('contest_date', 'contest_id')
+            context['rating_history'] = RatingHistory.objects.filter(
+                contestant=self.object,
+            ).select_related('contestantapp__contest').order_by('contest_date')
+        return context
+
+
+def ContestantHistoryApi(request, slug):
+    """
+    A contestant's appearances as a series for charting, with ?points=N to downsample to at most N points
+    """
+    contestant = get_object_or_404(Contestant, slug=slug)
+    try:
+        n_points = int(request.GET.get('points', 0))
+    except ValueError:
+        n_points = 0
+    return JsonResponse({
+        'contestant': contestant.name,
+        'series': contestant_history(contestant, n_points),
+    })
 
 
 def agg_pc(agg_function, type):
@@ -55,7 +98,7 @@ def agg_pc(agg_function, type):
     return agg_function(
         Case(
             When(
-                songapp__contestantapp__contest__type=type,
+                songapp__contest_type=type,
                 then='songapp__pc_score',
             )
         )
@@ -72,7 +115,7 @@ def count_by_type(type):
     return Sum(
         Case(
             When(
-                songapp__contestantapp__contest__type=type,
+                songapp__contest_type=type,
                 then=1
             ),
             output_field=IntegerField(),
@@ -112,11 +155,14 @@ class SongView(generic.DetailView):
         # get list of quartet and chorus performances for this person
         context.update({
             'quartet_performances': self.object.songapp_set.filter(
-                contestantapp__contest__type='q',
-            ).order_by('-contestantapp__contest__date'),
+                contest_type='q',
+            ).order_by('-contest_date'),
             'chorus_performances':  self.object.songapp_set.filter(
-                contestantapp__contest__type='c',
-            ).order_by('-contestantapp__contest__date'),
+                contest_type='c',
+            ).order_by('-contest_date'),
+            'top_performances': leaderboard_entries(SongLeaderboardEntry.objects.filter(
+                song=song,
+            ).order_by('-type', 'position')),
         })
         return context
 
@@ -128,7 +174,7 @@ class PersonList(generic.ListView):
         return Person.objects.annotate(
             q_count=Sum(Case(
                 When(
-                    member__contestantapp__contest__type='q',
+                    member__contestantapp__contest_type='q',
                     then=1
                 ),
                 output_field=IntegerField(),
@@ -136,7 +182,7 @@ class PersonList(generic.ListView):
         ).annotate(
             c_count=Sum(Case(
                 When(
-                    member__contestantapp__contest__type='c',
+                    member__contestantapp__contest_type='c',
                     then=1
                 ),
                 output_field=IntegerField(),
@@ -154,43 +200,247 @@ class PersonView(generic.DetailView):
         context.update({
             'quartet_performances': ContestantApp.objects.filter(
                 member__person=person,
-                contestant__type='q',
-            ).order_by('-contest__date'),
+                contest_type='q',
+            ).order_by('-contest_date'),
             'director_performances':  ContestantApp.objects.filter(
                 member__person=person,
                 member__part='director',
-            ).order_by('-contest__date'),
+            ).order_by('-contest_date'),
+            'collaborators': collaborators(person),
+            'judge_appearances': person.judge_set.select_related('contest').order_by('-contest__date'),
+            'judge_stats': person.judgestats_set.order_by('cat'),
+            'judged_contestants': person.judgecontestantstats_set.select_related('contestant').order_by(
+                '-appearances', 'cat')[:20],
         })
         return context
 
 
+def collaborators(person):
+    """
+    :return: list of (Person, number of quartets sung in together), from the collaboration graph
+    """
+    pairs = get_graph().collaborators(person.id)
+    people = Person.objects.in_bulk([p for p, n in pairs])
+    return [(people[p], n) for p, n in pairs]
+
+
+def collaboration_path(person, other):
+    """
+    :return: list of (Person, list of the Contestants they sang in with the previous person) from one person to
+        another, or None if they're not connected
+    """
+    graph = get_graph()
+    path = graph.shortest_path(person.id, other.id)
+    if path is None:
+        return None
+    hops = [graph.shared_quartets(a, b) for a, b in zip(path, path[1:])]
+    people = Person.objects.in_bulk(path)
+    quartets = Contestant.objects.in_bulk([q for hop in hops for q in hop])
+    return [(people[p], [quartets[q] for q in hop]) for p, hop in zip(path, [()] + hops)]
+
+
 class PersonUpdate(generic.UpdateView):
     model = Person
     form_class = PersonForm
 
 
+def leaderboard_entries(entries):
+    if entries.model is SongLeaderboardEntry:
+        return entries.select_related(
+            'songapp__song', 'songapp__contestantapp__contest', 'songapp__contestantapp__contestant')
+    return entries.select_related('songapp__song', 'contestantapp__contest', 'contestantapp__contestant')
+
+
+def leaderboard_json(entry):
+    contestantapp = entry.contestantapp
+    return {
+        'position': entry.position,
+        'pc_score': float(entry.pc_score),
+        'contestant': contestantapp.contestant.name,
+        'contestant_slug': contestantapp.contestant.slug,
+        'contest_id': contestantapp.contest.id,
+        'contest': contestantapp.contest.contest,
+        'date': contestantapp.contest.date.isoformat(),
+        'song': entry.songapp.song.name if entry.songapp else None,
+    }
+
+
+def season_leaderboard(assoc, type, year, stream, level):
+    entries = list(leaderboard_entries(SeasonLeaderboardEntry.objects.filter(
+        assoc=assoc, type=type, year=year, stream=stream or '', level=level,
+    ).order_by('position')))
+    if not entries:
+        raise Http404('No leaderboard for %s %s %s %s' % (assoc, type, year, stream or ''))
+    return entries
+
+
+def Leaderboards(request):
+    """
+    The seasons that have a leaderboard
+    """
+    seasons = SeasonLeaderboardEntry.objects.filter(position=1, level='c').order_by('assoc', '-year', 'type', 'stream')
+    return render(request, 'scores/leaderboards.html', {'seasons': seasons})
+
+
+def Leaderboard(request, assoc, type, year, stream=None):
+    """
+    The top contestant (or with ?level=s, song) appearances in a season
+    """
+    level = 's' if request.GET.get('level') in ('s', 'song') else 'c'
+    return render(request, 'scores/leaderboard.html', {
+        'assoc': assoc, 'type': type, 'year': year, 'stream': stream, 'level': level,
+        'entries': season_leaderboard(assoc, type, year, stream, level),
+    })
+
+
+def LeaderboardApi(request, assoc, type, year, stream=None):
+    level = 's' if request.GET.get('level') in ('s', 'song') else 'c'
+    entries = season_leaderboard(assoc, type, year, stream, level)
+    return JsonResponse({
+        'assoc': assoc, 'type': type, 'year': int(year), 'stream': stream or '', 'level': level,
+        'entries': [leaderboard_json(e) for e in entries],
+    })
+
+
+def SongLeaderboardApi(request, slug):
+    song = get_object_or_404(Song, slug=slug)
+    entries = leaderboard_entries(SongLeaderboardEntry.objects.filter(song=song).order_by('-type', 'position'))
+    return JsonResponse({
+        'song': song.name,
+        'quartet': [leaderboard_json(e) for e in entries if e.type == 'q'],
+        'chorus': [leaderboard_json(e) for e in entries if e.type == 'c'],
+    })
+
+
+def JudgeList(request):
+    """
+    Every judge's record, from the precalculated JudgeStats, optionally in one category (?cat=m)
+    """
+    stats = JudgeStats.objects.select_related('person').order_by('-panels', 'person__name')
+    cat = request.GET.get('cat')
+    if cat:
+        stats = stats.filter(cat=cat)
+    return render(request, 'scores/judge_list.html', {'stats': stats, 'cat': cat})
+
+
+def JudgeStatsApi(request):
+    stats = JudgeStats.objects.select_related('person').order_by('person__name', 'cat')
+    if request.GET.get('cat'):
+        stats = stats.filter(cat=request.GET['cat'])
+    return JsonResponse({'judges': [{
+        'name': j.person.name,
+        'slug': j.person.slug,
+        'cat': j.cat,
+        'panels': j.panels,
+        'appearances': j.appearances,
+        'avg_awarded': j.avg_awarded(),
+        'avg_overall': j.avg_overall(),
+        'difference': j.difference(),
+    } for j in stats]})
+
+
+def CollaborationPath(request, slug, other):
+    """
+    How two singers are connected through the quartets they've sung in
+    """
+    person = get_object_or_404(Person, slug=slug)
+    other = get_object_or_404(Person, slug=other)
+    return render(request, 'scores/collaboration_path.html', {
+        'person': person, 'other': other, 'path': collaboration_path(person, other),
+    })
+
+
+def CollaboratorsApi(request, slug):
+    person = get_object_or_404(Person, slug=slug)
+    return JsonResponse({
+        'person': person.name,
+        'quartets': get_graph().quartet_count(person.id),
+        'collaborators': [{'name': p.name, 'slug': p.slug, 'quartets': n} for p, n in collaborators(person)],
+    })
+
+
+def SharedQuartetsApi(request, slug, other):
+    person = get_object_or_404(Person, slug=slug)
+    other = get_object_or_404(Person, slug=other)
+    quartets = Contestant.objects.in_bulk(get_graph().shared_quartets(person.id, other.id))
+    return JsonResponse({
+        'people': [person.name, other.name],
+        'quartets': [{'name': q.name, 'slug': q.slug} for q in sorted(quartets.values(), key=lambda q: q.name)],
+    })
+
+
+def CollaborationPathApi(request, slug, other):
+    person = get_object_or_404(Person, slug=slug)
+    other = get_object_or_404(Person, slug=other)
+    path = collaboration_path(person, other)
+    return JsonResponse({
+        'people': [person.name, other.name],
+        'path': None if path is None else [
+            {'name': p.name, 'slug': p.slug, 'quartets': [q.name for q in quartets]} for p, quartets in path
+        ],
+    })
+
+
+def Changes(request):
+    """
+    The change log after a seq, for consumers that sync incrementally:
+    GET changes/?since=<the last seq seen>&limit=1000&models=contest,contestantapp
+    then fetch the rows that changed, and ask again with since=<the returned next>.
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = min(int(request.GET.get('limit', 1000)), 10000)
+    except ValueError:
+        return JsonResponse({'error': 'since and limit must be integers'}, status=400)
+    if since < 0 or limit < 1:
+        return JsonResponse({'error': 'since must be at least 0, and limit at least 1'}, status=400)
+    models = [m for m in request.GET.get('models', '').split(',') if m]
+    entries = changes_since(since, limit + 1, models)
+    more = len(entries) > limit
+    entries = entries[:limit]
+    return JsonResponse({
+        'changes': [{
+            'seq': e.seq,
+            'model': e.model,
+            'id': e.object_id,
+            'action': e.action,
+            'time': e.time.isoformat(),
+        } for e in entries],
+        'next': entries[-1].seq if entries else since,
+        'more': more,
+    })
+
+
+def RawText(request, pk):
+    """
+    The text of a contest's scoresheet, fetched by the contest page when it's asked for
+    """
+    raw_text = get_object_or_404(ContestRawText, contest_id=pk)
+    return HttpResponse(raw_text.text, content_type='text/plain; charset=utf-8')
+
+
 def ContestUpload(request):
     if request.method == 'POST':
         form = UploadFileForm(request.POST, request.FILES)
         if form.is_valid():
-            # read json file
-            json_data = json.loads(request.FILES['file'].read())
-            # check whether we have a single object or a list of objects
-            # if we got a single object, put it in a list
-            d_list = json_data if isinstance(json_data, list) else [json_data,]
-            # iterate over list of objects
-            for d in d_list:
-                # delay needed to prevent disk I/O error for some reason
-                time.sleep(0.5)
-
-                # parse the date fields and calculate missing scores and percentages
-                prepare_for_import(d)
-
-                # import it
-                import_contest_from_dict(d)
+            f = request.FILES['file']
+
+            # validate every contest in the file before importing any of them
+            n, errors = validate_contests(read_contests(f))
+            if errors:
+                return render(request, 'scores/contest_upload.html', {'form': form, 'errors': sorted(errors.items())}, status=400)
+
+            # read the contests again one at a time, importing (and committing) each one as it is parsed
+            for d in read_contests(f):
+                with transaction.atomic():
+                    # parse the date fields and calculate missing scores and percentages
+                    prepare_for_import(d)
+
+                    # import it
+                    import_contest_from_dict(d)
 
             # Suck Sess
-            return HttpResponse('Success!')
+            return HttpResponse('Success! Read %s contests' % n)
 
     else:
         form = UploadFileForm()
@@ -206,15 +456,24 @@ def Import(request):
         # import URLS
         urls = request.POST.getlist('import_urls')
         contests = []
+        skipped = []
         for url in urls:
             try:
                 contest = get_contest_dict_from_url(url)
             except AttributeError:  # this probably means that the scoresheet is not of the right format, skip it
+                skipped.append((url, ['scoresheet not recognised']))
+                continue
+            # skip contests that we can't import, rather than failing halfway through, and say why
+            errors = validate_contest(contest)
+            if errors:
+                skipped.append((url, errors))
                 continue
             prepare_for_import(contest)
             import_contest_from_dict(contest)
             contests.append(contest)
-        return HttpResponse("############################################################<br />".join((pf(c).replace(' ', '&nbsp;').replace('\n', '<br />') for c in contests)))
+        report = ''.join('<p>Skipped %s:<br />%s</p>' % (escape(url), '<br />'.join(escape(e) for e in errors))
+                         for url, errors in skipped)
+        return HttpResponse(report + "############################################################<br />".join((pf(c).replace(' ', '&nbsp;').replace('\n', '<br />') for c in contests)))
     else:
         # display list of websites to get PDF files from
         context = {'form': ImportWebsiteListForm()}
@@ -243,3 +502,35 @@ def import_rtf_view(request):
         import_contest_from_dict(contest)
 
     return HttpResponse('Import successful')
+
+
+@staff_member_required
+def QueryStats(request):
+    """
+    Per-view request latency and query counts, as recorded by QueryStatsMiddleware in this process
+    """
+    return render(request, 'scores/query_stats.html', {'stats': VIEW_STATS.summary()})
+
+
+def Metrics(request):
+    """
+    Per-view request latency and query counts in the Prometheus text exposition format
+    """
+    metrics = (
+        ('wall', 'scores_request_seconds', 'Request wall time in seconds'),
+        ('db', 'scores_request_db_seconds', 'Database time per request in seconds'),
+        ('queries', 'scores_request_queries', 'Database queries per request'),
+        ('duplicates', 'scores_request_duplicate_queries', 'Duplicate database queries per request'),
+    )
+    summary = VIEW_STATS.summary()
+    lines = []
+    for field, name, help in metrics:
+        lines.append('# HELP %s %s' % (name, help))
+        lines.append('# TYPE %s summary' % name)
+        for view, count, total, percentiles in summary:
+            for quantile, value in sorted(percentiles[field].items()):
+                lines.append('%s{view="%s",quantile="%s"} %s' % (name, view, quantile, value))
+            if field == 'wall':
+                lines.append('%s_count{view="%s"} %s' % (name, view, count))
+                lines.append('%s_sum{view="%s"} %s' % (name, view, total))
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4')